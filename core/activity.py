@@ -0,0 +1,142 @@
+"""
+Per-user daily activity bitsets.
+
+Every user's activity is one bitset with a bit per calendar day, stored as
+ActivityBlock rows of BLOCK_DAYS bits each (a signed 64-bit integer per 63
+days, keyed by ``ordinal // BLOCK_DAYS``). Marking a day active is a single
+``UPDATE ... SET bits = bits | mask``; streaks, weeks and monthly heatmaps
+are computed with integer bit operations over the handful of blocks a user
+has, instead of grouping submissions by day.
+
+``current_streaks`` is the batch path: it runs the same bit operations over
+every user's current block at once, and only goes back a block for users
+whose streak covers the whole block.
+"""
+import heapq
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import ActivityBlock
+
+BLOCK_DAYS = 63
+FULL = (1 << BLOCK_DAYS) - 1
+# How long "already marked today" is remembered, to skip repeated UPDATEs.
+GUARD_TTL = 60 * 60 * 24
+
+
+def locate(day):
+    return divmod(day.toordinal(), BLOCK_DAYS)
+
+
+def run_below(bits, offset):
+    """Number of consecutive set bits from ``offset`` down towards bit 0."""
+    window = (bits << (BLOCK_DAYS - 1 - offset)) & FULL
+    return BLOCK_DAYS - (~window & FULL).bit_length()
+
+
+class ActivitySet:
+
+    def __init__(self, blocks=None):
+        self.blocks = blocks or {}
+
+    def is_active(self, day):
+        block, offset = locate(day)
+        return bool(self.blocks.get(block, 0) >> offset & 1)
+
+    def days(self, start, count):
+        return [self.is_active(start + timedelta(days=i)) for i in range(count)]
+
+    def week(self, day):
+        return self.days(day - timedelta(days=day.weekday()), 7)
+
+    def month(self, year, month):
+        return self.days(date(year, month, 1), monthrange(year, month)[1])
+
+    def streak(self, today):
+        """Consecutive active days ending today, or yesterday if today has no activity yet."""
+        day = today if self.is_active(today) else today - timedelta(days=1)
+        ordinal, streak = day.toordinal(), 0
+        while True:
+            block, offset = divmod(ordinal, BLOCK_DAYS)
+            run = run_below(self.blocks.get(block, 0), offset)
+            streak += run
+            if run <= offset:
+                return streak
+            ordinal -= run
+
+
+def load_activity(user_id):
+    return ActivitySet(dict(ActivityBlock.objects.filter(user_id=user_id).values_list('block', 'bits')))
+
+
+def record_activity(user_id, day):
+    guard = f'activity:{user_id}:{day.toordinal()}'
+    if cache.get(guard):
+        return
+    block, offset = locate(day)
+    blocks = ActivityBlock.objects.filter(user_id=user_id, block=block)
+    if not blocks.update(bits=F('bits').bitor(1 << offset)):
+        ActivityBlock.objects.bulk_create([ActivityBlock(user_id=user_id, block=block)], ignore_conflicts=True)
+        blocks.update(bits=F('bits').bitor(1 << offset))
+    transaction.on_commit(lambda: cache.set(guard, True, timeout=GUARD_TTL))
+
+
+def replace_activity(days_by_user):
+    """Overwrite the bitsets of the given users with ``{user_id: days}``."""
+    rows = {}
+    for user_id, days in days_by_user.items():
+        for day in days:
+            block, offset = locate(day)
+            rows[user_id, block] = rows.get((user_id, block), 0) | 1 << offset
+    with transaction.atomic():
+        ActivityBlock.objects.filter(user_id__in=list(days_by_user)).delete()
+        ActivityBlock.objects.bulk_create(
+            [ActivityBlock(user_id=user_id, block=block, bits=bits) for (user_id, block), bits in rows.items()]
+        )
+
+
+def _blocks(block, user_ids=None):
+    rows = ActivityBlock.objects.filter(block=block).values_list('user_id', 'bits')
+    return {user_id: bits for user_id, bits in rows.iterator(chunk_size=2000) if user_ids is None or user_id in user_ids}
+
+
+def current_streaks(today):
+    """``{user_id: streak}`` for every user whose streak is still alive today."""
+    today_block, today_offset = locate(today)
+    yesterday_block, yesterday_offset = locate(today - timedelta(days=1))
+    current = _blocks(today_block)
+    previous = current if yesterday_block == today_block else _blocks(yesterday_block)
+
+    # Where each live streak starts counting back from, as (block, offset).
+    pending = {}
+    for user_id, bits in current.items():
+        if bits >> today_offset & 1:
+            pending[user_id] = today_block, today_offset
+    for user_id, bits in previous.items():
+        if user_id not in pending and bits >> yesterday_offset & 1:
+            pending[user_id] = yesterday_block, yesterday_offset
+
+    streaks = dict.fromkeys(pending, 0)
+    loaded = {today_block: current, yesterday_block: previous}
+    while pending:
+        block = max(block for block, _ in pending.values())
+        users = {user_id for user_id, (b, _) in pending.items() if b == block}
+        bits_by_user = loaded.pop(block, None)
+        if bits_by_user is None:
+            bits_by_user = _blocks(block, users)
+        for user_id in users:
+            _, offset = pending.pop(user_id)
+            run = run_below(bits_by_user.get(user_id, 0), offset)
+            streaks[user_id] += run
+            if run > offset:
+                pending[user_id] = block - 1, BLOCK_DAYS - 1
+    return streaks
+
+
+def streak_leaderboard(today, limit=10):
+    """The ``limit`` longest live streaks as ``[(user_id, streak)]``, longest first."""
+    return heapq.nlargest(limit, current_streaks(today).items(), key=lambda item: (item[1], str(item[0])))
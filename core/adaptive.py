@@ -0,0 +1,306 @@
+"""
+Adaptive (computerized-adaptive) placement test.
+
+Questions are modelled with the two-parameter logistic IRT model: a learner
+of ability ``theta`` answers question ``i`` correctly with probability
+``1 / (1 + exp(-a_i * (theta - b_i)))``, where ``a`` is the question's
+discrimination and ``b`` its difficulty. After each answer the ability is
+re-estimated (expected a posteriori over a fixed grid, with a standard
+normal prior) and the next question is the most informative one at that
+ability among the least-used categories, so the test stays balanced across
+grammar, vocabulary, etc.
+
+The test stops as soon as the posterior puts CONFIDENCE of its mass on one
+CEFR band (after MIN_ITEMS), or after MAX_ITEMS. Item parameters live in the
+assessment snapshot and are unpacked once per snapshot version into compact
+arrays. ``calibrate`` re-estimates them from graded history.
+
+A session is pinned to the snapshot it started with and records the question
+it served, which is the only one it accepts an answer to. If the snapshot is
+no longer available, the session cannot continue and PlacementTestChanged
+(409) asks the client to start a new one.
+"""
+import bisect
+import json
+import math
+import threading
+from array import array
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .aggregates import record_assessment_results
+from .assessments import AnswerKey, get_snapshot, invalidate_snapshot, load_snapshot
+from .authentication import invalidate_principals
+from .jobs import CEFR_LEVELS, analyse
+from .leaderboard import record_level
+from .models import AssessmentSubmission, PlacementSession, Question, UserProfile
+
+# Lower bounds of A2, B1, B2, C1 and C2 on the ability scale.
+LEVEL_CUTS = (-1.5, -0.5, 0.5, 1.5, 2.5)
+GRID = tuple(-4 + 0.2 * k for k in range(41))
+LOG_PRIOR = tuple(-t * t / 2 for t in GRID)
+GRID_LEVELS = tuple(bisect.bisect(LEVEL_CUTS, t) for t in GRID)
+
+MIN_ITEMS = 5
+MAX_ITEMS = 20
+CONFIDENCE = 0.85
+
+_banks = {}
+_lock = threading.Lock()
+
+
+class PlacementTestChanged(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The placement test changed during this session. Please start a new one.'
+    default_code = 'placement_test_changed'
+
+
+def probability(a, b, theta):
+    return 1 / (1 + math.exp(-a * (theta - b)))
+
+
+def level_for_ability(theta):
+    return CEFR_LEVELS[bisect.bisect(LEVEL_CUTS, theta)]
+
+
+class ItemBank:
+    """Questions of one assessment snapshot with their IRT parameters as arrays."""
+
+    def __init__(self, snapshot):
+        questions = json.loads(snapshot.body)['data']['questions']
+        params = {question_id: (a, b) for question_id, a, b in snapshot.item_params}
+
+        self.assessment_id = snapshot.assessment_id
+        self.version = snapshot.version
+        self.questions = questions
+        self.ids = array('q')
+        self.a = array('d')
+        self.b = array('d')
+        self.category = array('H')
+        self.categories = []
+        self.index = {}
+        category_index = {}
+        for position, question in enumerate(questions):
+            a, b = params.get(question['id'], (1.0, 0.0))
+            if question['category'] not in category_index:
+                category_index[question['category']] = len(self.categories)
+                self.categories.append(question['category'])
+            self.ids.append(question['id'])
+            self.a.append(a)
+            self.b.append(b)
+            self.category.append(category_index[question['category']])
+            self.index[question['id']] = position
+        self.answer_key = AnswerKey(snapshot.answer_key)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def estimate(self, responses):
+        """
+        Return ``(ability, standard_error, level_mass)`` for ``(question_id,
+        correct)`` responses; ``level_mass`` is the posterior probability of
+        each CEFR level.
+        """
+        log_posterior = list(LOG_PRIOR)
+        for question_id, correct in responses:
+            i = self.index[question_id]
+            a, b = self.a[i], self.b[i]
+            for k, theta in enumerate(GRID):
+                p = min(max(probability(a, b, theta), 1e-9), 1 - 1e-9)
+                log_posterior[k] += math.log(p if correct else 1 - p)
+
+        peak = max(log_posterior)
+        weights = [math.exp(value - peak) for value in log_posterior]
+        total = sum(weights)
+        mean = sum(w * t for w, t in zip(weights, GRID)) / total
+        variance = sum(w * (t - mean) ** 2 for w, t in zip(weights, GRID)) / total
+        level_mass = [0.0] * len(CEFR_LEVELS)
+        for w, level in zip(weights, GRID_LEVELS):
+            level_mass[level] += w / total
+        return mean, math.sqrt(variance), level_mass
+
+    def next_question(self, answered_ids, theta):
+        """The most informative unanswered question among the least-used categories."""
+        used = [0] * len(self.categories)
+        for question_id in answered_ids:
+            used[self.category[self.index[question_id]]] += 1
+
+        best, best_score = None, None
+        for i in range(len(self.ids)):
+            if self.ids[i] in answered_ids:
+                continue
+            p = probability(self.a[i], self.b[i], theta)
+            score = (-used[self.category[i]], self.a[i] * self.a[i] * p * (1 - p))
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        return None if best is None else self.questions[best]
+
+
+def get_item_bank(assessment_id=None, version=None):
+    """The item bank of the current snapshot of an assessment, or of the snapshot ``version``."""
+    snapshot = get_snapshot(assessment_id) if version is None else load_snapshot(version)
+    if snapshot is None:
+        return None
+    with _lock:
+        bank = _banks.get(snapshot.version)
+    if bank is None:
+        bank = ItemBank(snapshot)
+        with _lock:
+            _banks[snapshot.version] = bank
+    return bank
+
+
+def start_session(user, assessment_id=None):
+    """Open a placement session and return it with its first question, or None."""
+    bank = get_item_bank(assessment_id)
+    if bank is None or not len(bank):
+        return None, None
+    question = bank.next_question(set(), 0.0)
+    session = PlacementSession.objects.create(
+        user=user, assessment_id=bank.assessment_id, snapshot=bank.version, currentQuestion=question['id']
+    )
+    return session, question
+
+
+def session_bank(session):
+    """The item bank of the snapshot ``session`` is pinned to; raises PlacementTestChanged if it is gone."""
+    bank = get_item_bank(version=session.snapshot) if session.snapshot else None
+    if bank is None:
+        raise PlacementTestChanged()
+    return bank
+
+
+def answer_question(session, question_id, answer):
+    """
+    Record an answer, update the ability estimate and either pick the next
+    question or finish the session. ``session`` must be locked for update.
+
+    Returns ``(question, level_mass)``; ``question`` is None once the session
+    is complete.
+    """
+    bank = session_bank(session)
+    correct = bank.answer_key.is_correct(question_id, answer)
+    session.responses.append({"questionId": question_id, "answer": answer, "correct": correct})
+
+    responses = [(r['questionId'], r['correct']) for r in session.responses]
+    session.ability, session.standardError, level_mass = bank.estimate(responses)
+
+    answered_ids = {question_id for question_id, _ in responses}
+    question = None
+    confident = len(responses) >= MIN_ITEMS and max(level_mass) >= CONFIDENCE
+    if not confident and len(responses) < MAX_ITEMS:
+        question = bank.next_question(answered_ids, session.ability)
+
+    session.currentQuestion = None if question is None else question['id']
+    if question is None:
+        finish_session(session, bank, level_mass)
+    else:
+        PlacementSession.objects.filter(pk=session.pk).update(
+            responses=session.responses, ability=session.ability, standardError=session.standardError,
+            currentQuestion=session.currentQuestion
+        )
+    return question, level_mass
+
+
+def finish_session(session, bank, level_mass):
+    level = CEFR_LEVELS[max(range(len(level_mass)), key=level_mass.__getitem__)]
+    category_scores = defaultdict(lambda: [0, 0])
+    for response in session.responses:
+        category = bank.answer_key.categories[response['questionId']]
+        category_scores[category][0] += response['correct']
+        category_scores[category][1] += 1
+
+    with transaction.atomic():
+        session.submission = AssessmentSubmission.objects.create(
+            user_id=session.user_id,
+            assessment_id=session.assessment_id,
+            answers=[{"questionId": r['questionId'], "answer": r['answer']} for r in session.responses],
+            status='complete',
+            level=level,
+            correctCount=sum(r['correct'] for r in session.responses),
+            totalQuestions=len(session.responses),
+            aiAnalysis=analyse(dict(category_scores)),
+        )
+        session.status = 'complete'
+        session.save(update_fields=['status', 'responses', 'ability', 'standardError', 'submission', 'currentQuestion'])
+        UserProfile.objects.filter(user_id=session.user_id).update(currentLevel=level)
+        invalidate_principals([session.user_id])
+        transaction.on_commit(partial(record_level, [session.user_id], level))
+        record_assessment_results([(session.user_id, dict(category_scores))])
+
+
+# Calibration
+
+def _fit_item(observations, iterations=25, ridge=0.01):
+    """
+    Fit ``logit P(correct) = a * theta + c`` by Newton's method with a small
+    ridge penalty, and return ``(discrimination, difficulty)``.
+    """
+    a, c = 1.0, 0.0
+    for _ in range(iterations):
+        g_a = -ridge * (a - 1.0)
+        g_c = -ridge * c
+        h_aa = h_ac = h_cc = ridge
+        for theta, correct in observations:
+            p = 1 / (1 + math.exp(-(a * theta + c)))
+            w = p * (1 - p)
+            g_a += (correct - p) * theta
+            g_c += correct - p
+            h_aa += w * theta * theta
+            h_ac += w * theta
+            h_cc += w
+        det = h_aa * h_cc - h_ac * h_ac
+        if det <= 0:
+            break
+        a += (h_cc * g_a - h_ac * g_c) / det
+        c += (h_aa * g_c - h_ac * g_a) / det
+    a = min(max(a, 0.2), 3.0)
+    return a, min(max(-c / a, -4.0), 4.0)
+
+
+def calibrate(assessment_id=None, min_responses=30, chunk_size=500):
+    """
+    Re-estimate question parameters from completed submissions.
+
+    A fixed-form submission's ability is the logit of its smoothed score; an
+    adaptive session contributes its final ability estimate. Questions with
+    fewer than ``min_responses`` observations keep their parameters. Returns
+    the number of questions updated.
+    """
+    submissions = AssessmentSubmission.objects.filter(status='complete')
+    if assessment_id:
+        submissions = submissions.filter(assessment_id=assessment_id)
+    adaptive_ability = dict(
+        PlacementSession.objects.filter(status='complete', submission__isnull=False)
+        .values_list('submission_id', 'ability')
+    )
+
+    observations = defaultdict(list)
+    keys = {}
+    for submission_id, submission_assessment_id, answers in submissions.values_list('id', 'assessment_id', 'answers').iterator(chunk_size=chunk_size):
+        if submission_assessment_id not in keys:
+            keys[submission_assessment_id] = get_item_bank(submission_assessment_id).answer_key
+        key = keys[submission_assessment_id]
+        graded = [(a.get('questionId'), key.is_correct(a.get('questionId'), a.get('answer'))) for a in answers]
+        graded = [(question_id, correct) for question_id, correct in graded if question_id in key.matchers]
+        if not graded:
+            continue
+        theta = adaptive_ability.get(submission_id)
+        if theta is None:
+            right = sum(correct for _, correct in graded)
+            theta = math.log((right + 0.5) / (len(graded) - right + 0.5))
+        for question_id, correct in graded:
+            observations[question_id].append((theta, int(correct)))
+
+    questions = list(Question.objects.filter(id__in=[q for q, obs in observations.items() if len(obs) >= min_responses]))
+    for question in questions:
+        question.discrimination, question.difficulty = _fit_item(observations[question.id])
+    with transaction.atomic():
+        Question.objects.bulk_update(questions, ['discrimination', 'difficulty'], batch_size=chunk_size)
+        for calibrated_assessment_id in {question.assessment_id for question in questions}:
+            invalidate_snapshot(calibrated_assessment_id)
+    return len(questions)
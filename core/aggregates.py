@@ -0,0 +1,162 @@
+"""
+Materialized per-user progress aggregates.
+
+Every graded exercise or assessment submission is folded into the user's
+UserProgressAggregate row under a row lock, so reading progress never scans
+submission history. ``rebuild`` recomputes the rows from history in chunks,
+using the same folding functions, to backfill or repair them; it also
+rebuilds the users' activity bitsets (core/activity.py).
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .activity import record_activity, replace_activity
+from .events import words_learned
+from .models import AssessmentSubmission, DailyActivity, Exercise, ExerciseSubmission, User, UserProgressAggregate
+
+SKILL_BY_TYPE = {
+    'fill_in_blank': 'grammar',
+    'sentence_construction': 'grammar',
+    'multiple_choice': 'vocabulary',
+    'listening': 'listening',
+}
+KNOWN_SKILLS = ('grammar', 'vocabulary', 'listening', 'reading')
+
+
+def exercise_skill(exercise_type, data):
+    if isinstance(data, dict) and data.get('category'):
+        return data['category']
+    return SKILL_BY_TYPE.get(exercise_type, 'grammar')
+
+
+# Folding
+
+def apply_answers(aggregate, graded):
+    """Fold ``(category, is_correct)`` pairs into the accuracy counters."""
+    for category, is_correct in graded:
+        stats = aggregate.categoryStats.setdefault(category, [0, 0])
+        stats[0] += int(is_correct)
+        stats[1] += 1
+        aggregate.answersCorrect += int(is_correct)
+        aggregate.answersTotal += 1
+
+
+def apply_exercise_submission(aggregate, topic_id, graded, stars):
+    apply_answers(aggregate, graded)
+    stats = aggregate.topicStats.setdefault(str(topic_id), [0, 0, 0])
+    stats[0] += sum(int(is_correct) for _, is_correct in graded)
+    stats[1] += len(graded)
+    if stars > stats[2]:
+        if stats[2] == 0:
+            # The first passing attempt completes the topic.
+            aggregate.completedTopics += 1
+        stats[2] = stars
+
+
+def apply_assessment_submission(aggregate, category_scores):
+    for category, (correct, total) in category_scores.items():
+        apply_answers(aggregate, [(category, True)] * correct + [(category, False)] * (total - correct))
+
+
+# Incremental maintenance
+
+def _locked_aggregate(user_id):
+    UserProgressAggregate.objects.bulk_create([UserProgressAggregate(user_id=user_id)], ignore_conflicts=True)
+    return UserProgressAggregate.objects.select_for_update().get(user_id=user_id)
+
+
+def record_exercise_submission(submission, exercises_by_id):
+    graded = [
+        (exercise_skill(exercises_by_id[r['exerciseId']].type, exercises_by_id[r['exerciseId']].data), r['isCorrect'])
+        for r in submission.results
+    ]
+    with transaction.atomic():
+        aggregate = _locked_aggregate(submission.user_id)
+        apply_exercise_submission(aggregate, submission.topic_id, graded, submission.starsEarned)
+        aggregate.save()
+        record_activity(submission.user_id, timezone.localdate())
+
+
+def record_assessment_results(results):
+    """Fold ``(user_id, category_scores)`` pairs from graded assessments."""
+    today = timezone.localdate()
+    with transaction.atomic():
+        for user_id, category_scores in results:
+            aggregate = _locked_aggregate(user_id)
+            apply_assessment_submission(aggregate, category_scores)
+            aggregate.save()
+            record_activity(user_id, today)
+
+
+# Rebuild
+
+def _rebuild_chunk(user_ids):
+    from .assessments import get_answer_key
+
+    aggregates = {user_id: UserProgressAggregate(user_id=user_id) for user_id in user_ids}
+    active_days = {user_id: set() for user_id in user_ids}
+
+    submissions = list(
+        ExerciseSubmission.objects.filter(user_id__in=user_ids)
+        .order_by('createdAt')
+        .values_list('user_id', 'topic_id', 'results', 'starsEarned', 'createdAt')
+    )
+    exercise_ids = {r['exerciseId'] for submission in submissions for r in submission[2] or ()}
+    skills = {
+        exercise_id: exercise_skill(exercise_type, data)
+        for exercise_id, exercise_type, data in Exercise.objects.filter(id__in=exercise_ids).values_list('id', 'type', 'data')
+    }
+    for user_id, topic_id, results, stars, created in submissions:
+        graded = [(skills.get(r['exerciseId'], 'grammar'), r['isCorrect']) for r in results or ()]
+        apply_exercise_submission(aggregates[user_id], topic_id, graded, stars)
+        active_days[user_id].add(timezone.localdate(created))
+
+    assessments = (
+        AssessmentSubmission.objects.filter(user_id__in=user_ids, status='complete')
+        .order_by('createdAt')
+        .values_list('user_id', 'assessment_id', 'answers', 'createdAt')
+    )
+    for user_id, assessment_id, answers, created in assessments:
+        key = get_answer_key(assessment_id)
+        category_scores = defaultdict(lambda: [0, 0])
+        for answer in answers:
+            category = key.categories.get(answer.get('questionId'))
+            if category is not None:
+                category_scores[category][0] += key.is_correct(answer.get('questionId'), answer.get('answer'))
+                category_scores[category][1] += 1
+        apply_assessment_submission(aggregates[user_id], category_scores)
+        active_days[user_id].add(timezone.localdate(created))
+
+    totals = DailyActivity.objects.filter(user_id__in=user_ids).values_list('user_id').annotate(Sum('studySeconds'))
+    for user_id, study_seconds in totals:
+        aggregates[user_id].studySeconds = study_seconds
+    for user_id, words in words_learned(user_ids).items():
+        aggregates[user_id].wordsLearned = words
+
+    with transaction.atomic():
+        UserProgressAggregate.objects.filter(user_id__in=user_ids).delete()
+        UserProgressAggregate.objects.bulk_create(aggregates.values())
+        replace_activity(active_days)
+
+
+def rebuild(chunk_size=500, progress=None):
+    """
+    Recompute every user's aggregate from history, ``chunk_size`` users per
+    transaction. ``progress`` is called with the number of users done.
+    """
+    done = 0
+    user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        chunk = user_ids.filter(pk__gt=last) if last is not None else user_ids
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return done
+        _rebuild_chunk(chunk)
+        done += len(chunk)
+        last = chunk[-1]
+        if progress is not None:
+            progress(done)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from . import assessments, bundles, catalogue  # noqa: F401  (connects signal receivers)
+        from . import checks  # noqa: F401  (registers system checks)
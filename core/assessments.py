@@ -0,0 +1,275 @@
+"""
+Immutable assessment snapshots.
+
+Publishing an assessment renders its public question list to the final
+AssessmentView response (plus a gzip variant) and extracts the answer key
+that graders need, keeping the two apart so the key is never served. A
+snapshot is identified by a hash of its contents and never changes; what
+moves is the per-assessment pointer to the current snapshot.
+
+Snapshots and pointers are stored in the Django cache and, when
+``ASSESSMENT_SNAPSHOT_DIR`` is set, on disk, so a cold cache is refilled
+without touching the database. Each pointer records the generation (see
+core/generations.py) of its assessment when it was published. Saving or
+deleting an Assessment or Question bumps that generation in the same
+transaction. The process that made the change drops its pointers on commit.
+Every process re-reads the generations at least every
+ASSESSMENT_SNAPSHOT_RECHECK seconds, and a pointer from an older generation
+is ignored, so the next reader publishes a new snapshot.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import generations
+from .grading import compile_answer
+from .models import Assessment, Question
+from .rendering import build_blob
+
+DEFAULT = 'default'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24 * 7
+
+_snapshots = {}
+_answer_keys = {}
+_checked = generations.Checked('ASSESSMENT_SNAPSHOT_RECHECK')
+_lock = threading.Lock()
+
+
+class AssessmentSnapshot:
+    """
+    One published version of an assessment.
+
+    ``body`` and ``body_gzip`` are the complete AssessmentView response,
+    ``answer_key`` lists ``(question_id, type, options, category,
+    correct_answer)`` for graders and ``item_params`` lists
+    ``(question_id, discrimination, difficulty)`` for the adaptive test.
+    """
+
+    def __init__(self, assessment_id, version, body, body_gzip, answer_key, item_params):
+        self.assessment_id = assessment_id
+        self.version = version
+        self.body = body
+        self.body_gzip = body_gzip
+        self.answer_key = answer_key
+        self.item_params = item_params
+
+    @property
+    def etag(self):
+        return self.version
+
+
+class AnswerKey:
+    """Compiled matchers and categories of every question of one assessment."""
+
+    def __init__(self, answer_key):
+        self.matchers = {}
+        self.categories = {}
+        for question_id, answer_type, options, category, correct_answer in answer_key:
+            self.matchers[question_id] = compile_answer(answer_type, correct_answer, options)
+            self.categories[question_id] = category
+
+    def __len__(self):
+        return len(self.matchers)
+
+    def is_correct(self, question_id, answer):
+        matcher = self.matchers.get(question_id)
+        return matcher is not None and bool(matcher(answer))
+
+
+# Storage
+
+def _pointer_key(name):
+    return f'assessment:current:{name}'
+
+
+def _snapshot_key(version):
+    return f'assessment:snapshot:{version}'
+
+
+def _snapshot_dir():
+    path = getattr(settings, 'ASSESSMENT_SNAPSHOT_DIR', None)
+    return Path(path) if path else None
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read(path):
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _store(snapshot, pointers):
+    cache.set(_snapshot_key(snapshot.version), snapshot, timeout=SNAPSHOT_TIMEOUT)
+    for name, pointer in pointers.items():
+        cache.set(_pointer_key(name), pointer, timeout=SNAPSHOT_TIMEOUT)
+
+    directory = _snapshot_dir()
+    if directory is not None:
+        version = snapshot.version
+        meta = {
+            'assessmentId': snapshot.assessment_id,
+            'answerKey': snapshot.answer_key,
+            'itemParams': snapshot.item_params,
+        }
+        _write_atomic(directory / f'{version}.json', snapshot.body)
+        _write_atomic(directory / f'{version}.json.gz', snapshot.body_gzip)
+        _write_atomic(directory / f'{version}.key.json', json.dumps(meta).encode())
+        for name, pointer in pointers.items():
+            _write_atomic(directory / f'current-{name}', '{} {}'.format(*pointer).encode())
+
+
+def _load_pointer(name):
+    """``(version, generation)`` of the snapshot ``name`` points to, or None."""
+    pointer = cache.get(_pointer_key(name))
+    if pointer is None and _snapshot_dir() is not None:
+        fields = (_read(_snapshot_dir() / f'current-{name}') or b'').decode().split()
+        if len(fields) == 2:
+            pointer = (fields[0], int(fields[1]))
+            cache.set(_pointer_key(name), pointer, timeout=SNAPSHOT_TIMEOUT)
+    return pointer
+
+
+def load_snapshot(version):
+    """The snapshot ``version`` if this process, the cache or the disk still has it, else None."""
+    with _lock:
+        snapshot = _snapshots.get(version)
+    if snapshot is None:
+        snapshot = cache.get(_snapshot_key(version))
+    if snapshot is None and _snapshot_dir() is not None:
+        directory = _snapshot_dir()
+        body = _read(directory / f'{version}.json')
+        body_gzip = _read(directory / f'{version}.json.gz')
+        meta = _read(directory / f'{version}.key.json')
+        if body and body_gzip and meta:
+            meta = json.loads(meta)
+            answer_key = [tuple(row) for row in meta['answerKey']]
+            item_params = [tuple(row) for row in meta['itemParams']]
+            snapshot = AssessmentSnapshot(meta['assessmentId'], version, body, body_gzip, answer_key, item_params)
+            cache.set(_snapshot_key(version), snapshot, timeout=SNAPSHOT_TIMEOUT)
+    if snapshot is not None:
+        with _lock:
+            _snapshots[version] = snapshot
+    return snapshot
+
+
+def _generation_name(name):
+    return f'assessment:{name}'
+
+
+def _drop_pointers(names):
+    for name in names:
+        _checked.forget(_generation_name(name))
+    cache.delete_many([_pointer_key(name) for name in names])
+    directory = _snapshot_dir()
+    if directory is not None:
+        for name in names:
+            (directory / f'current-{name}').unlink(missing_ok=True)
+
+
+# Publishing
+
+def publish_snapshot(assessment, default=False):
+    """Render and store a new snapshot of ``assessment`` and point to it."""
+    from .serializers import question_rows
+    names = [str(assessment.pk)] + ([DEFAULT] if default else [])
+    # Read before the rows, so a change committed while rendering leaves the pointers stale.
+    read_at = time.monotonic()
+    tags = [generations.current(_generation_name(name)) for name in names]
+    assessment = Assessment.objects.get(pk=assessment.pk)
+    # AssessmentSerializer's output, built from values_list rows.
+    _, body, body_gzip = build_blob({
+        "assessmentId": str(assessment.id),
+        "questions": question_rows.serialize(assessment.questions.all()),
+    })
+    questions = list(assessment.questions.all())
+    answer_key = [(q.id, q.type, q.options, q.category, q.correct_answer) for q in questions]
+    item_params = [(q.id, q.discrimination, q.difficulty) for q in questions]
+
+    digest = hashlib.sha256(body)
+    digest.update(json.dumps([answer_key, item_params], sort_keys=True).encode())
+    snapshot = AssessmentSnapshot(
+        str(assessment.id), digest.hexdigest()[:32], body, body_gzip, answer_key, item_params
+    )
+
+    _store(snapshot, {name: (snapshot.version, generation) for name, generation in zip(names, tags)})
+    with _lock:
+        _snapshots[snapshot.version] = snapshot
+    for name, generation in zip(names, tags):
+        _checked.seen(_generation_name(name), generation, read_at)
+    return snapshot
+
+
+def get_snapshot(assessment_id=None):
+    """
+    Return the current snapshot of an assessment, publishing one if needed.
+
+    Without ``assessment_id`` the default assessment (the one served by
+    AssessmentView) is used. Returns None if there is no such assessment.
+    """
+    name = str(assessment_id) if assessment_id else DEFAULT
+    pointer = _load_pointer(name)
+    if pointer is not None and pointer[1] == _checked.get(_generation_name(name)):
+        snapshot = load_snapshot(pointer[0])
+        if snapshot is not None:
+            return snapshot
+
+    if assessment_id:
+        assessment = Assessment.objects.filter(pk=assessment_id).first()
+        default = False
+    else:
+        assessment = Assessment.objects.first()
+        default = True
+    if assessment is None:
+        return None
+    return publish_snapshot(assessment, default=default)
+
+
+def get_answer_key(assessment_id):
+    snapshot = get_snapshot(assessment_id)
+    if snapshot is None:
+        return AnswerKey([])
+    with _lock:
+        key = _answer_keys.get(snapshot.version)
+    if key is None:
+        key = AnswerKey(snapshot.answer_key)
+        with _lock:
+            _answer_keys[snapshot.version] = key
+    return key
+
+
+def invalidate_snapshot(assessment_id):
+    """Stop serving the current snapshot once the surrounding transaction commits."""
+    names = [str(assessment_id), DEFAULT]
+    for name in names:
+        generations.bump(_generation_name(name))
+    transaction.on_commit(lambda: _drop_pointers(names))
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_snapshot(sender, instance, **kwargs):
+    invalidate_snapshot(instance.assessment_id)
+
+
+@receiver(post_save, sender=Assessment)
+@receiver(post_delete, sender=Assessment)
+def invalidate_assessment_snapshot(sender, instance, **kwargs):
+    invalidate_snapshot(instance.id)
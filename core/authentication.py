@@ -0,0 +1,207 @@
+"""
+JWT authentication without a user query on hot read endpoints.
+
+Tokens issued at login (PrincipalRefreshToken) also carry ``is_active`` and
+the profile's id and ``currentLevel``; access tokens copy them from their
+refresh token. PrincipalJWTAuthentication, used by the read-only endpoints,
+authenticates safe requests from those signed claims: the user becomes an
+unsaved-looking User instance with only ``id`` and ``is_active`` set and a
+profile with only ``id`` and ``currentLevel``, enough for views that use
+``request.user.pk``. Unsafe requests, and tokens without the claims, load
+the user as JWTAuthentication does.
+
+Refresh and logout use PrincipalRefreshToken too, so blacklist checks go
+through the revoked-token filter of core/revocation.py.
+
+Principals are kept in a small per-process LRU for PRINCIPAL_CACHE_TTL
+seconds. Saving or deleting a User or UserProfile, or a queryset update
+followed by ``invalidate_principals`` (as placement results change
+``currentLevel``), marks the user stale in that LRU and, once committed, records the time of the change in the cache
+named by PRINCIPAL_CHANGES_CACHE. Every request checks that marker. Claims
+from a token issued before the change, and principals loaded before it, are
+not trusted, and the user is loaded from the database instead. Tokens
+refreshed after the change come from a refresh that checked the user is
+still active. The marker reaches other processes only when that cache is
+shared by them. Otherwise they trust the old claims until the access token
+expires. Set JWT_TRUST_CLAIMS to False to always load users.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User, UserProfile
+from .revocation import revoked
+
+IS_ACTIVE_CLAIM = 'is_active'
+PROFILE_ID_CLAIM = 'profile_id'
+LEVEL_CLAIM = 'level'
+
+# Stored in place of a principal: the next request must load the user.
+STALE = object()
+
+# Outlives every access token issued before the change it records.
+CHANGE_MARKER_SLACK = 60
+
+
+class PrincipalRefreshToken(RefreshToken):
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        profile_id, level = UserProfile.objects.filter(user_id=user.pk).values_list('id', 'currentLevel').first() or (None, None)
+        token[IS_ACTIVE_CLAIM] = user.is_active
+        token[PROFILE_ID_CLAIM] = profile_id
+        token[LEVEL_CLAIM] = level
+        return token
+
+    def check_blacklist(self):
+        # Most tokens are not revoked; the Bloom filter answers those without a query.
+        if revoked.may_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted, created = super().blacklist()
+        revoked.add(self.payload[api_settings.JTI_CLAIM])
+        if not created:
+            # Already revoked: a replay that got past a stale revoked-token filter.
+            raise TokenError(_("Token is blacklisted"))
+        return blacklisted, created
+
+
+class PrincipalCache:
+    """
+    Thread-safe LRU of ``{user_id: principal}`` whose entries expire after
+    ``ttl`` seconds. Each entry remembers when its data was current.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, since=None):
+        """The cached principal, or None if it expired or its data predates ``since`` (a timestamp)."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic() or (since is not None and entry[2] <= since):
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, principal, loaded_at=None):
+        with self._lock:
+            self._entries[user_id] = time.monotonic() + self.ttl, principal, time.time() if loaded_at is None else loaded_at
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self.set(user_id, STALE)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principals = PrincipalCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+
+def _changed_key(user_id):
+    return f'principal:changed:{user_id}'
+
+
+def changed_at(user_id):
+    """When ``user_id`` was last saved or deleted, if that is recent enough to matter."""
+    return caches[settings.PRINCIPAL_CHANGES_CACHE].get(_changed_key(user_id))
+
+
+def mark_changed(user_id):
+    caches[settings.PRINCIPAL_CHANGES_CACHE].set(
+        _changed_key(user_id), time.time(), timeout=settings.PRINCIPAL_CACHE_TTL + CHANGE_MARKER_SLACK
+    )
+
+
+def build_principal(user_id, is_active, profile_id, level):
+    user = User(id=user_id, is_active=is_active)
+    user._state.adding = False
+    user._state.db = 'default'
+    if profile_id is not None:
+        profile = UserProfile(id=profile_id, user_id=user.id, currentLevel=level)
+        profile._state.adding = False
+        profile._state.db = 'default'
+        user.profile = profile
+    return user
+
+
+class PrincipalJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that answers safe requests from token claims and a principal cache."""
+
+    def authenticate(self, request):
+        self.trust_claims = settings.JWT_TRUST_CLAIMS and request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not self.trust_claims:
+            return super().get_user(validated_token)
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+
+        changed = changed_at(user_id)
+        principal, loaded_at = principals.get(user_id, since=changed), None
+        issued_at = validated_token.get('iat', 0)
+        if principal is None and IS_ACTIVE_CLAIM in validated_token and (changed is None or issued_at > changed):
+            principal = build_principal(
+                user_id, validated_token[IS_ACTIVE_CLAIM],
+                validated_token.get(PROFILE_ID_CLAIM), validated_token.get(LEVEL_CLAIM),
+            )
+            loaded_at = issued_at
+        if principal is None or principal is STALE:
+            loaded_at = time.time()
+            row = User.objects.filter(pk=user_id).values_list('is_active', 'profile__id', 'profile__currentLevel').first()
+            if row is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            principal = build_principal(user_id, *row)
+        principals.set(user_id, principal, loaded_at)
+
+        if not principal.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return principal
+
+
+def invalidate_principals(user_ids):
+    """Stop trusting the claims and cached principals of ``user_ids`` once the current transaction commits."""
+    for user_id in map(str, user_ids):
+        principals.invalidate(user_id)
+        transaction.on_commit(partial(mark_changed, user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_principal(sender, instance, **kwargs):
+    invalidate_principals([instance.pk])
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_principal(sender, instance, **kwargs):
+    invalidate_principals([instance.user_id])
@@ -0,0 +1,131 @@
+"""
+Offline learning bundles.
+
+A bundle is everything the client needs to study a module offline: the module
+itself plus the content and exercises of every topic, in the shapes of
+TopicContentSerializer and ExerciseSerializer. Bundles are built once per
+catalogue version, stored pre-rendered and pre-compressed in the catalogue
+cache, and versioned so that clients can ask only for topics changed since
+the bundle they already hold.
+
+Revisions come from a counter row in the database (see core/generations.py)
+that stays locked until the transaction that took a revision commits. They
+are therefore handed out in commit order, and a client that holds a bundle
+at some version never misses a change committed after it with a lower
+revision. Catalogue writes are serialized on that row, which is cheap at the
+rate the catalogue changes. A bundle's version is the highest revision of the
+module and its topics.
+"""
+import time
+from bisect import bisect_right
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import generations
+from .catalogue import catalogue_cache
+from .models import Exercise, Module, Topic, TopicContent
+from .rendering import build_blob
+
+
+REVISION_COUNTER = 'bundle:revision'
+
+
+def _first_revision():
+    return time.time_ns() // 1000
+
+
+def next_revision():
+    return generations.bump(REVISION_COUNTER, start=_first_revision)
+
+
+def _topic_payload(topic, content, exercises):
+    from .serializers import TopicContentSerializer
+    if content is not None:
+        payload = dict(TopicContentSerializer(content).data)
+    else:
+        payload = {"id": topic.id, "title": topic.title, "content": None}
+    payload["revision"] = topic.revision
+    payload["exercises"] = exercises
+    return payload
+
+
+def _load_bundle(module_id):
+    module = Module.objects.filter(id=module_id).first()
+    if module is None:
+        return None
+
+    topics = list(Topic.objects.filter(module=module).order_by('order', 'id'))
+    contents = {c.topic_id: c for c in TopicContent.objects.filter(topic__module=module).defer('rendered', 'rendered_gzip')}
+    from .serializers import exercise_rows
+    exercises = exercise_rows.serialize_by(Exercise.objects.filter(topic__module=module).order_by('id'), 'topic_id')
+
+    topic_payloads = []
+    for topic in topics:
+        content = contents.get(topic.id)
+        if content is not None:
+            content.topic = topic
+        topic_payloads.append(_topic_payload(topic, content, exercises.get(topic.id, [])))
+
+    return {
+        "moduleId": module.id,
+        "title": module.title,
+        "version": max([module.revision] + [topic.revision for topic in topics]),
+        "topicIds": [topic.id for topic in topics],
+        "topics": topic_payloads,
+    }
+
+
+def get_module_bundle(module_id):
+    """Return the unrendered bundle of a module, or None if it does not exist."""
+    return catalogue_cache.get(f'bundle:{module_id}', lambda: _load_bundle(module_id))
+
+
+def get_module_bundle_blob(module_id, since=None):
+    """
+    Return ``(etag, body, body_gzip)`` for a module bundle, or None if the
+    module does not exist.
+
+    With ``since`` only the topics whose revision is newer are included;
+    ``topicIds`` always lists every current topic so that clients can drop
+    the ones that were removed.
+    """
+    bundle = get_module_bundle(module_id)
+    if bundle is None:
+        return None
+    if since is not None:
+        # A delta only depends on which topics are newer than ``since``, so it
+        # is snapped down to the closest topic revision, and below the oldest
+        # one the full bundle is sent. Arbitrary client values thus map onto
+        # one key per topic at most.
+        revisions = sorted(topic["revision"] for topic in bundle["topics"])
+        i = bisect_right(revisions, since)
+        since = revisions[i - 1] if i else None
+
+    def load():
+        data = dict(bundle, since=since)
+        if since is not None:
+            data["topics"] = [topic for topic in bundle["topics"] if topic["revision"] > since]
+        return build_blob(data)
+    return catalogue_cache.get(f'bundle:{module_id}:since:{since}', load)
+
+
+@receiver(pre_save, sender=Module)
+@receiver(pre_save, sender=Topic)
+def stamp_revision(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.revision = next_revision()
+
+
+@receiver(post_save, sender=TopicContent)
+@receiver(post_delete, sender=TopicContent)
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def bump_topic_revision(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Topic.objects.filter(pk=instance.topic_id).update(revision=next_revision())
+
+
+@receiver(post_delete, sender=Topic)
+def bump_module_revision(sender, instance, **kwargs):
+    Module.objects.filter(pk=instance.module_id).update(revision=next_revision())
@@ -0,0 +1,180 @@
+"""
+Versioned read-through cache for the curriculum catalogue.
+
+The curriculum changes rarely compared to how often it is read, so anything
+derived from it is keyed on a global catalogue version. The version is the
+``catalogue`` generation (see core/generations.py), bumped in the transaction
+that saves or deletes a catalogue row. Every process re-reads it at least
+every CATALOGUE_VERSION_RECHECK seconds, and the process that made the change
+at once, so a change reaches all processes even when the Django cache is
+per-process.
+
+TopicContent additionally carries its fully rendered response (see
+core/rendering.py), refreshed here whenever the content or its topic is saved.
+
+Entries are kept in a small in-process LRU in front of the Django cache, so a
+warm worker answers catalogue reads without queries between version checks.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import generations
+from .models import Exercise, Module, Topic, TopicContent
+from .rendering import build_blob
+
+CATALOGUE_GENERATION = 'catalogue'
+
+_MISSING = object()
+
+_checked = generations.Checked('CATALOGUE_VERSION_RECHECK')
+
+
+def get_catalogue_version():
+    return _checked.get(CATALOGUE_GENERATION)
+
+
+def bump_catalogue_version():
+    version = generations.bump(CATALOGUE_GENERATION)
+    _checked.forget(CATALOGUE_GENERATION)
+    # Other threads of this process may have re-read the old version before the commit.
+    transaction.on_commit(lambda: _checked.forget(CATALOGUE_GENERATION))
+    return version
+
+
+class CatalogueCache:
+    """
+    In-process LRU backed by the Django cache.
+
+    ``get(name, loader)`` returns the value stored under ``name`` for the
+    current catalogue version, calling ``loader`` only when neither cache
+    level has it. ``None`` is a valid cached value.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, loader):
+        key = f'catalogue:{get_catalogue_version()}:{name}'
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            cache.set(key, value, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+catalogue_cache = CatalogueCache(maxsize=settings.CATALOGUE_CACHE_SIZE)
+
+
+def _load_curriculum():
+    modules = list(Module.objects.order_by('order', 'id'))
+    topics_by_module = {module.id: [] for module in modules}
+    for topic_id, module_id, title in Topic.objects.order_by('order', 'id').values_list('id', 'module_id', 'title'):
+        topics_by_module[module_id].append((topic_id, title))
+    return {
+        'modules': {module.id: module for module in modules},
+        'order': [module.id for module in modules],
+        'topics_by_module': topics_by_module,
+    }
+
+
+def get_curriculum():
+    """
+    Return every module and the ordered ``(topic_id, title)`` pairs under it.
+
+    ``modules`` maps ids to Module instances, ``order`` lists module ids in
+    curriculum order and ``topics_by_module`` maps module ids to topic lists.
+    """
+    return catalogue_cache.get('curriculum', _load_curriculum)
+
+
+def render_topic_content(content):
+    """Render the final TopicContentView response bytes onto ``content``."""
+    from .serializers import TopicContentSerializer
+    content.etag, content.rendered, content.rendered_gzip = build_blob(TopicContentSerializer(content).data)
+
+
+def get_topic_content_blob(topic_id):
+    """
+    Return ``(etag, body, body_gzip)`` for a topic's content, or None if it has none.
+
+    The bytes are the complete pre-rendered TopicContentView response.
+    """
+    def load():
+        row = TopicContent.objects.filter(topic_id=topic_id).values_list('etag', 'rendered', 'rendered_gzip').first()
+        if row is None:
+            return None
+        if not row[0]:
+            # Written without going through save(), e.g. bulk_create. Rendered
+            # here only for the cache; reads never write, and the next save
+            # stores the body.
+            content = TopicContent.objects.select_related('topic').get(topic_id=topic_id)
+            render_topic_content(content)
+            row = (content.etag, content.rendered, content.rendered_gzip)
+        etag, body, body_gzip = row
+        return etag, bytes(body), bytes(body_gzip)
+    return catalogue_cache.get(f'topic-content:{topic_id}', load)
+
+
+def get_topic_exercises(topic_id):
+    """Return the serialized exercise list of a topic, or None if there is no such topic."""
+    def load():
+        # TopicExerciseSerializer's output, built from values_list rows.
+        from .serializers import exercise_rows
+        topic = Topic.objects.filter(id=topic_id).values_list('id', 'title').first()
+        if topic is None:
+            return None
+        return {"topicId": topic[0], "topicTitle": topic[1], "exercises": exercise_rows.serialize(Exercise.objects.filter(topic_id=topic_id))}
+    return catalogue_cache.get(f'topic-exercises:{topic_id}', load)
+
+
+@receiver(pre_save, sender=TopicContent)
+def render_topic_content_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        render_topic_content(instance)
+
+
+@receiver(post_save, sender=Topic)
+def rerender_topic_content(sender, instance, created, raw=False, **kwargs):
+    # The rendered content embeds the topic title.
+    if created or raw:
+        return
+    content = TopicContent.objects.filter(topic=instance).first()
+    if content is not None:
+        content.topic = instance
+        content.save(update_fields=['etag', 'rendered', 'rendered_gzip'])
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+@receiver(post_save, sender=TopicContent)
+@receiver(post_delete, sender=TopicContent)
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def invalidate_catalogue(sender, **kwargs):
+    # Bumped in the same transaction, so other connections see the new
+    # version exactly when they can see the new rows.
+    bump_catalogue_version()
@@ -0,0 +1,34 @@
+"""
+System checks for settings that are only safe in some deployments.
+
+They run with ``manage.py check --deploy``.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Warning, register
+
+# Settings naming a cache that every worker process must share: the message
+# class and id to report otherwise, and what goes wrong.
+SHARED_CACHES = {
+    'THROTTLE_CACHE': (Warning, 'core.W001', 'Each process keeps its own token buckets, so N workers allow N times every rate.'),
+    'PRINCIPAL_CHANGES_CACHE': (Warning, 'core.W002', 'Other processes keep trusting the claims of a deactivated user until their access token expires.'),
+    'NOTIFY_CACHE': (Warning, 'core.W003', 'Grading workers cannot wake the long-polls of web processes, which then only answer at their timeout.'),
+    'LEADERBOARD_CACHE': (Warning, 'core.W004', 'Each process builds and updates its own leaderboards, which disagree until they expire or are reconciled.'),
+    'IDEMPOTENCY_CACHE': (Error, 'core.E001', 'Each process keeps its own key reservations, so a retry that reaches another worker runs again.'),
+}
+
+
+@register(deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    messages = []
+    for setting, (level, check_id, consequence) in SHARED_CACHES.items():
+        alias = getattr(settings, setting)
+        if isinstance(caches[alias], (LocMemCache, DummyCache)):
+            messages.append(level(
+                f"{setting} names the per-process cache '{alias}'.",
+                hint=f'{consequence} Point it at a cache shared by every worker, such as redis or memcached.',
+                id=check_id,
+            ))
+    return messages
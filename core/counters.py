@@ -0,0 +1,127 @@
+"""
+Denormalized UserProfile counters.
+
+``UserProfile.totalStars`` is the sum of the user's best stars per topic
+(``UserTopicProgress.stars``) and ``completedModules`` the number of their
+UserModuleProgress rows with status ``completed``. Both are kept current with
+``F()`` deltas, applied in the same transaction as the change they count and
+only for rows that change actually touched, so concurrent submissions can
+neither lose nor double count an update.
+
+``reconcile`` (``manage.py reconcile_counters``) recomputes the counters of a
+chunk of users with two grouped queries and bulk-updates the ones that
+drifted.
+"""
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .leaderboard import record_stars
+from .models import UserModuleProgress, UserProfile, UserTopicProgress
+
+COMPLETED = 'completed'
+
+
+def record_topic_stars(user_id, topic_id, stars):
+    """
+    Raise the user's best stars on a topic to ``stars`` and add the
+    difference to ``totalStars``. Returns the stars gained.
+    """
+    with transaction.atomic():
+        UserTopicProgress.objects.bulk_create([UserTopicProgress(user_id=user_id, topic_id=topic_id)], ignore_conflicts=True)
+        # The row lock orders concurrent submissions on the same topic, so
+        # each one sees the best the previous one left.
+        progress = UserTopicProgress.objects.select_for_update().get(user_id=user_id, topic_id=topic_id)
+        gained = stars - progress.stars
+        if gained <= 0:
+            return 0
+        progress.stars = stars
+        progress.save(update_fields=['stars'])
+        UserProfile.objects.filter(user_id=user_id).update(totalStars=F('totalStars') + gained)
+        transaction.on_commit(partial(record_stars, user_id, gained))
+    return gained
+
+
+def set_module_statuses(changes):
+    """
+    Set the status of users' module progress, where ``changes`` maps
+    ``(user_id, module_id)`` to a status, and move each user's
+    ``completedModules`` by the number of their rows entering or leaving
+    ``completed``. Rows are updated with one UPDATE per target status and the
+    counters with one UPDATE per distinct delta. Returns ``{user_id: delta}``.
+    """
+    deltas = Counter()
+    if not changes:
+        return deltas
+    with transaction.atomic():
+        rows = UserModuleProgress.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in changes}, module_id__in={module_id for _, module_id in changes}
+        ).values_list('id', 'user_id', 'module_id', 'status')
+        ids_by_status = defaultdict(list)
+        for row_id, user_id, module_id, current in rows:
+            status = changes.get((user_id, module_id))
+            if status is None or status == current:
+                continue
+            ids_by_status[status].append(row_id)
+            deltas[user_id] += (status == COMPLETED) - (current == COMPLETED)
+        for status, ids in ids_by_status.items():
+            UserModuleProgress.objects.filter(id__in=ids).update(status=status)
+
+        users_by_delta = defaultdict(list)
+        for user_id, delta in deltas.items():
+            if delta:
+                users_by_delta[delta].append(user_id)
+        for delta, user_ids in users_by_delta.items():
+            UserProfile.objects.filter(user_id__in=user_ids).update(completedModules=F('completedModules') + delta)
+    return deltas
+
+
+# Reconciliation
+
+def _reconcile_chunk(user_ids, dry_run):
+    with transaction.atomic():
+        # Lock the profiles first: a concurrent delta then either lands
+        # before the sums are read or waits and applies on top of the fix.
+        profiles = list(
+            UserProfile.objects.select_for_update().filter(user_id__in=user_ids)
+            .only('id', 'user_id', 'totalStars', 'completedModules')
+        )
+        stars = dict(
+            UserTopicProgress.objects.filter(user_id__in=user_ids)
+            .values_list('user_id').annotate(Sum('stars'))
+        )
+        completed = dict(
+            UserModuleProgress.objects.filter(user_id__in=user_ids)
+            .values_list('user_id').annotate(completed=Count('id', filter=Q(status=COMPLETED)))
+        )
+        drifted = []
+        for profile in profiles:
+            expected = stars.get(profile.user_id) or 0, completed.get(profile.user_id) or 0
+            if (profile.totalStars, profile.completedModules) != expected:
+                profile.totalStars, profile.completedModules = expected
+                drifted.append(profile)
+        if drifted and not dry_run:
+            UserProfile.objects.bulk_update(drifted, ['totalStars', 'completedModules'])
+    return drifted
+
+
+def reconcile(chunk_size=1000, dry_run=False, progress=None):
+    """
+    Recompute every user's counters, ``chunk_size`` users per transaction,
+    and fix the ones that drifted unless ``dry_run``. ``progress`` is called
+    with the number of users checked. Returns the drifted UserProfiles, with
+    the corrected values.
+    """
+    drifted, done, last = [], 0, None
+    user_ids = UserProfile.objects.order_by('user_id').values_list('user_id', flat=True)
+    while True:
+        chunk = list((user_ids.filter(user_id__gt=last) if last is not None else user_ids)[:chunk_size])
+        if not chunk:
+            return drifted
+        drifted += _reconcile_chunk(chunk, dry_run)
+        done += len(chunk)
+        last = chunk[-1]
+        if progress is not None:
+            progress(done)
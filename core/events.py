@@ -0,0 +1,249 @@
+"""
+Append-only learning event log.
+
+``emit`` only appends to an in-process buffer; the buffer is written with a
+single ``bulk_create`` once it holds LEARNING_EVENT_BUFFER_SIZE events or its
+oldest event is LEARNING_EVENT_FLUSH_INTERVAL seconds old. With
+LEARNING_EVENT_BACKGROUND_FLUSH a daemon thread does the writing, so request
+handlers never wait on an INSERT, and whatever is left is flushed at
+interpreter exit. Without it (as in the test run, see core/testing.py) only
+the size threshold applies, the emitting call flushes inline when it is
+reached, and anything else is written by an explicit ``flush_events()``.
+
+Events can outlive what they point at: a user, topic or module deleted while
+its events sit in the buffer makes the batch fail on a foreign key. The batch
+is then written again without those references, the way the foreign keys
+treat the rows already written: events of deleted users are dropped and
+deleted topics and modules are cleared.
+
+``rollup`` turns one day of events into DailyActivity rows.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, time as day_time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DailyActivity, LearningEvent, Module, Topic, User, UserProgressAggregate
+
+logger = logging.getLogger(__name__)
+
+TOPIC_OPENED = 'topic_opened'
+EXERCISE_SUBMITTED = 'exercise_submitted'
+ASSESSMENT_SUBMITTED = 'assessment_submitted'
+MODULE_UNLOCKED = 'module_unlocked'
+
+# Gaps between consecutive events longer than this start a new study session;
+# the last event of a session is credited with EVENT_CREDIT seconds.
+SESSION_GAP = 30 * 60
+EVENT_CREDIT = 60
+
+
+class EventBuffer:
+
+    def __init__(self):
+        self._events = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def emit(self, event):
+        self._ensure_flusher()
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.append(event)
+            full = len(self._events) >= settings.LEARNING_EVENT_BUFFER_SIZE
+        if not full:
+            return
+        if settings.LEARNING_EVENT_BACKGROUND_FLUSH:
+            self._wake.set()
+        else:
+            self.flush()
+
+    def _due(self):
+        return bool(self._events) and (
+            len(self._events) >= settings.LEARNING_EVENT_BUFFER_SIZE
+            or time.monotonic() - self._oldest >= settings.LEARNING_EVENT_FLUSH_INTERVAL
+        )
+
+    def flush(self):
+        """Write every buffered event; returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+            try:
+                try:
+                    _write(events)
+                except IntegrityError:
+                    kept = _without_orphans(events)
+                    if len(kept) < len(events):
+                        logger.warning("Dropped %d learning events of deleted users", len(events) - len(kept))
+                    _write(kept)
+                    return len(kept)
+            except Exception:
+                # Losing a batch of analytics events must not take a request down.
+                logger.exception("Dropped %d learning events", len(events))
+                return 0
+            return len(events)
+
+    def clear(self):
+        with self._lock:
+            self._events = []
+
+    def __len__(self):
+        return len(self._events)
+
+    def _ensure_flusher(self):
+        # The buffer and its thread do not survive a fork; start over in the child.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._events, self._oldest = [], None
+            if settings.LEARNING_EVENT_BACKGROUND_FLUSH:
+                threading.Thread(target=self._run, name='learning-event-flusher', daemon=True).start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.LEARNING_EVENT_FLUSH_INTERVAL)
+            self._wake.clear()
+            with self._lock:
+                due = self._due()
+            if due:
+                close_old_connections()
+                self.flush()
+
+
+def _write(events):
+    for event in events:
+        event.pk = None  # set by a failed attempt whose insert was rolled back
+    LearningEvent.objects.bulk_create(events, batch_size=settings.LEARNING_EVENT_BUFFER_SIZE)
+
+
+def _existing(model, ids):
+    ids = {str(pk) for pk in ids if pk is not None}
+    return {str(pk) for pk in model.objects.filter(pk__in=ids).values_list('pk', flat=True)} if ids else set()
+
+
+def _without_orphans(events):
+    users = _existing(User, (event.user_id for event in events))
+    topics = _existing(Topic, (event.topic_id for event in events))
+    modules = _existing(Module, (event.module_id for event in events))
+    kept = []
+    for event in events:
+        if str(event.user_id) not in users:
+            continue
+        if event.topic_id is not None and str(event.topic_id) not in topics:
+            event.topic_id = None
+        if event.module_id is not None and str(event.module_id) not in modules:
+            event.module_id = None
+        kept.append(event)
+    return kept
+
+
+event_buffer = EventBuffer()
+
+
+def emit(user_id, kind, topic_id=None, module_id=None, **data):
+    event_buffer.emit(LearningEvent(
+        user_id=user_id, kind=kind, topic_id=topic_id, module_id=module_id, data=data, createdAt=timezone.now()
+    ))
+
+
+def flush_events():
+    return event_buffer.flush()
+
+
+# Rollup
+
+def _study_seconds(timestamps):
+    seconds = 0
+    for previous, current in zip(timestamps, timestamps[1:]):
+        gap = (current - previous).total_seconds()
+        seconds += gap if gap <= SESSION_GAP else EVENT_CREDIT
+    return int(seconds) + EVENT_CREDIT if timestamps else 0
+
+
+def rollup(day, chunk_size=2000):
+    """
+    Recompute DailyActivity for ``day`` from the event log and refresh the
+    study time and word totals of the affected users' progress aggregates.
+    Running it again for the same day is harmless. Returns the number of
+    users with activity that day.
+    """
+    start = timezone.make_aware(datetime.combine(day, day_time.min))
+    events = (
+        LearningEvent.objects.filter(createdAt__gte=start, createdAt__lt=start + timedelta(days=1))
+        .order_by('user_id', 'createdAt')
+        .values_list('user_id', 'kind', 'data', 'createdAt')
+    )
+
+    timestamps = defaultdict(list)
+    counts = defaultdict(lambda: defaultdict(int))
+    words = defaultdict(set)
+    for user_id, kind, data, created in events.iterator(chunk_size=chunk_size):
+        timestamps[user_id].append(created)
+        counts[user_id][kind] += 1
+        if kind == EXERCISE_SUBMITTED:
+            words[user_id].update(data.get('vocabularyLearned', ()))
+
+    rows = [
+        DailyActivity(
+            user_id=user_id,
+            day=day,
+            events=len(timestamps[user_id]),
+            topicsOpened=counts[user_id][TOPIC_OPENED],
+            exercisesSubmitted=counts[user_id][EXERCISE_SUBMITTED],
+            assessmentsSubmitted=counts[user_id][ASSESSMENT_SUBMITTED],
+            studySeconds=_study_seconds(timestamps[user_id]),
+            wordsLearned=len(words[user_id]),
+        )
+        for user_id in timestamps
+    ]
+    with transaction.atomic():
+        DailyActivity.objects.filter(day=day).delete()
+        DailyActivity.objects.bulk_create(rows, batch_size=chunk_size)
+        _refresh_activity_totals(list(timestamps))
+    return len(rows)
+
+
+def words_learned(user_ids):
+    """``{user_id: count}`` of the distinct words in each user's whole event log."""
+    words = defaultdict(set)
+    events = LearningEvent.objects.filter(user_id__in=user_ids, kind=EXERCISE_SUBMITTED).values_list('user_id', 'data')
+    for user_id, data in events.iterator(chunk_size=2000):
+        words[user_id].update(data.get('vocabularyLearned', ()))
+    return {user_id: len(learned) for user_id, learned in words.items()}
+
+
+def _refresh_activity_totals(user_ids):
+    if not user_ids:
+        return
+    UserProgressAggregate.objects.bulk_create(
+        [UserProgressAggregate(user_id=user_id) for user_id in user_ids], ignore_conflicts=True
+    )
+    study_seconds = dict(
+        DailyActivity.objects.filter(user_id__in=user_ids).values_list('user_id').annotate(Sum('studySeconds'))
+    )
+    # Counted over the whole log rather than summed over days, so a word
+    # learned on several days, or an event written twice, counts once.
+    words = words_learned(user_ids)
+    aggregates = list(UserProgressAggregate.objects.filter(user_id__in=user_ids))
+    for aggregate in aggregates:
+        aggregate.studySeconds, aggregate.wordsLearned = study_seconds[aggregate.user_id], words.get(aggregate.user_id, 0)
+    UserProgressAggregate.objects.bulk_update(aggregates, ['studySeconds', 'wordsLearned'])
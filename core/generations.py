@@ -0,0 +1,68 @@
+"""
+Generation counters shared through the database.
+
+A process-local cache tags what it holds with the generation of its source
+and compares that with the counter here, so a change made by any process
+reaches every process, however the Django cache is configured. ``bump``
+belongs inside the transaction that makes the change: the row lock it takes
+orders concurrent bumps, and other connections see the new value exactly
+when they can see the change.
+
+``Checked`` keeps this process's reading of some counters and re-reads them
+once they are older than a configured number of seconds, which bounds how
+long a change made elsewhere can go unseen without a query per read.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Generation
+
+
+def current(name):
+    """The generation of ``name``; 0 until it is first bumped."""
+    return Generation.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+def bump(name, start=None):
+    """
+    Advance the generation of ``name`` and return the new value. A counter
+    that does not exist yet starts after ``start()``, or a random value.
+    """
+    if not Generation.objects.filter(name=name).update(value=F('value') + 1):
+        # A random start keeps a re-created counter from repeating a generation a process has seen.
+        value = random.getrandbits(62) if start is None else start()
+        Generation.objects.bulk_create([Generation(name=name, value=value)], ignore_conflicts=True)
+        Generation.objects.filter(name=name).update(value=F('value') + 1)
+    return current(name)
+
+
+class Checked:
+    """Generations as last read by this process, re-read after ``settings.<interval_setting>`` seconds."""
+
+    def __init__(self, interval_setting):
+        self.interval_setting = interval_setting
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._values.get(name)
+        if checked is not None and now - checked[1] < getattr(settings, self.interval_setting):
+            return checked[0]
+        value = current(name)
+        self.seen(name, value, now)
+        return value
+
+    def seen(self, name, value, at):
+        """Record ``value`` as read from the database at monotonic time ``at``."""
+        with self._lock:
+            self._values[name] = (value, at)
+
+    def forget(self, name):
+        with self._lock:
+            self._values.pop(name, None)
@@ -0,0 +1,168 @@
+"""
+Exercise grading.
+
+Every ``Exercise.correct_answer`` is compiled once into a matcher for its
+exercise type; matchers are cached on the type and the answer itself, so a
+popular exercise is never re-compiled. A submission is graded in a single
+pass over exercises loaded with one query.
+
+Supported types:
+
+* ``multiple_choice`` - the answer is the index of the correct option.
+* ``fill_in_blank`` - the answer is the missing word (or one of several
+  accepted words), compared case- and whitespace-insensitively. An option
+  index is accepted too when the exercise lists ``options``.
+* ``sentence_construction`` - the answer is the order of ``words``, either as
+  a list of indices or as the resulting sentence.
+* anything else (e.g. ``listening``) - free text compared like fill in the
+  blank.
+"""
+import json
+from functools import lru_cache
+
+
+def normalize_text(value):
+    return ' '.join(str(value).split()).casefold().rstrip('.!?')
+
+
+def _as_index(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _compile_multiple_choice(correct, options, words):
+    correct_index = _as_index(correct)
+    return lambda answer: correct_index is not None and _as_index(answer) == correct_index
+
+
+def _compile_text(correct, options, words):
+    accepted = frozenset(normalize_text(c) for c in (correct if isinstance(correct, list) else [correct]))
+
+    def match(answer):
+        index = _as_index(answer)
+        if options and index is not None and 0 <= index < len(options):
+            answer = options[index]
+        return normalize_text(answer) in accepted
+    return match
+
+
+def _valid_order(order, words):
+    return bool(words) and all(_as_index(i) == i and 0 <= i < len(words) for i in order)
+
+
+def _compile_sentence_construction(correct, options, words):
+    if isinstance(correct, list):
+        order = tuple(correct)
+        sentence = normalize_text(' '.join(words[i] for i in order)) if _valid_order(order, words) else None
+    else:
+        order = None
+        sentence = normalize_text(correct)
+
+    def match(answer):
+        if isinstance(answer, list):
+            if order is not None and tuple(answer) == order:
+                return True
+            if not _valid_order(answer, words):
+                return False
+            answer = ' '.join(words[i] for i in answer)
+        return sentence is not None and normalize_text(answer) == sentence
+    return match
+
+
+COMPILERS = {
+    'multiple_choice': _compile_multiple_choice,
+    'fill_in_blank': _compile_text,
+    'sentence_construction': _compile_sentence_construction,
+}
+
+
+@lru_cache(maxsize=4096)
+def _compiled(exercise_type, correct_key, options, words):
+    compiler = COMPILERS.get(exercise_type, _compile_text)
+    return compiler(json.loads(correct_key), options, words)
+
+
+def compile_answer(answer_type, correct_answer, options=(), words=()):
+    """Return a callable telling whether an answer matches ``correct_answer``."""
+    return _compiled(
+        answer_type,
+        json.dumps(correct_answer, sort_keys=True),
+        tuple(str(option) for option in options or ()),
+        tuple(str(word) for word in words or ()),
+    )
+
+
+def compile_matcher(exercise):
+    """Return a callable telling whether an answer to ``exercise`` is correct."""
+    data = exercise.data if isinstance(exercise.data, dict) else {}
+    return compile_answer(exercise.type, exercise.correct_answer, data.get('options'), data.get('words'))
+
+
+def display_answer(exercise):
+    """The correct answer as shown to the learner."""
+    data = exercise.data if isinstance(exercise.data, dict) else {}
+    if 'correctAnswerText' in data:
+        return data['correctAnswerText']
+    words = data.get('words')
+    if exercise.type == 'sentence_construction' and isinstance(exercise.correct_answer, list) and _valid_order(exercise.correct_answer, words):
+        return ' '.join(words[i] for i in exercise.correct_answer)
+    return exercise.correct_answer
+
+
+def stars_for(correct_count, total):
+    if not total:
+        return 0
+    ratio = correct_count / total
+    if ratio >= 0.9:
+        return 3
+    if ratio >= 0.7:
+        return 2
+    if ratio >= 0.5:
+        return 1
+    return 0
+
+
+PERFORMANCE_ANALYSIS = {
+    3: "Excellent work! You have mastered this topic.",
+    2: "You might want to review this topic again to improve your understanding.",
+    1: "Good effort, but this topic needs more practice.",
+    0: "This topic needs more work. Review the lesson and try again.",
+}
+
+
+def grade_exercises(exercises_by_id, answers):
+    """
+    Grade ``answers`` (dicts with ``exerciseId`` and ``answer``, one per
+    exercise) against the given exercises, which are all the exercises of
+    the topic: the ones left unanswered count as wrong.
+
+    Returns a dict with ``correctCount``, ``totalQuestions``, ``starsEarned``,
+    ``performanceAnalysis`` and the per-answer ``results``.
+    """
+    results = []
+    correct_count = 0
+    for item in answers:
+        exercise = exercises_by_id[item['exerciseId']]
+        is_correct = bool(compile_matcher(exercise)(item['answer']))
+        correct_count += is_correct
+        data = exercise.data if isinstance(exercise.data, dict) else {}
+        results.append({
+            "exerciseId": exercise.id,
+            "isCorrect": is_correct,
+            "correctAnswer": display_answer(exercise),
+            "explanation": data.get('explanation') or ("Well done!" if is_correct else "")
+        })
+
+    stars = stars_for(correct_count, len(exercises_by_id))
+    return {
+        "correctCount": correct_count,
+        "totalQuestions": len(exercises_by_id),
+        "starsEarned": stars,
+        "performanceAnalysis": PERFORMANCE_ANALYSIS[stars],
+        "results": results,
+    }
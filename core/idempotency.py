@@ -0,0 +1,120 @@
+"""
+Idempotency-Key support for POST endpoints that create things.
+
+A client that retries a request sends the same ``Idempotency-Key`` header.
+The first request with a key reserves it in the cache named by
+IDEMPOTENCY_CACHE and runs. When it succeeds, its rendered response bytes
+are kept for IDEMPOTENCY_TTL seconds, and every retry gets those bytes back
+without running the serializer, creating a submission or enqueueing grading.
+A retry that arrives while the first request is still running waits up to
+IDEMPOTENCY_WAIT seconds for its response instead of running again. If it
+is still running after that, the retry gets 409.
+
+Keys are scoped to the user and the path, and bound to the request body.
+Reusing a key with a different body is a client bug and gets 422. Failed
+requests release their key so that the client can retry them.
+
+Reservations only hold across processes when IDEMPOTENCY_CACHE is shared by
+them. With locmem, or a DummyCache (replaced by a per-process cache here), a
+retry that reaches another worker runs again, so ``manage.py check
+--deploy`` reports that as an error (see core/checks.py).
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.renderers import JSONRenderer
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+PENDING = 'pending'
+DONE = 'done'
+POLL_INTERVAL = 0.05
+
+_fallback = LocMemCache('idempotency', {'OPTIONS': {'MAX_ENTRIES': 100_000}})
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still in progress.'
+    default_code = 'idempotency_conflict'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def get_store():
+    store = caches[settings.IDEMPOTENCY_CACHE]
+    return _fallback if isinstance(store, DummyCache) else store
+
+
+def _cache_key(request, key):
+    digest = hashlib.sha256(f'{request.user.pk}:{request.path}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def _fingerprint(request):
+    return hashlib.sha256(json.dumps(request.data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _replay(entry):
+    _, _, status_code, body = entry
+    response = HttpResponse(body, status=status_code, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(request, execute):
+    """
+    Run ``execute()``, which returns a Response, at most once per Idempotency-Key.
+    Requests without the header just run.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return execute()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValidationError({HEADER: [f'Must be 1 to {MAX_KEY_LENGTH} characters.']})
+
+    store = get_store()
+    cache_key, fingerprint = _cache_key(request, key), _fingerprint(request)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while not store.add(cache_key, (PENDING, fingerprint), timeout=settings.IDEMPOTENCY_LOCK_TTL):
+        entry = store.get(cache_key)
+        if entry is None:
+            continue  # released or expired since the add
+        if entry[1] != fingerprint:
+            raise IdempotencyKeyReused()
+        if entry[0] == DONE:
+            return _replay(entry)
+        if time.monotonic() >= deadline:
+            raise IdempotencyConflict()
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        response = execute()
+    except BaseException:
+        store.delete(cache_key)
+        raise
+    if not status.is_success(response.status_code):
+        store.delete(cache_key)
+        return response
+    body = JSONRenderer().render(response.data)
+    store.set(cache_key, (DONE, fingerprint, response.status_code, body), timeout=settings.IDEMPOTENCY_TTL)
+    return HttpResponse(body, status=response.status_code, content_type='application/json')
+
+
+class IdempotentPostMixin:
+    """Makes a view's POST honour Idempotency-Key."""
+
+    def post(self, request, *args, **kwargs):
+        return idempotent(request, lambda: super(IdempotentPostMixin, self).post(request, *args, **kwargs))
@@ -0,0 +1,127 @@
+"""
+Bulk user import for institutional onboarding.
+
+Rows are streamed from a CSV with ``email`` and ``name`` columns and an
+optional ``password`` column (users without one get an unusable password
+and set theirs through a reset). Every chunk of rows is
+validated, its passwords are hashed in a process pool across cores, and its
+users and profiles are inserted with ``create_users_bulk`` in one
+transaction. Emails that already exist are skipped before any hashing, so
+an interrupted import is resumed by running it again on the same file. An
+email that signs up while its chunk is being hashed makes the insert fail on
+the unique email; the chunk is then inserted again without it, and the row
+counts as existing.
+
+With ``seed_module`` the new users also get an active UserModuleProgress row
+for that module, with its first topic unlocked (see core/progression.py).
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .models import User, UserModuleProgress
+from .progression import ACTIVE, evaluate
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def hash_password(password):
+    return make_password(password or None)
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _valid_users(chunk, report):
+    """Unsaved users for the new, valid rows of ``chunk``, with their raw passwords."""
+    users = {}
+    for line, row in chunk:
+        email = User.objects.normalize_email((row.get('email') or '').strip())
+        name = (row.get('name') or '').strip()
+        try:
+            validate_email(email)
+        except ValidationError:
+            report(line, f"invalid email {email!r}")
+            continue
+        if not name:
+            report(line, "missing name")
+            continue
+        if email in users:
+            report(line, f"duplicate email {email}")
+            continue
+        users[email] = User(email=email, name=name), row.get('password') or None
+    return users
+
+
+def _create(users, seed_module):
+    with transaction.atomic():
+        created = User.objects.create_users_bulk(users)
+        if seed_module is not None and created:
+            UserModuleProgress.objects.bulk_create(
+                [UserModuleProgress(user=user, module_id=seed_module, status=ACTIVE) for user in created],
+                ignore_conflicts=True,
+            )
+            evaluate([user.pk for user in created], [seed_module])
+    return created
+
+
+def import_users(rows, chunk_size=1000, workers=None, seed_module=None, progress=None, report=None):
+    """
+    Import ``(line, row)`` pairs, ``chunk_size`` users per transaction.
+
+    Passwords are hashed by ``workers`` processes (one per core by default;
+    0 hashes in this process). ``progress`` is called with the running
+    counts after each chunk and ``report`` with ``(line, message)`` for
+    every rejected row. Returns a Counter of ``created``, ``existing`` and
+    ``invalid`` rows.
+    """
+    counts = Counter(created=0, existing=0, invalid=0)
+
+    def reject(line, message):
+        counts['invalid'] += 1
+        if report is not None:
+            report(line, message)
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers != 0 else None
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            users = _valid_users(chunk, reject)
+            existing = set(User.objects.filter(email__in=list(users)).values_list('email', flat=True))
+            new = [pair for email, pair in users.items() if email not in existing]
+            counts['existing'] += len(users) - len(new)
+
+            passwords = [password for _, password in new]
+            hashes = pool.map(hash_password, passwords, chunksize=max(len(passwords) // 64, 1)) if pool else map(hash_password, passwords)
+            for (user, _), password_hash in zip(new, hashes):
+                user.password = password_hash
+
+            new = [user for user, _ in new]
+            while True:
+                try:
+                    created = _create(new, seed_module)
+                    break
+                except IntegrityError:
+                    taken = set(User.objects.filter(email__in=[user.email for user in new]).values_list('email', flat=True))
+                    if not taken:
+                        raise
+                    # Signed up since the check above.
+                    new = [user for user in new if user.email not in taken]
+                    counts['existing'] += len(taken)
+            counts['created'] += len(created)
+            if progress is not None:
+                progress(counts)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return counts
@@ -0,0 +1,193 @@
+"""
+Database-backed job queue for assessment grading.
+
+Submitting an assessment enqueues a GradingJob in the same transaction as the
+submission. Worker processes (``manage.py run_grading_workers``) claim jobs in
+batches and grade them against the cached answer key of each assessment, so
+HTTP latency never depends on grading time.
+
+Jobs are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` on databases that
+support it. Elsewhere (SQLite) a claim is a single ``UPDATE ... WHERE id IN
+(SELECT ... LIMIT n)`` stamping the rows with a unique claim token, which is
+safe because such databases serialize writers. A job whose worker died is reclaimed once its lease runs
+out, up to MAX_ATTEMPTS times. After that, the job and its submission are
+marked failed, so that clients waiting for the result get an answer.
+"""
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from .aggregates import record_assessment_results
+from .assessments import get_answer_key
+from .authentication import invalidate_principals
+from .leaderboard import record_level
+from .models import AssessmentSubmission, GradingJob, UserProfile
+from .notify import assessment_key, notifier
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=5)
+MAX_ATTEMPTS = 3
+
+CEFR_LEVELS = ('A1', 'A2', 'B1', 'B2', 'C1', 'C2')
+
+
+def enqueue_grading(submission):
+    return GradingJob.objects.create(submission=submission)
+
+
+def _claimable(now):
+    return GradingJob.objects.filter(
+        Q(status='queued') | Q(status='running', lockedAt__lt=now - LEASE),
+        attempts__lt=MAX_ATTEMPTS,
+    )
+
+
+def fail_abandoned_jobs(now):
+    """Fail jobs whose worker died during their last attempt, and their submissions."""
+    abandoned = GradingJob.objects.filter(status='running', lockedAt__lt=now - LEASE, attempts__gte=MAX_ATTEMPTS)
+    with transaction.atomic():
+        failed = abandoned.update(status='failed', lockedBy=None, lastError='The lease expired during the last attempt.')
+        if failed:
+            AssessmentSubmission.objects.filter(status='processing', grading_job__status='failed').update(status='failed')
+    return failed
+
+
+def claim_jobs(worker_id, batch_size):
+    """Claim up to ``batch_size`` jobs for ``worker_id`` and return them."""
+    now = timezone.now()
+    fail_abandoned_jobs(now)
+    token = f'{worker_id}:{uuid.uuid4().hex[:12]}'
+    claimed = dict(status='running', lockedBy=token, lockedAt=now, attempts=F('attempts') + 1)
+
+    candidates = _claimable(now).order_by('createdAt')
+    if connections[GradingJob.objects.db].features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(candidates.select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size])
+            GradingJob.objects.filter(id__in=ids).update(**claimed)
+    else:
+        # A single statement, so the claim never upgrades a read lock.
+        GradingJob.objects.filter(id__in=Subquery(candidates.values('id')[:batch_size])).update(**claimed)
+
+    return list(GradingJob.objects.filter(lockedBy=token).select_related('submission'))
+
+
+def level_for(correct_count, total):
+    if not total:
+        return CEFR_LEVELS[0]
+    return CEFR_LEVELS[min(int(correct_count / total * len(CEFR_LEVELS)), len(CEFR_LEVELS) - 1)]
+
+
+def analyse(category_scores):
+    """Summarise per-category ``[correct, total]`` counts for the learner."""
+    if not category_scores:
+        return "We could not find any answers to analyse."
+    accuracy = {
+        category: round(100 * correct / total)
+        for category, (correct, total) in category_scores.items() if total
+    }
+    best = max(accuracy, key=accuracy.get)
+    worst = min(accuracy, key=accuracy.get)
+    if best == worst or accuracy[best] == accuracy[worst]:
+        return f"Based on your answers, your accuracy is {accuracy[best]}% across all areas."
+    return (
+        f"Based on your answers, your strongest area is {best} ({accuracy[best]}%) "
+        f"and you should focus on {worst} ({accuracy[worst]}%)."
+    )
+
+
+def grade_submission(submission):
+    """Grade ``submission`` in memory and return its per-category scores."""
+    key = get_answer_key(submission.assessment_id)
+    category_scores = defaultdict(lambda: [0, 0])
+    correct_count = 0
+    answered = set()
+    for item in submission.answers:
+        question_id = item.get('questionId')
+        if question_id in answered:
+            continue  # only the first answer to a question counts
+        answered.add(question_id)
+        correct = key.is_correct(question_id, item.get('answer'))
+        correct_count += correct
+        category = key.categories.get(question_id)
+        if category is not None:
+            category_scores[category][0] += correct
+            category_scores[category][1] += 1
+
+    submission.status = 'complete'
+    submission.correctCount = correct_count
+    submission.totalQuestions = len(key)
+    submission.level = level_for(correct_count, len(key))
+    submission.aiAnalysis = analyse(category_scores)
+    return dict(category_scores)
+
+
+def _notify_graded(submissions):
+    for submission in submissions:
+        notifier.notify(assessment_key(submission.id))
+
+
+def process_jobs(jobs):
+    """Grade a batch of claimed jobs and store the results in bulk."""
+    graded, failed, category_results = [], [], []
+    for job in jobs:
+        try:
+            category_scores = grade_submission(job.submission)
+            graded.append(job)
+            category_results.append((job.submission.user_id, category_scores))
+        except Exception as e:
+            logger.exception("Grading job %s failed", job.id)
+            job.lastError = str(e)
+            failed.append(job)
+
+    submissions = [job.submission for job in graded]
+    with transaction.atomic():
+        AssessmentSubmission.objects.bulk_update(
+            submissions, ['status', 'correctCount', 'totalQuestions', 'level', 'aiAnalysis']
+        )
+        users_by_level = defaultdict(list)
+        for submission in submissions:
+            users_by_level[submission.level].append(submission.user_id)
+        for level, user_ids in users_by_level.items():
+            UserProfile.objects.filter(user_id__in=user_ids).update(currentLevel=level)
+            invalidate_principals(user_ids)
+            transaction.on_commit(partial(record_level, user_ids, level))
+        record_assessment_results(category_results)
+        GradingJob.objects.filter(id__in=[job.id for job in graded]).update(status='done', lockedBy=None)
+        for job in failed:
+            job.status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'queued'
+            job.lockedBy = None
+        GradingJob.objects.bulk_update(failed, ['status', 'lockedBy', 'lastError'])
+        AssessmentSubmission.objects.filter(id__in=[job.submission_id for job in failed if job.status == 'failed']).update(status='failed')
+        transaction.on_commit(partial(_notify_graded, submissions))
+    return submissions
+
+
+def run_worker(worker_id=None, batch_size=50, poll_interval=1.0, once=False):
+    """
+    Claim and grade jobs until stopped.
+
+    With ``once`` the worker returns as soon as the queue is empty. Returns
+    the number of submissions graded.
+    """
+    worker_id = worker_id or uuid.uuid4().hex[:8]
+    processed = 0
+    while True:
+        try:
+            jobs = claim_jobs(worker_id, batch_size)
+        except DatabaseError:
+            logger.exception("Worker %s could not claim jobs", worker_id)
+            jobs = []
+        if jobs:
+            processed += len(process_jobs(jobs))
+            continue
+        if once:
+            return processed
+        time.sleep(poll_interval)
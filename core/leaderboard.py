@@ -0,0 +1,441 @@
+"""
+Stars leaderboards backed by incrementally maintained ranking indexes.
+
+There is one board for all users (``global``), one per ISO week for the
+stars gained that week (``weekly:<year>-W<week>``) and one per
+``UserProfile.currentLevel`` (``level:<level>``). Each board is a
+RankingIndex in the Django cache named by LEADERBOARD_CACHE, or in a
+process-local cache when that one is a DummyCache:
+
+* a Fenwick tree counting members per star total, with every node in its own
+  key. Moving a member changes O(log LEADERBOARD_MAX_STARS) nodes with the
+  cache's atomic ``incr``, and "how many members have more stars than this"
+  reads as many nodes with one ``get_many``. Writers take no lock, and
+  concurrent moves on the same board cannot lose each other's counts;
+* the first LEADERBOARD_TOP_SIZE members in order, which answer "top K"
+  without touching the database. Only a move into or within that list
+  rewrites it, under a short per-board lock. A writer that cannot get the
+  lock in time drops the list, and it is reloaded from the database when
+  next read.
+
+A user's standing (``member``) is kept as counters of the same cache, so the
+``incr`` that adds a gain also tells the writer the total it moves from,
+whatever order concurrent gains are reported in.
+
+Every key expires after LEADERBOARD_TIMEOUT seconds (a week and a day for
+weekly boards), after which a board is rebuilt from the database when next
+read. That bounds how long boards can disagree with the database, e.g. when
+LEADERBOARD_CACHE is not shared by every process (``manage.py check
+--deploy`` warns about it) or a gain is reported while its board is being
+rebuilt. ``reconcile`` (``manage.py reconcile_leaderboards``) rebuilds every
+board and repairs members that drifted from the database.
+
+Only users with stars are members of a board; everyone else ranks last.
+Totals above LEADERBOARD_MAX_STARS share its rank.
+"""
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import ExerciseSubmission, UserProfile
+
+GLOBAL = 'global'
+# How long a writer waits for a board's top-list lock before dropping the list.
+LOCK_WAIT = 0.5
+LOCK_TTL = 5
+WEEKLY_TIMEOUT = 60 * 60 * 24 * 8
+WRITE_CHUNK = 1000
+
+_fallback = LocMemCache('leaderboard', {'OPTIONS': {'MAX_ENTRIES': 1_000_000}})
+
+
+def get_store():
+    store = caches[settings.LEADERBOARD_CACHE]
+    return _fallback if isinstance(store, DummyCache) else store
+
+
+def weekly_board(day=None):
+    year, week, _ = (day or timezone.localdate()).isocalendar()
+    return f'weekly:{year}-W{week:02d}'
+
+
+def level_board(level):
+    return f'level:{level}'
+
+
+def _week_bounds(board):
+    year, week = board.split(':', 1)[1].split('-W')
+    start = timezone.make_aware(datetime.combine(date.fromisocalendar(int(year), int(week), 1), datetime.min.time()))
+    return start, start + timedelta(days=7)
+
+
+def _board_timeout(board):
+    return WEEKLY_TIMEOUT if board.startswith('weekly:') else settings.LEADERBOARD_TIMEOUT
+
+
+def _incr(store, key, delta, timeout):
+    try:
+        return store.incr(key, delta)
+    except ValueError:
+        store.add(key, 0, timeout=timeout)
+        return store.incr(key, delta)
+
+
+@contextmanager
+def _locked(store, key):
+    deadline = time.monotonic() + LOCK_WAIT
+    acquired = store.add(key, True, timeout=LOCK_TTL)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.005)
+        acquired = store.add(key, True, timeout=LOCK_TTL)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            store.delete(key)
+
+
+class RankingIndex:
+    """
+    One board's ranking index in the cache.
+
+    The tree has LEADERBOARD_MAX_STARS leaves (a power of two), leaf
+    ``stars + 1`` counting the members with that total. Its nodes and the
+    top list live under a generation that ``publish`` replaces as a whole, so
+    a rebuild never mixes with the nodes of the index it replaces.
+    """
+
+    def __init__(self, board, store=None):
+        self.board = board
+        self.store = store if store is not None else get_store()
+        self.timeout = _board_timeout(board)
+        self.size = settings.LEADERBOARD_MAX_STARS
+        self.top_size = settings.LEADERBOARD_TOP_SIZE
+
+    def _generation_key(self):
+        return f'leaderboard:board:{self.board}'
+
+    def _node_key(self, generation, i):
+        return f'leaderboard:{self.board}:{generation}:{i}'
+
+    def _top_key(self, generation):
+        return f'leaderboard:{self.board}:{generation}:top'
+
+    def _lock_key(self):
+        return f'leaderboard:lock:{self.board}'
+
+    def _leaf(self, stars):
+        return min(stars, self.size - 1) + 1
+
+    def generation(self):
+        return self.store.get(self._generation_key())
+
+    def publish(self, totals):
+        """Replace the index with one of ``totals``, ``(user_id, stars)`` pairs; returns its generation."""
+        totals = [(user_id, stars) for user_id, stars in totals if stars > 0]
+        tree = [0] * (self.size + 1)
+        for _, stars in totals:
+            tree[self._leaf(stars)] += 1
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+
+        generation = uuid.uuid4().hex
+        # The root is always written: ``ranks`` and ``move`` take its absence for an evicted tree.
+        nodes = [(self._node_key(generation, i), count) for i, count in enumerate(tree) if count or i == self.size]
+        for start in range(0, len(nodes), WRITE_CHUNK):
+            self.store.set_many(dict(nodes[start:start + WRITE_CHUNK]), timeout=self.timeout)
+        entries = sorted((-stars, str(user_id)) for user_id, stars in totals)
+        self.store.set(self._top_key(generation), (entries[:self.top_size], len(entries) <= self.top_size), timeout=self.timeout)
+        self.store.set(self._generation_key(), generation, timeout=self.timeout)
+        return generation
+
+    def move(self, user_id, old, new):
+        """Change a member's total from ``old`` to ``new``; 0 means not a member. A board not in the cache is left alone."""
+        generation = self.generation()
+        if generation is None or old == new:
+            return
+        deltas = defaultdict(int)
+        for stars, delta in ((old, -1), (new, 1)):
+            if not stars:
+                continue
+            i = self._leaf(stars)
+            while i <= self.size:
+                deltas[i] += delta
+                i += i & -i
+        root = deltas.pop(self.size, 0)
+        if root:
+            try:
+                self.store.incr(self._node_key(generation, self.size), root)
+            except ValueError:
+                self.store.delete(self._generation_key())
+                return
+        for i, delta in deltas.items():
+            if delta:
+                _incr(self.store, self._node_key(generation, i), delta, self.timeout)
+        self._move_top(generation, str(user_id), old, new)
+
+    def _move_top(self, generation, user_id, old, new):
+        key = self._top_key(generation)
+        top = self.store.get(key)
+        if top is None or not _touches(top, user_id, old, new):
+            return
+        with _locked(self.store, self._lock_key()) as acquired:
+            if not acquired:
+                # Another writer is rewriting the list; ours would be lost.
+                self.store.delete(key)
+                return
+            top = self.store.get(key)
+            if top is not None:
+                self.store.set(key, _moved(top, user_id, old, new, self.top_size), timeout=self.timeout)
+
+    def ranks(self, generation, totals):
+        """1 + the number of members with more stars, for each of ``totals``; None if the tree was evicted."""
+        paths = []
+        for stars in totals:
+            path, i = [], self._leaf(stars)
+            while i > 0:
+                path.append(i)
+                i -= i & -i
+            paths.append(path)
+        needed = {i for path in paths for i in path} | {self.size}
+        keys = {i: self._node_key(generation, i) for i in needed}
+        nodes = self.store.get_many(list(keys.values()))
+        if keys[self.size] not in nodes:
+            return None
+        count = {i: nodes.get(key, 0) for i, key in keys.items()}
+        return [1 + count[self.size] - sum(count[i] for i in path) for path in paths]
+
+    def top(self, generation):
+        """``(entries, complete)``: ``(-stars, user_id)`` in rank order, and whether they are every member; None if not cached."""
+        return self.store.get(self._top_key(generation))
+
+    def set_top(self, generation, top):
+        self.store.set(self._top_key(generation), top, timeout=self.timeout)
+
+
+def _touches(top, user_id, old, new):
+    entries, complete = top
+    if old and (-old, user_id) in entries:
+        return True
+    return bool(new) and (complete or bool(entries) and (-new, user_id) < entries[-1])
+
+
+def _moved(top, user_id, old, new, top_size):
+    # ``entries`` must stay a prefix of the full ranking: only insert when it
+    # already holds every member or the entry sorts before its end.
+    entries, complete = list(top[0]), top[1]
+    if old:
+        i = bisect_left(entries, (-old, user_id))
+        if i < len(entries) and entries[i] == (-old, user_id):
+            del entries[i]
+    if new and (complete or entries and (-new, user_id) < entries[-1]):
+        insort(entries, (-new, user_id))
+        if len(entries) > top_size:
+            del entries[top_size:]
+            complete = False
+    return entries, complete
+
+
+# Loading from the database
+
+def _weekly_gains(board, user_ids=None):
+    """``{user_id: stars}`` gained during ``board``'s week, from best-star improvements."""
+    start, end = _week_bounds(board)
+    submissions = ExerciseSubmission.objects.filter(createdAt__lt=end)
+    if user_ids is not None:
+        submissions = submissions.filter(user_id__in=user_ids)
+    rows = (
+        submissions.values('user_id', 'topic_id')
+        .annotate(before=Max('starsEarned', filter=Q(createdAt__lt=start)), during=Max('starsEarned', filter=Q(createdAt__gte=start)))
+        .filter(during__isnull=False)
+        .values_list('user_id', 'before', 'during')
+    )
+    gains = {}
+    for user_id, before, during in rows.iterator(chunk_size=2000):
+        if during > (before or 0):
+            gains[str(user_id)] = gains.get(str(user_id), 0) + during - (before or 0)
+    return gains
+
+
+def _profiles(board):
+    profiles = UserProfile.objects.filter(totalStars__gt=0)
+    if board != GLOBAL:
+        profiles = profiles.filter(currentLevel=board.split(':', 1)[1])
+    return profiles
+
+
+def _totals(board):
+    if board.startswith('weekly:'):
+        return _weekly_gains(board).items()
+    rows = _profiles(board).values_list('user_id', 'totalStars').iterator(chunk_size=2000)
+    return ((str(user_id), stars) for user_id, stars in rows)
+
+
+def _load_top(board, top_size):
+    if board.startswith('weekly:'):
+        entries = sorted((-stars, user_id) for user_id, stars in _weekly_gains(board).items())
+    else:
+        rows = _profiles(board).order_by('-totalStars', 'user_id').values_list('user_id', 'totalStars')[:top_size + 1]
+        entries = sorted((-stars, str(user_id)) for user_id, stars in rows)
+    return entries[:top_size], len(entries) <= top_size
+
+
+def _member_keys(user_id, week):
+    prefix = f'leaderboard:member:{user_id}'
+    return f'{prefix}:stars', f'{prefix}:level', f'{prefix}:{week}'
+
+
+def _load_member(user_id, week):
+    profile = UserProfile.objects.filter(user_id=user_id).values_list('totalStars', 'currentLevel').first()
+    stars, level = profile or (0, None)
+    return stars, level, _weekly_gains(week, [user_id]).get(user_id, 0)
+
+
+def get_member(user_id, week=None):
+    """The cached standing of a user: total and weekly stars, and level."""
+    user_id, week, store = str(user_id), week or weekly_board(), get_store()
+    keys = _member_keys(user_id, week)
+    cached = store.get_many(keys)
+    if len(cached) < len(keys):
+        for key, value in zip(keys, _load_member(user_id, week)):
+            if key not in cached:
+                store.add(key, value, timeout=settings.LEADERBOARD_TIMEOUT)
+                cached[key] = value
+    stars, level, weekly = (cached[key] for key in keys)
+    return {'stars': stars, 'level': level, 'week': week, 'weekly': weekly}
+
+
+# Incremental maintenance
+
+def _gain(store, key, gained, load):
+    """Add ``gained`` to a member counter and return ``(before, after)``."""
+    try:
+        after = store.incr(key, gained)
+    except ValueError:
+        # Loaded after commit, so the database total already includes the gain.
+        store.add(key, load(), timeout=settings.LEADERBOARD_TIMEOUT)
+        after = store.get(key)
+    return after - gained, after
+
+
+def record_stars(user_id, gained):
+    """Count ``gained`` new stars for a user, already added to ``UserProfile.totalStars``."""
+    store, week, user_id = get_store(), weekly_board(), str(user_id)
+    stars_key, level_key, weekly_key = _member_keys(user_id, week)
+    loaded = None
+
+    def load(field):
+        # Only the counter that is missing is loaded, so a cached one never counts the gain twice.
+        nonlocal loaded
+        loaded = loaded or _load_member(user_id, week)
+        return loaded[field]
+
+    before, after = _gain(store, stars_key, gained, lambda: load(0))
+    RankingIndex(GLOBAL, store).move(user_id, before, after)
+    level = store.get(level_key)
+    if level is None:
+        level = load(1)
+        store.add(level_key, level, timeout=settings.LEADERBOARD_TIMEOUT)
+    if level:
+        RankingIndex(level_board(level), store).move(user_id, before, after)
+    before, after = _gain(store, weekly_key, gained, lambda: load(2))
+    RankingIndex(week, store).move(user_id, before, after)
+
+
+def record_level(user_ids, level):
+    """Move users to ``level``'s board after their ``currentLevel`` changed."""
+    store, week = get_store(), weekly_board()
+    for user_id in map(str, user_ids):
+        stars_key, level_key, _ = _member_keys(user_id, week)
+        old = store.get(level_key)
+        store.set(level_key, level, timeout=settings.LEADERBOARD_TIMEOUT)
+        if old == level:
+            continue
+        stars = get_member(user_id, week)['stars']
+        if old is None:
+            # The board the user left is unknown; every level board is rebuilt when next read.
+            levels = UserProfile.objects.values_list('currentLevel', flat=True).distinct()
+            store.delete_many([RankingIndex(level_board(name), store)._generation_key() for name in levels])
+            continue
+        RankingIndex(level_board(old), store).move(user_id, stars, 0)
+        RankingIndex(level_board(level), store).move(user_id, 0, stars)
+
+
+# Queries
+
+def leaderboard(board, limit, user_id=None):
+    """
+    Return ``(leaders, me)``: ``[(rank, user_id, stars)]`` for the top
+    ``limit`` members of ``board`` and ``(rank, stars)`` for ``user_id``.
+    """
+    index = RankingIndex(board)
+    generation = index.generation()
+    if generation is None:
+        generation = index.publish(_totals(board))
+    top = index.top(generation)
+    if top is None or (limit > len(top[0]) and not top[1]):
+        # Dropped by a writer, or members dropped out of the top and the rest are not known here.
+        top = _load_top(board, index.top_size)
+        index.set_top(generation, top)
+    entries = top[0][:limit]
+
+    totals = [-neg_stars for neg_stars, _ in entries]
+    stars = None
+    if user_id is not None:
+        member = get_member(user_id)
+        stars = member['weekly'] if board.startswith('weekly:') else member['stars']
+        totals.append(stars)
+    ranks = index.ranks(generation, totals)
+    if ranks is None:
+        ranks = index.ranks(index.publish(_totals(board)), totals)
+    leaders = [(rank, member_id, -neg_stars) for rank, (neg_stars, member_id) in zip(ranks, entries)]
+    return leaders, (ranks[-1], stars) if user_id is not None else None
+
+
+# Reconciliation
+
+def reconcile(chunk_size=2000):
+    """
+    Rebuild every board from the database and rewrite members whose cached
+    standing drifted. Returns ``(boards, drifted)``.
+    """
+    store, week = get_store(), weekly_board()
+    weekly = _weekly_gains(week)
+    levels = UserProfile.objects.values_list('currentLevel', flat=True).distinct()
+    for name in [GLOBAL] + [level_board(level) for level in levels]:
+        RankingIndex(name, store).publish(_totals(name))
+    RankingIndex(week, store).publish(weekly.items())
+
+    drifted = 0
+    rows = UserProfile.objects.order_by('user_id').values_list('user_id', 'totalStars', 'currentLevel')
+    chunk = []
+    def flush():
+        nonlocal drifted
+        members = {}
+        for user_id, stars, level in chunk:
+            keys = _member_keys(user_id, week)
+            members.update(zip(keys, (stars, level, weekly.get(str(user_id), 0))))
+        cached = store.get_many(list(members))
+        stale = {key: members[key] for key, value in cached.items() if value != members[key]}
+        drifted += len({key.split(':')[2] for key in stale})
+        store.set_many(stale, timeout=settings.LEADERBOARD_TIMEOUT)
+        chunk.clear()
+
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return len(levels) + 2, drifted
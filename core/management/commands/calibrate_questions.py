@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.adaptive import calibrate
+
+
+class Command(BaseCommand):
+    help = "Re-estimate adaptive placement item parameters from graded submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assessment', help="Only calibrate this assessment.")
+        parser.add_argument('--min-responses', type=int, default=30, help="Skip questions with fewer observations.")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Submissions read per batch.")
+
+    def handle(self, *args, **options):
+        updated = calibrate(
+            assessment_id=options['assessment'],
+            min_responses=options['min_responses'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Calibrated {updated} questions."))
@@ -0,0 +1,45 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalogue import get_curriculum
+from core.imports import import_users
+
+
+class Command(BaseCommand):
+    help = "Create users from a CSV with email, name and optional password columns. Re-run to resume."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help="CSV file with a header row.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Users inserted per transaction.")
+        parser.add_argument('--workers', type=int, default=None, help="Password hashing processes (default: one per core, 0: none).")
+        parser.add_argument('--seed-first-module', action='store_true', help="Unlock the first module of the curriculum for the new users.")
+
+    def handle(self, *args, **options):
+        seed_module = None
+        if options['seed_first_module']:
+            order = get_curriculum()['order']
+            if not order:
+                raise CommandError("There is no module to seed.")
+            seed_module = order[0]
+
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f)
+                if not {'email', 'name'} <= set(reader.fieldnames or ()):
+                    raise CommandError("The CSV needs email and name columns.")
+                counts = import_users(
+                    ((reader.line_num, row) for row in reader),
+                    chunk_size=options['chunk_size'],
+                    workers=options['workers'],
+                    seed_module=seed_module,
+                    progress=lambda counts: self.stdout.write(
+                        f"Created {counts['created']} users ({counts['existing']} existing, {counts['invalid']} invalid)..."
+                    ),
+                    report=lambda line, message: self.stderr.write(f"Line {line}: {message}"),
+                )
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['csv_path']}: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['created']} users; skipped {counts['existing']} existing and {counts['invalid']} invalid rows."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.revocation import prune
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted refresh tokens in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Tokens deleted per transaction.")
+
+    def handle(self, *args, **options):
+        deleted = prune(
+            batch_size=options['batch_size'],
+            progress=lambda done: self.stdout.write(f"Deleted {done} tokens..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} expired tokens."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.aggregates import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's progress aggregate from submission history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Users rebuilt per transaction.")
+
+    def handle(self, *args, **options):
+        total = rebuild(
+            chunk_size=options['chunk_size'],
+            progress=lambda done: self.stdout.write(f"Rebuilt {done} users..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt progress aggregates for {total} users."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute UserProfile.totalStars and completedModules and fix the ones that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Users checked per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        drifted = reconcile(
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            progress=lambda done: self.stdout.write(f"Checked {done} users..."),
+        )
+        for profile in drifted:
+            self.stdout.write(f"{profile.user_id}: totalStars={profile.totalStars} completedModules={profile.completedModules}")
+        verb = "Found" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(drifted)} drifted profiles."))
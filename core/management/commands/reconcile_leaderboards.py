@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.leaderboard import reconcile
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stars leaderboards from the database and repair drifted cache entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Users checked per round trip.")
+
+    def handle(self, *args, **options):
+        boards, drifted = reconcile(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {boards} leaderboards; repaired {drifted} drifted users."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.progression import reevaluate
+
+
+class Command(BaseCommand):
+    help = "Re-apply the topic/module progression rules, e.g. after the curriculum was reordered."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', type=int, action='append', dest='modules', help="Module to re-evaluate; repeatable. All modules by default.")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Users re-evaluated per transaction.")
+
+    def handle(self, *args, **options):
+        total = reevaluate(
+            module_ids=options['modules'],
+            chunk_size=options['chunk_size'],
+            progress=lambda done: self.stdout.write(f"Re-evaluated {done} users..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Re-evaluated progression for {total} users."))
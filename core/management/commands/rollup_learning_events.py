@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.events import flush_events, rollup
+
+
+class Command(BaseCommand):
+    help = "Roll the learning event log up into DailyActivity rows (yesterday by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day to roll up, as YYYY-MM-DD.")
+        parser.add_argument('--days', type=int, default=1, help="Number of days to roll up, ending at --date.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Events fetched per round trip.")
+
+    def handle(self, *args, **options):
+        try:
+            last = date.fromisoformat(options['date']) if options['date'] else timezone.localdate() - timedelta(days=1)
+        except ValueError:
+            raise CommandError("--date must be YYYY-MM-DD.")
+
+        flush_events()
+        for offset in range(options['days'] - 1, -1, -1):
+            day = last - timedelta(days=offset)
+            users = rollup(day, chunk_size=options['chunk_size'])
+            self.stdout.write(f"{day}: {users} active users")
+        self.stdout.write(self.style.SUCCESS("Rolled up learning events."))
@@ -0,0 +1,53 @@
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import run_worker
+
+
+def _worker_main(worker_id, batch_size, poll_interval, once):
+    django.setup()
+    run_worker(worker_id, batch_size=batch_size, poll_interval=poll_interval, once=once)
+
+
+class Command(BaseCommand):
+    help = "Grade queued assessment submissions with one or more worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help="Number of worker processes.")
+        parser.add_argument('--batch-size', type=int, default=50, help="Jobs claimed per batch.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is drained.")
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+        once = options['once']
+
+        if concurrency <= 1:
+            processed = run_worker(batch_size=batch_size, poll_interval=poll_interval, once=once)
+            self.stdout.write(self.style.SUCCESS(f"Graded {processed} submissions."))
+            return
+
+        # Children must not share the parent's database connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(f'worker-{i}', batch_size, poll_interval, once),
+                daemon=False,
+            )
+            for i in range(concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {concurrency} grading workers.")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:54
+
+import gzip
+import hashlib
+
+from django.db import migrations, models
+from rest_framework.renderers import JSONRenderer
+
+
+# A frozen copy of core.rendering.build_blob, so that later changes to it do
+# not change what this migration does.
+def build_blob(data):
+    body = JSONRenderer().render({"success": True, "data": data})
+    body_gzip = gzip.compress(body, compresslevel=9, mtime=0)
+    return hashlib.sha256(body).hexdigest(), body, body_gzip
+
+
+def render_existing_content(apps, schema_editor):
+    TopicContent = apps.get_model("core", "TopicContent")
+    for content in TopicContent.objects.select_related("topic").iterator():
+        data = {
+            "id": content.topic.id,
+            "title": content.topic.title,
+            "content": content.content,
+        }
+        content.etag, content.rendered, content.rendered_gzip = build_blob(data)
+        content.save(update_fields=["etag", "rendered", "rendered_gzip"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_exercise_exercisesubmission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="topiccontent",
+            name="etag",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="topiccontent",
+            name="rendered",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="topiccontent",
+            name="rendered_gzip",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(render_existing_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_topiccontent_rendered"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="module",
+            name="revision",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="topic",
+            name="revision",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_catalogue_revisions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GradingJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.CharField(default="queued", max_length=20)),
+                ("attempts", models.IntegerField(default=0)),
+                ("lockedBy", models.CharField(blank=True, max_length=64, null=True)),
+                ("lockedAt", models.DateTimeField(blank=True, null=True)),
+                ("lastError", models.TextField(blank=True, null=True)),
+                ("createdAt", models.DateTimeField(auto_now_add=True)),
+                (
+                    "submission",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="grading_job",
+                        to="core.assessmentsubmission",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "createdAt"],
+                        name="core_gradin_status_fb4f18_idx",
+                    )
+                ],
+            },
+        ),
+    ]
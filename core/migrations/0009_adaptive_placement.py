@@ -0,0 +1,68 @@
+# Generated by Django 5.2.5 on 2026-10-16 21:01
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_gradingjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="difficulty",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="discrimination",
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.CreateModel(
+            name="PlacementSession",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("status", models.CharField(default="active", max_length=20)),
+                ("responses", models.JSONField(default=list)),
+                ("ability", models.FloatField(default=0.0)),
+                ("standardError", models.FloatField(default=1.0)),
+                ("createdAt", models.DateTimeField(auto_now_add=True)),
+                (
+                    "assessment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="core.assessment",
+                    ),
+                ),
+                (
+                    "submission",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="core.assessmentsubmission",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
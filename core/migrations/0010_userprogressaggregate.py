@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-16 21:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_adaptive_placement"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserProgressAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("completedTopics", models.IntegerField(default=0)),
+                ("answersCorrect", models.IntegerField(default=0)),
+                ("answersTotal", models.IntegerField(default=0)),
+                ("categoryStats", models.JSONField(default=dict)),
+                ("topicStats", models.JSONField(default=dict)),
+                ("activityWeek", models.DateField(blank=True, null=True)),
+                ("activityDays", models.SmallIntegerField(default=0)),
+                ("updatedAt", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progress_aggregate",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
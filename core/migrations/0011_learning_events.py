@@ -0,0 +1,110 @@
+# Generated by Django 5.2.5 on 2026-10-16 21:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_userprogressaggregate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprogressaggregate",
+            name="studySeconds",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="userprogressaggregate",
+            name="wordsLearned",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="DailyActivity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("events", models.IntegerField(default=0)),
+                ("topicsOpened", models.IntegerField(default=0)),
+                ("exercisesSubmitted", models.IntegerField(default=0)),
+                ("assessmentsSubmitted", models.IntegerField(default=0)),
+                ("studySeconds", models.IntegerField(default=0)),
+                ("wordsLearned", models.IntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "day")},
+            },
+        ),
+        migrations.CreateModel(
+            name="LearningEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=32)),
+                ("data", models.JSONField(default=dict)),
+                ("createdAt", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "module",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="core.module",
+                    ),
+                ),
+                (
+                    "topic",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="core.topic",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["createdAt"], name="core_learni_created_6030e2_idx"
+                    ),
+                    models.Index(
+                        fields=["user", "createdAt"],
+                        name="core_learni_user_id_9a77fd_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
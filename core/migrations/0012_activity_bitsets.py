@@ -0,0 +1,84 @@
+# Generated by Django 5.2.5 on 2026-10-16 21:12
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# A frozen copy of core.activity.locate and the block size it used, so that
+# later changes to them do not change what this migration does.
+BLOCK_DAYS = 63
+
+
+def locate(day):
+    return divmod(day.toordinal(), BLOCK_DAYS)
+
+
+def copy_week_bitmaps(apps, schema_editor):
+    UserProgressAggregate = apps.get_model("core", "UserProgressAggregate")
+    ActivityBlock = apps.get_model("core", "ActivityBlock")
+    rows = {}
+    aggregates = UserProgressAggregate.objects.exclude(activityWeek=None).values_list(
+        "user_id", "activityWeek", "activityDays"
+    )
+    for user_id, monday, days in aggregates.iterator():
+        for weekday in range(7):
+            if days >> weekday & 1:
+                block, offset = locate(monday + timedelta(days=weekday))
+                rows[user_id, block] = rows.get((user_id, block), 0) | 1 << offset
+    ActivityBlock.objects.bulk_create(
+        [
+            ActivityBlock(user_id=user_id, block=block, bits=bits)
+            for (user_id, block), bits in rows.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_learning_events"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivityBlock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("block", models.IntegerField()),
+                ("bits", models.BigIntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="activity_blocks",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["block"], name="core_activi_block_bbb891_idx")
+                ],
+                "unique_together": {("user", "block")},
+            },
+        ),
+        migrations.RunPython(copy_week_bitmaps, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="userprogressaggregate",
+            name="activityDays",
+        ),
+        migrations.RemoveField(
+            model_name="userprogressaggregate",
+            name="activityWeek",
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-16 21:40
+
+from django.db import migrations
+from django.db.models import Count, Max, Q, Sum
+
+
+def backfill_counters(apps, schema_editor):
+    """Carry best submission stars onto UserTopicProgress and recount the profile counters."""
+    ExerciseSubmission = apps.get_model("core", "ExerciseSubmission")
+    UserTopicProgress = apps.get_model("core", "UserTopicProgress")
+    UserModuleProgress = apps.get_model("core", "UserModuleProgress")
+    UserProfile = apps.get_model("core", "UserProfile")
+
+    best = ExerciseSubmission.objects.values_list("user_id", "topic_id").annotate(Max("starsEarned"))
+    best = {(user_id, topic_id): stars for user_id, topic_id, stars in best.iterator() if stars}
+    UserTopicProgress.objects.bulk_create(
+        [UserTopicProgress(user_id=user_id, topic_id=topic_id) for user_id, topic_id in best],
+        ignore_conflicts=True,
+    )
+    progress = []
+    for row in UserTopicProgress.objects.filter(user_id__in={user_id for user_id, _ in best}).iterator():
+        stars = best.get((row.user_id, row.topic_id), 0)
+        if stars > row.stars:
+            row.stars = stars
+            progress.append(row)
+    UserTopicProgress.objects.bulk_update(progress, ["stars"], batch_size=1000)
+
+    stars = dict(UserTopicProgress.objects.values_list("user_id").annotate(Sum("stars")))
+    completed = dict(
+        UserModuleProgress.objects.values_list("user_id").annotate(completed=Count("id", filter=Q(status="completed")))
+    )
+    profiles = list(UserProfile.objects.all())
+    for profile in profiles:
+        profile.totalStars = stars.get(profile.user_id) or 0
+        profile.completedModules = completed.get(profile.user_id) or 0
+    UserProfile.objects.bulk_update(profiles, ["totalStars", "completedModules"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_activity_bitsets"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_payment_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placementsession',
+            name='currentQuestion',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='placementsession',
+            name='snapshot',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 import uuid
 
@@ -12,6 +13,20 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def create_users_bulk(self, users, batch_size=None):
+        """
+        Insert unsaved users, whose passwords are already set, and their
+        profiles with one ``bulk_create`` each. No signals are sent.
+        """
+        for user in users:
+            if not user.email:
+                raise ValueError('The Email field must be set')
+            user.email = self.normalize_email(user.email)
+        with transaction.atomic(using=self._db):
+            users = self.bulk_create(users, batch_size=batch_size)
+            UserProfile.objects.using(self._db).bulk_create([UserProfile(user=user) for user in users], batch_size=batch_size)
+        return users
+
     def create_superuser(self, email, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -40,11 +55,18 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        # Every user has a profile, however it is created (signup, admin, shell).
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            UserProfile.objects.using(self._state.db).create(user=self)
+
 
 from django.conf import settings
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 
+# Created together with its user by UserManager.create_user / create_users_bulk.
 class UserProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     username = models.CharField(max_length=150, unique=True, blank=True, null=True)
@@ -55,26 +77,12 @@ class UserProfile(models.Model):
     def __str__(self):
         return self.user.email
 
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.create(user=instance)
-
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def save_user_profile(sender, instance, **kwargs):
-    # This is called to save the profile instance whenever the user instance is saved.
-    # It's needed for the create_user_profile signal to work correctly.
-    # We can just check if the profile exists, if not, create it.
-    # This is a bit redundant with create_user_profile, but it's a safeguard.
-    try:
-        instance.profile.save()
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance)
-
 
 class Module(models.Model):
     title = models.CharField(max_length=255)
     order = models.PositiveIntegerField(default=0)
+    # Bumped whenever the module or the set of its topics changes (see core/bundles.py).
+    revision = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['order']
@@ -86,6 +94,8 @@ class Topic(models.Model):
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='topics')
     title = models.CharField(max_length=255)
     order = models.PositiveIntegerField(default=0)
+    # Bumped whenever the topic, its content or its exercises change.
+    revision = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['order']
@@ -96,10 +106,20 @@ class Topic(models.Model):
 class TopicContent(models.Model):
     topic = models.OneToOneField(Topic, on_delete=models.CASCADE, related_name='content')
     content = models.JSONField()
+    # Final response bytes, rendered whenever the content or topic is saved.
+    etag = models.CharField(max_length=64, blank=True, editable=False)
+    rendered = models.BinaryField(null=True)
+    rendered_gzip = models.BinaryField(null=True)
 
     def __str__(self):
         return f"Content for {self.topic.title}"
 
+    def save(self, *args, update_fields=None, **kwargs):
+        # The pre_save hook re-renders; a partial save of what it renders from must write the result too.
+        if update_fields is not None and {'content', 'topic'} & set(update_fields):
+            update_fields = {*update_fields, 'etag', 'rendered', 'rendered_gzip'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
 class UserModuleProgress(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     module = models.ForeignKey(Module, on_delete=models.CASCADE)
@@ -119,6 +139,21 @@ class UserTopicProgress(models.Model):
         unique_together = ('user', 'topic')
 
 
+# The payment ledger: one row per payment token spent, either on one user's
+# module or on an institutional licence (user and module empty). See core/payments.py.
+class Payment(models.Model):
+    token = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+    module = models.ForeignKey(Module, on_delete=models.SET_NULL, blank=True, null=True)
+    reference = models.CharField(max_length=255, blank=True) # the verifier's reference for the charge
+    unlocked = models.IntegerField(default=0)
+    fingerprint = models.CharField(max_length=64, blank=True) # digest of the users and modules a licence token was spent on
+    createdAt = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Payment {self.token} ({self.unlocked} unlocked)"
+
+
 class Assessment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=255)
@@ -133,6 +168,10 @@ class Question(models.Model):
     options = models.JSONField()
     category = models.CharField(max_length=100)
     correct_answer = models.JSONField()
+    # Two-parameter logistic item parameters used by the adaptive placement
+    # test; recalibrated from history by `manage.py calibrate_questions`.
+    difficulty = models.FloatField(default=0.0)
+    discrimination = models.FloatField(default=1.0)
 
     def __str__(self):
         return self.question
@@ -142,7 +181,7 @@ class AssessmentSubmission(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE)
     answers = models.JSONField()
-    status = models.CharField(max_length=20, default='processing')
+    status = models.CharField(max_length=20, default='processing') # processing, complete, failed
     level = models.CharField(max_length=10, blank=True, null=True)
     correctCount = models.IntegerField(default=0)
     totalQuestions = models.IntegerField(default=0)
@@ -153,6 +192,39 @@ class AssessmentSubmission(models.Model):
         return f"Submission by {self.user.email} for {self.assessment.title}"
 
 
+class PlacementSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, default='active') # active, complete
+    snapshot = models.CharField(max_length=32, blank=True) # version of the assessment snapshot the session is pinned to
+    currentQuestion = models.IntegerField(blank=True, null=True) # the question served and awaiting an answer
+    responses = models.JSONField(default=list)
+    ability = models.FloatField(default=0.0)
+    standardError = models.FloatField(default=1.0)
+    submission = models.OneToOneField(AssessmentSubmission, on_delete=models.SET_NULL, blank=True, null=True)
+    createdAt = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Placement session {self.id} ({self.status})"
+
+
+class GradingJob(models.Model):
+    submission = models.OneToOneField(AssessmentSubmission, on_delete=models.CASCADE, related_name='grading_job')
+    status = models.CharField(max_length=20, default='queued') # queued, running, done, failed
+    attempts = models.IntegerField(default=0)
+    lockedBy = models.CharField(max_length=64, blank=True, null=True)
+    lockedAt = models.DateTimeField(blank=True, null=True)
+    lastError = models.TextField(blank=True, null=True)
+    createdAt = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'createdAt'])]
+
+    def __str__(self):
+        return f"Grading job for submission {self.submission_id} ({self.status})"
+
+
 class Exercise(models.Model):
     topic = models.ForeignKey('Topic', on_delete=models.CASCADE, related_name='exercises')
     type = models.CharField(max_length=50)
@@ -177,3 +249,78 @@ class ExerciseSubmission(models.Model):
 
     def __str__(self):
         return f"Submission by {self.user.email} for topic {self.topic.title}"
+
+
+# Maintained incrementally as submissions are graded (see core/aggregates.py),
+# so that GET /user/progress is a single row read.
+class UserProgressAggregate(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='progress_aggregate')
+    completedTopics = models.IntegerField(default=0)
+    answersCorrect = models.IntegerField(default=0)
+    answersTotal = models.IntegerField(default=0)
+    # {category: [correct, total]}
+    categoryStats = models.JSONField(default=dict)
+    # {topic_id: [correct, total, best_stars]}
+    topicStats = models.JSONField(default=dict)
+    # Refreshed by `manage.py rollup_learning_events`: the total of the
+    # DailyActivity rollups, and the distinct words of the event log.
+    studySeconds = models.IntegerField(default=0)
+    wordsLearned = models.IntegerField(default=0)
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Progress of {self.user_id}"
+
+
+
+# Append-only; written in batches through core/events.py, never updated.
+class LearningEvent(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=32) # topic_opened, exercise_submitted, assessment_submitted, module_unlocked
+    topic = models.ForeignKey(Topic, on_delete=models.SET_NULL, blank=True, null=True)
+    module = models.ForeignKey(Module, on_delete=models.SET_NULL, blank=True, null=True)
+    data = models.JSONField(default=dict)
+    createdAt = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['createdAt']), models.Index(fields=['user', 'createdAt'])]
+
+    def __str__(self):
+        return f"{self.kind} by {self.user_id} at {self.createdAt}"
+
+# One bit per day, BLOCK_DAYS days per row (see core/activity.py).
+class ActivityBlock(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activity_blocks')
+    block = models.IntegerField()
+    bits = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'block')
+        indexes = [models.Index(fields=['block'])]
+
+    def __str__(self):
+        return f"Activity block {self.block} of {self.user_id}"
+
+class DailyActivity(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    day = models.DateField()
+    events = models.IntegerField(default=0)
+    topicsOpened = models.IntegerField(default=0)
+    exercisesSubmitted = models.IntegerField(default=0)
+    assessmentsSubmitted = models.IntegerField(default=0)
+    studySeconds = models.IntegerField(default=0)
+    wordsLearned = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'day')
+
+    def __str__(self):
+        return f"Activity of {self.user_id} on {self.day}"
+
+# Counters that process-local caches check to see changes made by other processes (see core/generations.py).
+class Generation(models.Model):
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} at {self.value}"
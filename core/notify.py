@@ -0,0 +1,81 @@
+"""
+Completion notifications for long-polling clients.
+
+``notifier.notify(key)`` wakes every coroutine waiting on ``key`` in this
+process immediately and leaves a short-lived marker in the cache named by
+NOTIFY_CACHE. Waiters also check that marker periodically, which is how they
+learn about completions signalled by other processes (e.g. the grading
+workers) without touching the database. That only works when NOTIFY_CACHE is
+shared by those processes; ``manage.py check --deploy`` warns otherwise (see
+core/checks.py).
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+NOTIFY_TTL = 60 * 5
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class Notifier:
+
+    def __init__(self, prefix='notify'):
+        self.prefix = prefix
+        self._waiters = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _cache_key(self, key):
+        return f'{self.prefix}:{key}'
+
+    @property
+    def store(self):
+        return caches[settings.NOTIFY_CACHE]
+
+    def notify(self, key):
+        self.store.set(self._cache_key(key), True, timeout=NOTIFY_TTL)
+        with self._lock:
+            waiters = self._waiters.pop(key, ())
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait(self, key, timeout, poll_interval=0.5):
+        """
+        Wait up to ``timeout`` seconds for ``key`` to be notified.
+
+        Returns True if it was (possibly before the call), False on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            self._waiters[key].add(waiter)
+        try:
+            deadline = loop.time() + timeout
+            while True:
+                if future.done() or await self.store.aget(self._cache_key(key)):
+                    return True
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), min(poll_interval, remaining))
+                    return True
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._waiters.get(key, set()).discard(waiter)
+
+
+notifier = Notifier()
+
+
+def assessment_key(submission_id):
+    return f'assessment:{submission_id}'
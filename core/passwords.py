@@ -0,0 +1,88 @@
+"""
+Login password checks off the request thread.
+
+PBKDF2 releases the GIL while hashing, so password checks run in a bounded
+pool of PASSWORD_HASH_WORKERS threads: a burst of logins queues there rather
+than tying up every request worker, and the ASGI login view awaits the pool
+without blocking the event loop.
+
+The PBKDF2 work factor is PASSWORD_HASH_ITERATIONS, set per deployment. When
+it or the preferred hasher changes, a user's stored hash is upgraded on their
+next successful login, in the same pool. Unknown emails and unusable
+passwords still run the preferred hasher once (Django's ``verify_password``
+does so for an unusable hash), so every failed login costs the same.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password, verify_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class ConfiguredPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the work factor taken from PASSWORD_HASH_ITERATIONS."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+# An unusable hash: verify_password hashes the password once and fails.
+UNKNOWN_USER = '!'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+        return _pool
+
+
+@receiver(setting_changed)
+def reset_pool(setting, **kwargs):
+    global _pool
+    if setting == 'PASSWORD_HASH_WORKERS':
+        with _pool_lock:
+            _pool = None
+
+
+def _check(password, encoded):
+    """Return whether ``password`` matches ``encoded``, and its upgraded hash if the policy changed."""
+    is_correct, must_update = verify_password(password, encoded)
+    return is_correct, make_password(password) if is_correct and must_update else None
+
+
+def _checked_hash(user):
+    # Only replace the hash that was checked, not a concurrent password change.
+    return get_user_model().objects.filter(pk=user.pk, password=user.password)
+
+
+def authenticate_password(user, password):
+    """Return ``user`` if ``password`` is theirs, else None. ``user`` may be None."""
+    is_correct, upgraded = get_pool().submit(_check, password, user.password if user else UNKNOWN_USER).result()
+    if not is_correct:
+        return None
+    if upgraded is not None:
+        _checked_hash(user).update(password=upgraded)
+        user.password = upgraded
+    return user
+
+
+async def aauthenticate_password(user, password):
+    """Async ``authenticate_password``; the hash runs in the pool while the event loop carries on."""
+    future = get_pool().submit(_check, password, user.password if user else UNKNOWN_USER)
+    is_correct, upgraded = await asyncio.wrap_future(future)
+    if not is_correct:
+        return None
+    if upgraded is not None:
+        await _checked_hash(user).aupdate(password=upgraded)
+        user.password = upgraded
+    return user
@@ -0,0 +1,178 @@
+"""
+Module unlocks paid for with a payment token.
+
+Every spent token is recorded in the Payment ledger, whose unique ``token``
+column makes each token unlock at most once. A module that is already
+unlocked is refused before the token is charged. The unlock itself is a
+single conditional ``UPDATE ... SET status='active' WHERE status='locked'``,
+in the same transaction as the ledger row, so concurrent double taps cannot
+unlock twice. If another request unlocks the module between the check and
+the charge, the ledger row is kept with ``unlocked=0`` as the record of that
+charge. A retry with the token that already unlocked the module succeeds
+again without charging.
+
+Tokens are checked by the verifier class named by PAYMENT_VERIFIER, which is
+given the token and the number of (user, module) unlocks it must cover. It
+returns the provider's reference for the charge or raises PaymentRejected.
+StubPaymentVerifier is the local stand-in until a provider is wired up.
+
+``unlock_modules`` serves institutional licences: one token unlocks a set of
+modules for a set of users, a chunk of users at a time, in one transaction.
+The ledger row keeps a fingerprint of the users and modules, so an identical
+retry gets the recorded result back.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
+from rest_framework import status
+
+from .catalogue import get_curriculum
+from .events import MODULE_UNLOCKED, emit
+from .models import Payment, UserModuleProgress
+from .progression import ACTIVE, LOCKED, evaluate
+
+
+class UnlockError(Exception):
+    code = 'UNLOCK_FAILED'
+    message = 'The module could not be unlocked.'
+    status_code = status.HTTP_400_BAD_REQUEST
+
+
+class ModuleNotFound(UnlockError):
+    code = 'MODULE_NOT_FOUND'
+    message = 'Module not found.'
+    status_code = status.HTTP_404_NOT_FOUND
+
+
+class ModuleAlreadyUnlocked(UnlockError):
+    code = 'MODULE_ALREADY_UNLOCKED'
+    message = 'This module is already unlocked.'
+
+
+class PaymentRejected(UnlockError):
+    code = 'PAYMENT_REJECTED'
+    message = 'The payment was not accepted.'
+    status_code = status.HTTP_402_PAYMENT_REQUIRED
+
+
+class PaymentTokenUsed(UnlockError):
+    code = 'PAYMENT_TOKEN_USED'
+    message = 'This payment token has already been used.'
+    status_code = status.HTTP_409_CONFLICT
+
+
+class StubPaymentVerifier:
+    """Accepts every token except those starting with ``declined``; for local development and tests."""
+
+    def verify(self, token, units):
+        if token.startswith('declined'):
+            raise PaymentRejected()
+        return f'stub:{token}'
+
+
+def get_verifier():
+    return import_string(settings.PAYMENT_VERIFIER)()
+
+
+def _check_modules(module_ids):
+    modules = get_curriculum()['modules']
+    if any(module_id not in modules for module_id in module_ids):
+        raise ModuleNotFound()
+
+
+def _record(token, reference, user_id=None, module_id=None, fingerprint=''):
+    try:
+        with transaction.atomic():
+            return Payment.objects.create(token=token, reference=reference, user_id=user_id, module_id=module_id, fingerprint=fingerprint)
+    except IntegrityError:
+        raise PaymentTokenUsed()
+
+
+def unlock_module(user_id, module_id, token):
+    """
+    Unlock ``module_id`` for ``user_id`` with the payment ``token``. Returns
+    True when it was unlocked now, and False for a retry of the token that
+    already unlocked it. Raises an UnlockError otherwise.
+    """
+    _check_modules([module_id])
+    spent = Payment.objects.filter(token=token).values_list('user_id', 'module_id').first()
+    if spent is not None:
+        if spent == (user_id, module_id):
+            return False
+        raise PaymentTokenUsed()
+    if UserModuleProgress.objects.filter(user_id=user_id, module_id=module_id).exclude(status=LOCKED).exists():
+        raise ModuleAlreadyUnlocked()
+    reference = get_verifier().verify(token, units=1)
+
+    with transaction.atomic():
+        try:
+            payment = _record(token, reference, user_id, module_id)
+        except PaymentTokenUsed:
+            # A concurrent retry recorded it first.
+            if Payment.objects.filter(token=token, user_id=user_id, module_id=module_id).exists():
+                return False
+            raise
+        UserModuleProgress.objects.bulk_create([UserModuleProgress(user_id=user_id, module_id=module_id)], ignore_conflicts=True)
+        unlocked = UserModuleProgress.objects.filter(user_id=user_id, module_id=module_id, status=LOCKED).update(status=ACTIVE)
+        if unlocked:
+            Payment.objects.filter(id=payment.id).update(unlocked=1)
+            evaluate([user_id], [module_id])
+    if not unlocked:
+        # Unlocked by another request after the check; the ledger row keeps the charge with unlocked=0.
+        raise ModuleAlreadyUnlocked()
+    emit(user_id, MODULE_UNLOCKED, module_id=module_id)
+    return True
+
+
+def _fingerprint(user_ids, module_ids):
+    return hashlib.sha256(json.dumps([sorted(map(str, user_ids)), sorted(module_ids)]).encode()).hexdigest()
+
+
+def _replayed(spent, fingerprint):
+    recorded, unlocked = spent
+    if not recorded or recorded != fingerprint:
+        raise PaymentTokenUsed()
+    return unlocked
+
+
+def unlock_modules(user_ids, module_ids, token, chunk_size=500):
+    """
+    Unlock every module in ``module_ids`` for every user in ``user_ids`` with
+    one licence ``token``. Modules a user already has unlocked are left as
+    they are. Returns the number of (user, module) pairs unlocked, or for a
+    retry of the same licence, the number its first run unlocked.
+    """
+    user_ids, module_ids = list(dict.fromkeys(user_ids)), list(dict.fromkeys(module_ids))
+    _check_modules(module_ids)
+    fingerprint = _fingerprint(user_ids, module_ids)
+    spent = Payment.objects.filter(token=token).values_list('fingerprint', 'unlocked').first()
+    if spent is not None:
+        return _replayed(spent, fingerprint)
+    reference = get_verifier().verify(token, units=len(user_ids) * len(module_ids))
+
+    unlocked = []
+    with transaction.atomic():
+        try:
+            payment = _record(token, reference, fingerprint=fingerprint)
+        except PaymentTokenUsed:
+            # A concurrent retry recorded it first.
+            return _replayed(Payment.objects.filter(token=token).values_list('fingerprint', 'unlocked').get(), fingerprint)
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            UserModuleProgress.objects.bulk_create(
+                [UserModuleProgress(user_id=user_id, module_id=module_id) for user_id in chunk for module_id in module_ids],
+                ignore_conflicts=True,
+            )
+            rows = list(UserModuleProgress.objects.select_for_update().filter(
+                user_id__in=chunk, module_id__in=module_ids, status=LOCKED
+            ).values_list('id', 'user_id', 'module_id'))
+            UserModuleProgress.objects.filter(id__in=[row_id for row_id, _, _ in rows], status=LOCKED).update(status=ACTIVE)
+            evaluate(chunk, module_ids)
+            unlocked += [(user_id, module_id) for _, user_id, module_id in rows]
+        Payment.objects.filter(id=payment.id).update(unlocked=len(unlocked))
+    for user_id, module_id in unlocked:
+        emit(user_id, MODULE_UNLOCKED, module_id=module_id)
+    return len(unlocked)
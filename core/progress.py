@@ -0,0 +1,75 @@
+"""
+Per-user progress overlay on top of the curriculum catalogue.
+"""
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .catalogue import get_catalogue_version, get_curriculum
+from .models import Module, User, UserModuleProgress, UserTopicProgress
+from .progression import ACTIVE, LOCKED, evaluate
+
+
+def _seeded_key(user_id):
+    return f'progress:seeded:{user_id}'
+
+
+def seed_module_progress(user_id):
+    """
+    Make sure the user has a UserModuleProgress row for every module.
+
+    Missing rows are found with a single anti-join and inserted with a single
+    bulk insert. The first module in curriculum order is free: it is made
+    active, with its first topic unlocked, the first time it is found locked.
+    The catalogue version the user was last seeded against is remembered, so
+    the whole step is skipped until the curriculum changes.
+    """
+    version = get_catalogue_version()
+    key = _seeded_key(user_id)
+    if cache.get(key) == version:
+        return
+
+    existing = UserModuleProgress.objects.filter(user_id=user_id, module=OuterRef('pk'))
+    # Nothing is missing for a user deleted while their token is still valid.
+    missing = Module.objects.filter(~Exists(existing), Exists(User.objects.filter(pk=user_id))).values_list('pk', flat=True)
+    UserModuleProgress.objects.bulk_create(
+        [UserModuleProgress(user_id=user_id, module_id=module_id) for module_id in missing],
+        ignore_conflicts=True,
+    )
+    first = get_curriculum()['order'][:1]
+    if first and UserModuleProgress.objects.filter(user_id=user_id, module_id=first[0], status=LOCKED).update(status=ACTIVE):
+        evaluate([user_id], first)
+    cache.set(key, version, timeout=None)
+
+
+def load_topic_progress(user_id, module_ids):
+    """
+    Build the topic list of every given module for one user.
+
+    Returns ``{module_id: [{"id", "title", "stars", "status"}, ...]}``. Topics
+    come from the catalogue cache, so only the user's progress rows are
+    queried. Topics the user has no progress for are reported as locked with
+    zero stars.
+    """
+    catalogue_topics = get_curriculum()['topics_by_module']
+    topics = [
+        (topic_id, module_id, title)
+        for module_id in module_ids
+        for topic_id, title in catalogue_topics.get(module_id, [])
+    ]
+    progress = {
+        topic_id: (stars, status)
+        for topic_id, stars, status in UserTopicProgress.objects.filter(
+            user_id=user_id, topic_id__in=[topic_id for topic_id, _, _ in topics]
+        ).values_list('topic_id', 'stars', 'status')
+    }
+
+    topics_by_module = {module_id: [] for module_id in module_ids}
+    for topic_id, module_id, title in topics:
+        stars, status = progress.get(topic_id, (0, 'locked'))
+        topics_by_module[module_id].append({
+            "id": topic_id,
+            "title": title,
+            "stars": stars,
+            "status": status
+        })
+    return topics_by_module
@@ -0,0 +1,117 @@
+"""
+Progression through the curriculum.
+
+A user's topics and modules move ``locked`` -> ``active`` -> ``completed``.
+The statuses are derived from the completed topics and the curriculum order,
+one module at a time:
+
+* a completed topic stays completed;
+* in a module that is not locked, a topic is active when it is the first by
+  ``Topic.order`` or the topic before it is completed, and locked otherwise;
+* a module that is not locked is completed when every one of its topics is,
+  and active otherwise. Locked modules are unlocked by payment, except the
+  first module of the curriculum, which seeding makes active for every user
+  (see core/progress.py).
+
+``evaluate`` applies these rules to any number of users and modules in one
+transaction, with a fixed number of bulk statements: one SELECT per table,
+an UPDATE per target status, one INSERT for topics that had no progress row
+and the counter updates of core/counters.py. ``complete_topic`` marks a topic
+completed and re-evaluates its module, which unlocks the next topic and
+completes the module; ``reevaluate`` (``manage.py reevaluate_progress``)
+re-applies the rules to everyone after the curriculum is reordered.
+
+Topics are read from the catalogue cache, so re-evaluation after a reorder
+must run once the change is committed.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .catalogue import get_curriculum
+from .counters import COMPLETED, set_module_statuses
+from .models import UserModuleProgress, UserTopicProgress
+
+LOCKED = 'locked'
+ACTIVE = 'active'
+
+
+def evaluate(user_ids, module_ids):
+    """Bring the given users' progress on ``module_ids`` in line with the rules above."""
+    topics_by_module = get_curriculum()['topics_by_module']
+    module_ids = [module_id for module_id in module_ids if module_id in topics_by_module]
+    if not user_ids or not module_ids:
+        return
+
+    with transaction.atomic():
+        # Locking the module rows serializes evaluations of the same module.
+        modules = UserModuleProgress.objects.select_for_update().filter(
+            user_id__in=user_ids, module_id__in=module_ids
+        ).exclude(status=LOCKED).values_list('user_id', 'module_id', 'status')
+        modules = list(modules)
+        topic_rows = {
+            (user_id, topic_id): (row_id, status)
+            for row_id, user_id, topic_id, status in UserTopicProgress.objects.filter(
+                user_id__in={user_id for user_id, _, _ in modules},
+                topic_id__in=[topic_id for module_id in module_ids for topic_id, _ in topics_by_module[module_id]],
+            ).values_list('id', 'user_id', 'topic_id', 'status')
+        }
+
+        topic_updates, inserts, module_changes = defaultdict(list), [], {}
+        for user_id, module_id, module_status in modules:
+            previous_done, all_done = True, bool(topics_by_module[module_id])
+            for topic_id, _ in topics_by_module[module_id]:
+                row_id, current = topic_rows.get((user_id, topic_id), (None, LOCKED))
+                if current == COMPLETED:
+                    previous_done = True
+                    continue
+                target = ACTIVE if previous_done else LOCKED
+                previous_done = all_done = False
+                if target == current:
+                    continue
+                if row_id is None:
+                    inserts.append(UserTopicProgress(user_id=user_id, topic_id=topic_id, status=target))
+                else:
+                    topic_updates[target].append(row_id)
+            target = COMPLETED if all_done else ACTIVE
+            if target != module_status:
+                module_changes[user_id, module_id] = target
+
+        for status, ids in topic_updates.items():
+            UserTopicProgress.objects.filter(id__in=ids).update(status=status)
+        UserTopicProgress.objects.bulk_create(inserts, ignore_conflicts=True)
+        set_module_statuses(module_changes)
+
+
+def complete_topic(user_id, topic_id, module_id):
+    """Mark a topic completed and cascade: unlock the next topic and complete the module when it was the last one."""
+    with transaction.atomic():
+        UserTopicProgress.objects.bulk_create([UserTopicProgress(user_id=user_id, topic_id=topic_id)], ignore_conflicts=True)
+        changed = UserTopicProgress.objects.filter(user_id=user_id, topic_id=topic_id).exclude(status=COMPLETED).update(status=COMPLETED)
+        if changed:
+            evaluate([user_id], [module_id])
+    return bool(changed)
+
+
+def reevaluate(module_ids=None, chunk_size=500, progress=None):
+    """
+    Re-apply the progression rules for every user with an unlocked module
+    among ``module_ids`` (all modules by default), ``chunk_size`` users per
+    transaction. ``progress`` is called with the number of users done.
+    """
+    if module_ids is None:
+        module_ids = get_curriculum()['order']
+    user_ids = (
+        UserModuleProgress.objects.filter(module_id__in=module_ids).exclude(status=LOCKED)
+        .order_by('user_id').values_list('user_id', flat=True).distinct()
+    )
+    done, last = 0, None
+    while True:
+        chunk = list((user_ids.filter(user_id__gt=last) if last is not None else user_ids)[:chunk_size])
+        if not chunk:
+            return done
+        evaluate(chunk, module_ids)
+        done += len(chunk)
+        last = chunk[-1]
+        if progress is not None:
+            progress(done)
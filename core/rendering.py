@@ -0,0 +1,60 @@
+"""
+Pre-rendered response bodies.
+
+Large, rarely changing payloads are rendered to their final JSON envelope
+once, when the underlying rows change, and stored alongside a gzip variant
+and a content hash. Views then serve the stored bytes as-is and answer
+conditional requests with a 304.
+"""
+import gzip
+import hashlib
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+
+def render_envelope(data):
+    return JSONRenderer().render({"success": True, "data": data})
+
+
+def build_blob(data):
+    """
+    Render ``data`` inside the standard success envelope.
+
+    Returns ``(etag, body, body_gzip)`` where ``etag`` is the hex SHA-256 of
+    the uncompressed body.
+    """
+    body = render_envelope(data)
+    # mtime=0 keeps the compressed bytes stable for identical bodies.
+    body_gzip = gzip.compress(body, compresslevel=9, mtime=0)
+    return hashlib.sha256(body).hexdigest(), body, body_gzip
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def blob_response(request, etag, body, body_gzip):
+    """
+    Serve a pre-rendered blob, honouring If-None-Match and Accept-Encoding.
+
+    Each encoding gets its own strong ETag; a request carrying either one is
+    answered with 304 Not Modified.
+    """
+    use_gzip = body_gzip is not None and accepts_gzip(request)
+    tag = f'"{etag}-gzip"' if use_gzip else f'"{etag}"'
+
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' in if_none_match or any(t.removeprefix('W/') in (f'"{etag}"', f'"{etag}-gzip"') for t in if_none_match):
+        response = HttpResponseNotModified()
+    elif use_gzip:
+        response = HttpResponse(body_gzip, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(body, content_type='application/json')
+
+    response['ETag'] = tag
+    patch_vary_headers(response, ('Accept-Encoding', 'Authorization'))
+    return response
@@ -0,0 +1,181 @@
+"""
+Revoked refresh tokens, checked without querying the blacklist.
+
+Every token refresh blacklists the old token (BLACKLIST_AFTER_ROTATION) and
+simplejwt checks each refreshed token against BlacklistedToken. Each process
+keeps a Bloom filter of the revoked JTIs in front of that table. The filter is
+built from the table on first use. Revocations made by this process are added
+as they happen. Revocations made elsewhere are picked up in two ways. When
+TOKEN_REVOCATION_CACHE is shared between processes, every revocation bumps a
+version counter there on commit, and a process that sees a value other than
+its own re-reads the rows blacklisted since its last sync. In any case each
+process re-reads them at least every TOKEN_REVOCATION_SYNC_INTERVAL seconds,
+which bounds how stale the filter can be with a per-process cache.
+
+A JTI the filter does not contain is taken as not revoked, so that check
+needs no query. Only JTIs the filter may contain (revoked ones and the rare
+false positive) go to the table. The filter is only a fast path: rotation
+blacklists the presented token, and PrincipalRefreshToken refuses a token
+whose blacklist row already exists. A replay that reaches a process with a
+stale filter is therefore still rejected, by the insert that refresh makes
+anyway.
+
+With a cache that does not store values (DummyCache) every check syncs
+first, which costs one query.
+
+``prune`` (``manage.py prune_tokens``) deletes expired outstanding and
+blacklisted tokens in bounded batches.
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+VERSION_KEY = 'revoked-tokens:version'
+
+# Covers transactions that blacklisted a token before the previous sync and committed after it.
+SYNC_SLACK = timedelta(minutes=1)
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter of strings with a false-positive rate of about ``error_rate`` at ``capacity`` items."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        # Optimal sizing: m = -n ln(p) / ln(2)^2 bits and k = m/n ln(2) hashes.
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevokedTokens:
+    """The per-process Bloom filter of revoked JTIs, kept in step with BlacklistedToken."""
+
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def store(self):
+        return self._store if self._store is not None else caches[settings.TOKEN_REVOCATION_CACHE]
+
+    def reset(self):
+        """Forget the filter; the next check rebuilds it from the table."""
+        with self._lock:
+            self._filter = None
+            self._version = None
+            self._synced_at = None
+            self._checked_at = 0
+
+    def _blacklisted(self, since=None):
+        rows = BlacklistedToken.objects.all()
+        if since is not None:
+            rows = rows.filter(blacklisted_at__gte=since - SYNC_SLACK)
+        return rows.values_list('token__jti', flat=True).iterator()
+
+    def _rebuild(self, version):
+        synced_at = timezone.now()
+        jtis = list(self._blacklisted())
+        self._filter = BloomFilter(max(settings.TOKEN_REVOCATION_BLOOM_CAPACITY, 2 * len(jtis)))
+        for jti in jtis:
+            self._filter.add(jti)
+        self._synced(version, synced_at)
+
+    def _synced(self, version, synced_at):
+        self._version, self._synced_at = version, synced_at
+        self._checked_at = time.monotonic()
+
+    def _sync(self):
+        version = _current_version(self.store)
+        if self._filter is None or self._filter.count > self._filter.capacity:
+            self._rebuild(version)
+        elif version is None or version != self._version or time.monotonic() - self._checked_at >= settings.TOKEN_REVOCATION_SYNC_INTERVAL:
+            synced_at = timezone.now()
+            for jti in self._blacklisted(since=self._synced_at):
+                self._filter.add(jti)
+            self._synced(version, synced_at)
+
+    def may_contain(self, jti):
+        """False when ``jti`` is certainly not blacklisted; True when it may be."""
+        with self._lock:
+            self._sync()
+            return jti in self._filter
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+        transaction.on_commit(self._committed)
+
+    def _committed(self):
+        version = _bump_version(self.store)
+        with self._lock:
+            # Nobody else revoked since our last sync, so the filter is already current.
+            if version is not None and self._version is not None and version == self._version + 1:
+                self._version = version
+
+
+revoked = RevokedTokens()
+
+
+def _current_version(store):
+    version = store.get(VERSION_KEY)
+    if version is None:
+        # A random start keeps a re-created counter from repeating a version a process has seen.
+        store.add(VERSION_KEY, random.getrandbits(62), None)
+        version = store.get(VERSION_KEY)
+    return version
+
+
+def _bump_version(store):
+    try:
+        return store.incr(VERSION_KEY)
+    except ValueError:
+        _current_version(store)
+        try:
+            return store.incr(VERSION_KEY)
+        except ValueError:
+            return None
+
+
+def prune(batch_size=1000, progress=None):
+    """
+    Delete outstanding tokens that have expired, and their blacklist rows,
+    ``batch_size`` tokens per transaction. ``progress`` is called with the
+    number deleted so far. Returns the number of tokens deleted.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(OutstandingToken.objects.filter(expires_at__lte=now).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        if progress is not None:
+            progress(deleted)
@@ -0,0 +1,66 @@
+"""
+Read-only serialization of ``values_list`` rows for the hot read paths.
+
+DRF serializers go through each field's ``get_attribute`` and
+``to_representation`` on every object, which dominates CPU time when a
+response holds hundreds of rows. A RowSerializer reads a ModelSerializer's
+field declarations once and compiles one function that turns a
+``values_list`` row into the dict ``serializer.data`` would have produced.
+Fields whose DRF representation is a plain ``int``/``str`` or the value
+itself are inlined, and any other field calls its own ``to_representation``.
+Each ``source`` becomes an ORM lookup, so ``topic.title`` is read as
+``topic__title`` in the same query.
+
+The DRF serializers remain the definition of the output and are still used
+for validation and writes. Fields that need an object, such as
+SerializerMethodFields and nested serializers, cannot be compiled. Pass them
+in ``exclude`` and let the caller add them.
+"""
+from rest_framework import serializers
+
+# Fields whose to_representation is exactly int() or str().
+_BUILTINS = {serializers.IntegerField: 'int', serializers.CharField: 'str'}
+
+
+def _compile(fields):
+    namespace, items = {}, []
+    for i, (name, field) in enumerate(fields):
+        value = f'v{i}'
+        if isinstance(field, serializers.JSONField) and not field.binary:
+            items.append(f'{name!r}: {value}')
+            continue
+        convert = _BUILTINS.get(type(field))
+        if convert is None:
+            namespace[f'f{i}'] = field.to_representation
+            convert = f'f{i}'
+        items.append(f'{name!r}: None if {value} is None else {convert}({value})')
+    unpack = ''.join(f'v{i}, ' for i in range(len(fields)))
+    source = f"def to_dict(row):\n    {unpack}= row\n    return {{{', '.join(items)}}}\n"
+    exec(source, namespace)
+    return namespace['to_dict']
+
+
+class RowSerializer:
+    """Compiled ``values_list`` serialization for ``serializer_class``, minus the fields in ``exclude``."""
+
+    def __init__(self, serializer_class, exclude=()):
+        fields = []
+        for name, field in serializer_class().fields.items():
+            if name in exclude or field.write_only:
+                continue
+            if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)) or field.source == '*':
+                raise ValueError(f"{serializer_class.__name__}.{name} needs an object; exclude it.")
+            fields.append((name, field))
+        self.lookups = tuple(field.source.replace('.', '__') for _, field in fields)
+        self.to_dict = _compile(fields)
+
+    def serialize(self, queryset):
+        to_dict = self.to_dict
+        return [to_dict(row) for row in queryset.values_list(*self.lookups)]
+
+    def serialize_by(self, queryset, key):
+        """``{key value: [dicts]}`` for a queryset grouped on the lookup ``key``, in queryset order."""
+        to_dict, groups = self.to_dict, {}
+        for row in queryset.values_list(key, *self.lookups):
+            groups.setdefault(row[0], []).append(to_dict(row[1:]))
+        return groups
@@ -1,8 +1,16 @@
+from collections import Counter
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 from django.utils.translation import gettext_lazy as _
 
+from .authentication import PrincipalRefreshToken
+from .passwords import authenticate_password
+from .rowserializers import RowSerializer
+
 User = get_user_model()
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -21,20 +29,20 @@ class RegisterSerializer(serializers.ModelSerializer):
         )
         return user
 
-class LoginSerializer(serializers.Serializer):
+class LoginFieldsSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
 
-    def validate(self, data):
-        email = data.get('email')
-        password = data.get('password')
+class LoginSerializer(LoginFieldsSerializer):
 
-        if email and password:
-            user = User.objects.filter(email=email).first()
-            if user and user.check_password(password):
-                self.context['user'] = user
-                return data
-        raise serializers.ValidationError(_('Invalid credentials'))
+    def validate(self, data):
+        user = User.objects.filter(email=data['email']).first()
+        # Unknown emails are hashed too, see core/passwords.py.
+        user = authenticate_password(user, data['password'])
+        if user is None:
+            raise serializers.ValidationError(_('Invalid credentials'))
+        self.context['user'] = user
+        return data
 
 class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField()
@@ -45,12 +53,19 @@ class LogoutSerializer(serializers.Serializer):
 
     def save(self, **kwargs):
         try:
-            RefreshToken(self.token).blacklist()
+            PrincipalRefreshToken(self.token).blacklist()
         except Exception as e:
             raise serializers.ValidationError(e)
 
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    # Rotated tokens keep their claims and are checked against the revoked-token filter.
+    token_class = PrincipalRefreshToken
+
 
 from .models import UserProfile
+from .activity import ActivitySet
+from .aggregates import KNOWN_SKILLS
+from .catalogue import get_curriculum
 
 class UserProfileSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source='user.name')
@@ -67,75 +82,77 @@ class UserProfileSerializer(serializers.ModelSerializer):
         name = user_data.get('name')
         if name:
             instance.user.name = name
-            instance.user.save()
+            instance.user.save(update_fields=['name'])
 
         # Update UserProfile fields
-        instance.username = validated_data.get('username', instance.username)
-        instance.save()
+        if 'username' in validated_data:
+            instance.username = validated_data['username']
+            instance.save(update_fields=['username'])
         return instance
 
 class UserProgressSerializer(serializers.Serializer):
+    """
+    Renders a UserProgressAggregate (with ``user.profile`` loaded) and the
+    user's ActivitySet, passed as ``context['activity']``.
+    """
     overview = serializers.SerializerMethodField()
     statistics = serializers.SerializerMethodField()
     skillProgress = serializers.SerializerMethodField()
     weeklyActivity = serializers.SerializerMethodField()
     areasForImprovement = serializers.SerializerMethodField()
 
+    WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+    def _activity(self):
+        return self.context.get('activity') or ActivitySet()
+
     def get_overview(self, instance):
-        # This is dummy data, will be replaced with actual data later
+        profile = instance.user.profile
         return {
-            "currentLevel": "A2",
-            "totalStars": 47,
-            "completedModules": 2,
-            "completedTopics": 6
+            "currentLevel": profile.currentLevel,
+            "totalStars": profile.totalStars,
+            "completedModules": profile.completedModules,
+            "completedTopics": instance.completedTopics
         }
 
     def get_statistics(self, instance):
-        # This is dummy data
         return {
-            "dayStreak": 7,
-            "avgScore": 87,
-            "wordsLearned": 156,
-            "studyTimeHours": 23
+            "dayStreak": self._activity().streak(timezone.localdate()),
+            "avgScore": round(100 * instance.answersCorrect / instance.answersTotal) if instance.answersTotal else 0,
+            "wordsLearned": instance.wordsLearned,
+            "studyTimeHours": round(instance.studySeconds / 3600, 1)
         }
 
     def get_skillProgress(self, instance):
-        # This is dummy data
-        return [
-            { "skill": "Grammar", "progress": 85 },
-            { "skill": "Vocabulary", "progress": 92 },
-            { "skill": "Listening", "progress": 78 },
-            { "skill": "Reading", "progress": 89 }
-        ]
+        skills = list(KNOWN_SKILLS) + sorted(set(instance.categoryStats) - set(KNOWN_SKILLS))
+        progress = []
+        for skill in skills:
+            correct, total = instance.categoryStats.get(skill, [0, 0])
+            progress.append({"skill": skill.title(), "progress": round(100 * correct / total) if total else 0})
+        return progress
 
     def get_weeklyActivity(self, instance):
-        # This is dummy data
-        return [
-            { "day": "Mon", "active": True },
-            { "day": "Tue", "active": True },
-            { "day": "Wed", "active": True },
-            { "day": "Thu", "active": True },
-            { "day": "Fri", "active": True },
-            { "day": "Sat", "active": False },
-            { "day": "Sun", "active": False }
-        ]
+        week = self._activity().week(timezone.localdate())
+        return [{"day": day, "active": active} for day, active in zip(self.WEEKDAYS, week)]
 
     def get_areasForImprovement(self, instance):
-        # This is dummy data
-        return [
-            {
-                "topicId": 2,
-                "topicTitle": "Articles (a, an, the)",
-                "accuracy": 65,
-                "recommendation": "Needs practice"
-            },
-            {
-                "topicId": 5,
-                "topicTitle": "Past Simple vs Present Perfect",
-                "accuracy": 72,
-                "recommendation": "Review recommended"
-            }
-        ]
+        titles = {
+            topic_id: title
+            for topics in get_curriculum()['topics_by_module'].values()
+            for topic_id, title in topics
+        }
+        areas = []
+        for topic_id, (correct, total, _) in instance.topicStats.items():
+            accuracy = round(100 * correct / total) if total else 0
+            if int(topic_id) in titles and accuracy < 80:
+                areas.append({
+                    "topicId": int(topic_id),
+                    "topicTitle": titles[int(topic_id)],
+                    "accuracy": accuracy,
+                    "recommendation": "Needs practice" if accuracy < 70 else "Review recommended"
+                })
+        areas.sort(key=lambda area: area["accuracy"])
+        return areas[:3]
 
 from .models import Module, Topic, TopicContent, UserModuleProgress, UserTopicProgress
 
@@ -157,26 +174,12 @@ class ModuleProgressSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'status', 'finalScore', 'topics')
 
     def get_topics(self, obj):
-        user = self.context['request'].user
-        topics = Topic.objects.filter(module=obj.module)
-        user_topic_progress = UserTopicProgress.objects.filter(user=user, topic__in=topics)
-
-        progress_map = {utp.topic_id: utp for utp in user_topic_progress}
-
-        serialized_topics = []
-        for topic in topics:
-            progress = progress_map.get(topic.id)
-            if progress:
-                serialized_topics.append(TopicProgressSerializer(progress).data)
-            else:
-                # If no progress entry, it means it's locked
-                serialized_topics.append({
-                    "id": topic.id,
-                    "title": topic.title,
-                    "stars": 0,
-                    "status": "locked"
-                })
-        return serialized_topics
+        # Topics come preloaded for every module (see load_topic_progress);
+        # rendering without them is a bug rather than a reason to query per module.
+        return self.context['topics_by_module'].get(obj.module_id, [])
+
+# ModuleListView's rows; it adds "topics" from load_topic_progress.
+module_progress_rows = RowSerializer(ModuleProgressSerializer, exclude=('topics',))
 
 class TopicContentSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='topic.id')
@@ -187,12 +190,16 @@ class TopicContentSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'content')
 
 from .models import Assessment, Question, AssessmentSubmission
+from .events import ASSESSMENT_SUBMITTED, EXERCISE_SUBMITTED, emit
+from .jobs import enqueue_grading
 
 class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = ('id', 'type', 'question', 'options', 'category')
 
+question_rows = RowSerializer(QuestionSerializer)
+
 class AssessmentSerializer(serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True)
     assessmentId = serializers.UUIDField(source='id')
@@ -209,6 +216,12 @@ class AssessmentSubmitSerializer(serializers.Serializer):
     assessmentId = serializers.UUIDField()
     answers = AnswerSerializer(many=True)
 
+    def validate_answers(self, answers):
+        duplicates = sorted(question_id for question_id, count in Counter(a['questionId'] for a in answers).items() if count > 1)
+        if duplicates:
+            raise serializers.ValidationError(_('Questions answered more than once: %s') % duplicates)
+        return answers
+
     def create(self, validated_data):
         user = self.context['request'].user
         assessment_id = validated_data['assessmentId']
@@ -216,16 +229,33 @@ class AssessmentSubmitSerializer(serializers.Serializer):
 
         assessment = Assessment.objects.get(id=assessment_id)
 
-        # In a real app, we would have a background task to process the assessment
-        # For now, we'll just create the submission record.
-        submission = AssessmentSubmission.objects.create(
-            user=user,
-            assessment=assessment,
-            answers=answers,
-            totalQuestions=assessment.questions.count()
-        )
+        # Grading happens in the run_grading_workers processes.
+        with transaction.atomic():
+            submission = AssessmentSubmission.objects.create(
+                user=user,
+                assessment=assessment,
+                answers=answers,
+                totalQuestions=assessment.questions.count()
+            )
+            enqueue_grading(submission)
+        emit(user.pk, ASSESSMENT_SUBMITTED, assessmentId=str(assessment.id), answered=len(answers))
         return submission
 
+class AdaptiveStartSerializer(serializers.Serializer):
+    assessmentId = serializers.UUIDField(required=False)
+
+class AdaptiveAnswerSerializer(serializers.Serializer):
+    questionId = serializers.IntegerField()
+    answer = serializers.JSONField()
+
+    def validate(self, attrs):
+        session = self.context['session']
+        if session.status != 'active':
+            raise serializers.ValidationError(_('This placement session is already complete.'))
+        if attrs['questionId'] != session.currentQuestion:
+            raise serializers.ValidationError({'questionId': _('Answer the question this session asked.')})
+        return attrs
+
 class AssessmentResultSerializer(serializers.ModelSerializer):
     submissionId = serializers.UUIDField(source='id')
     class Meta:
@@ -233,12 +263,18 @@ class AssessmentResultSerializer(serializers.ModelSerializer):
         fields = ('submissionId', 'status', 'level', 'correctCount', 'totalQuestions', 'aiAnalysis')
 
 from .models import Exercise, ExerciseSubmission
+from .aggregates import exercise_skill, record_exercise_submission
+from .counters import record_topic_stars
+from .progression import complete_topic
+from .grading import grade_exercises
 
 class ExerciseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Exercise
         fields = ('id', 'type', 'question', 'data')
 
+exercise_rows = RowSerializer(ExerciseSerializer)
+
 class TopicExerciseSerializer(serializers.ModelSerializer):
     exercises = ExerciseSerializer(many=True, read_only=True)
     topicId = serializers.IntegerField(source='id')
@@ -255,18 +291,46 @@ class ExerciseAnswerSerializer(serializers.Serializer):
 class ExerciseSubmitSerializer(serializers.Serializer):
     answers = ExerciseAnswerSerializer(many=True)
 
+    def validate_answers(self, answers):
+        topic = self.context['topic']
+        exercise_ids = [answer['exerciseId'] for answer in answers]
+        duplicates = sorted(exercise_id for exercise_id, count in Counter(exercise_ids).items() if count > 1)
+        if duplicates:
+            raise serializers.ValidationError(_('Exercises answered more than once: %s') % duplicates)
+
+        # Every exercise of the topic: the grade counts unanswered ones as wrong.
+        exercises = Exercise.objects.filter(topic=topic).only('id', 'type', 'data', 'correct_answer')
+        self.exercises_by_id = {exercise.id: exercise for exercise in exercises}
+
+        unknown = sorted(set(exercise_ids) - self.exercises_by_id.keys())
+        if unknown:
+            raise serializers.ValidationError(_('Unknown exercises for this topic: %s') % unknown)
+        return answers
+
     def create(self, validated_data):
         user = self.context['request'].user
         topic = self.context['topic']
         answers = validated_data['answers']
 
-        # In a real app, we would have a background task to process the submission
-        # For now, we'll just create the submission record.
-        submission = ExerciseSubmission.objects.create(
-            user=user,
-            topic=topic,
-            answers=answers,
-            totalQuestions=len(answers)
+        grade = grade_exercises(self.exercises_by_id, answers)
+        with transaction.atomic():
+            submission = ExerciseSubmission.objects.create(
+                user=user,
+                topic=topic,
+                answers=answers,
+                **grade
+            )
+            record_exercise_submission(submission, self.exercises_by_id)
+            record_topic_stars(user.pk, topic.id, submission.starsEarned)
+            if submission.starsEarned:
+                complete_topic(user.pk, topic.id, topic.module_id)
+        emit(
+            user.pk, EXERCISE_SUBMITTED, topic_id=topic.id, module_id=topic.module_id,
+            correct=submission.correctCount, total=submission.totalQuestions, stars=submission.starsEarned,
+            vocabularyLearned=[
+                r['exerciseId'] for r in submission.results
+                if r['isCorrect'] and exercise_skill(self.exercises_by_id[r['exerciseId']].type, self.exercises_by_id[r['exerciseId']].data) == 'vocabulary'
+            ]
         )
         return submission
 
@@ -279,3 +343,8 @@ class ExerciseResultSerializer(serializers.ModelSerializer):
 
 class UnlockModuleSerializer(serializers.Serializer):
     paymentToken = serializers.CharField()
+
+class BulkUnlockSerializer(serializers.Serializer):
+    paymentToken = serializers.CharField()
+    emails = serializers.ListField(child=serializers.EmailField(), min_length=1, max_length=10000)
+    moduleIds = serializers.ListField(child=serializers.IntegerField(), min_length=1)
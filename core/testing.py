@@ -0,0 +1,28 @@
+"""
+Test runner that keeps the test run away from the files the server uses.
+
+Assessment snapshots are written to a temporary directory for the whole run
+rather than to ASSESSMENT_SNAPSHOT_DIR, and learning events are only written
+when a test flushes them, not by the background flusher thread.
+"""
+import tempfile
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._snapshot_dir = tempfile.TemporaryDirectory()
+        self._overrides = override_settings(
+            ASSESSMENT_SNAPSHOT_DIR=self._snapshot_dir.name,
+            LEARNING_EVENT_BACKGROUND_FLUSH=False,
+        )
+        self._overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._overrides.disable()
+        self._snapshot_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -93,3 +93,2142 @@ class AuthAPITests(APITestCase):
         response = self.client.post(self.logout_url, logout_data, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+import gzip
+from io import StringIO
+import json
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from .models import Module, Topic, TopicContent, Exercise, UserModuleProgress, UserTopicProgress
+from .serializers import ModuleProgressSerializer
+
+
+class ModuleListAPITests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='learner@example.com', password='testpassword123', name='Learner')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('module-list')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.modules = [Module.objects.create(title=f'Module {i}', order=i) for i in range(3)]
+
+    def test_seeds_missing_progress_rows(self):
+        """
+        Ensure every module gets a progress row, in curriculum order.
+        """
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['id'] for m in response.data['data']], [m.id for m in self.modules])
+        self.assertEqual(UserModuleProgress.objects.filter(user=self.user).count(), 3)
+
+    def test_new_user_can_start_the_first_module(self):
+        """
+        Ensure a new user finds the first module active and can submit its exercises, while the rest stay locked.
+        """
+        topic = Topic.objects.create(module=self.modules[0], title='First Topic', order=0)
+        exercise = Exercise.objects.create(topic=topic, type='multiple_choice', question='Q', data={'options': ['a', 'b']}, correct_answer=0)
+
+        modules = self.client.get(self.url).data['data']
+        self.assertEqual([m['status'] for m in modules], ['active', 'locked', 'locked'])
+        self.assertEqual(modules[0]['topics'][0]['status'], 'active')
+
+        response = self.client.post(reverse('exercise-submit', args=[topic.id]), {'answers': [{'exerciseId': exercise.id, 'answer': 0}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_seeding_is_skipped_until_catalogue_changes(self):
+        """
+        Ensure a repeat request does no seeding work and a new module is picked up.
+        """
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertFalse(any('INSERT' in q['sql'] for q in ctx.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Module.objects.create(title='Module 3', order=3)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['data']), 4)
+        self.assertEqual(UserModuleProgress.objects.filter(user=self.user).count(), 4)
+
+    def test_query_count_is_flat(self):
+        """
+        Ensure the module list costs a fixed number of queries however big the curriculum is.
+        """
+        for module in self.modules:
+            for i in range(4):
+                Topic.objects.create(module=module, title=f'{module.title} topic {i}', order=i)
+        self.client.get(self.url)
+
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            extra = Module.objects.create(title='Module 3', order=3)
+        Topic.objects.create(module=extra, title='Extra topic', order=0)
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_preloaded_topics_list_every_topic(self):
+        """
+        Ensure every module lists all of its topics, locked unless the user has progress on them.
+        """
+        first = Topic.objects.create(module=self.modules[0], title='Present Simple', order=0)
+        Topic.objects.create(module=self.modules[0], title='Articles', order=1)
+        Topic.objects.create(module=self.modules[1], title='Past Simple', order=0)
+        UserTopicProgress.objects.create(user=self.user, topic=first, stars=2, status='completed')
+
+        response = self.client.get(self.url)
+
+        progress = {p.topic_id: p for p in UserTopicProgress.objects.filter(user=self.user)}
+        for module in response.data['data']:
+            expected = [
+                {'id': topic.id, 'title': topic.title, 'stars': progress[topic.id].stars, 'status': progress[topic.id].status}
+                if topic.id in progress else {'id': topic.id, 'title': topic.title, 'stars': 0, 'status': 'locked'}
+                for topic in Topic.objects.filter(module_id=module['id'])
+            ]
+            self.assertEqual(module['topics'], expected)
+        self.assertEqual(response.data['data'][0]['topics'][0], {'id': first.id, 'title': 'Present Simple', 'stars': 2, 'status': 'completed'})
+
+
+from . import generations
+from .catalogue import CATALOGUE_GENERATION
+
+
+class CatalogueCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='reader@example.com', password='testpassword123', name='Reader')
+        self.client.force_authenticate(self.user)
+        module = Module.objects.create(title='Beginner Basics', order=0)
+        self.topic = Topic.objects.create(module=module, title='Prepositions', order=0)
+        self.content = TopicContent.objects.create(topic=self.topic, content={'sections': [{'heading': 'IN', 'text': 'months'}]})
+        Exercise.objects.create(topic=self.topic, type='multiple_choice', question='Pick one', data={'options': ['in', 'on']}, correct_answer=0)
+
+    def test_topic_reads_are_served_from_the_catalogue_cache(self):
+        """
+        Ensure warm topic content and exercise reads do not query the catalogue tables.
+        """
+        content_url = reverse('topic-content', args=[self.topic.id])
+        exercises_url = reverse('topic-exercises', args=[self.topic.id])
+        self.client.get(content_url)
+        self.client.get(exercises_url)
+
+        with self.assertNumQueries(0):
+            content = self.client.get(content_url)
+            exercises = self.client.get(exercises_url)
+
+        self.assertEqual(json.loads(content.content)['data']['content'], self.content.content)
+        self.assertEqual(exercises.data['data']['exercises'][0]['question'], 'Pick one')
+
+    def test_catalogue_change_invalidates_cached_reads(self):
+        """
+        Ensure saving a catalogue row is visible on the next read.
+        """
+        url = reverse('topic-content', args=[self.topic.id])
+        self.client.get(url)
+
+        self.content.content = {'sections': []}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.content.save()
+
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.content)['data']['content'], {'sections': []})
+
+    def test_change_made_by_another_process_is_seen_within_the_recheck_interval(self):
+        """
+        Ensure a process that did not make a catalogue change picks it up once it rechecks the version.
+        """
+        url = reverse('topic-exercises', args=[self.topic.id])
+        self.client.get(url)
+        # What another process's save does to the rows and the version, without touching this process.
+        Exercise.objects.filter(topic=self.topic).update(question='Pick two')
+        generations.bump(CATALOGUE_GENERATION)
+
+        self.assertEqual(self.client.get(url).data['data']['exercises'][0]['question'], 'Pick one')
+        with self.settings(CATALOGUE_VERSION_RECHECK=0):
+            self.assertEqual(self.client.get(url).data['data']['exercises'][0]['question'], 'Pick two')
+
+    def test_missing_topic_content_is_not_found(self):
+        """
+        Ensure a topic without content is still a 404 when served from the cache.
+        """
+        response = self.client.get(reverse('topic-content', args=[self.topic.id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TopicContentBlobTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='blob@example.com', password='testpassword123', name='Blob')
+        self.client.force_authenticate(self.user)
+        module = Module.objects.create(title='Beginner Basics', order=0)
+        self.topic = Topic.objects.create(module=module, title='Prepositions', order=0)
+        self.content = TopicContent.objects.create(topic=self.topic, content={'title': 'Prepositions', 'sections': []})
+        self.url = reverse('topic-content', args=[self.topic.id])
+
+    def test_body_is_rendered_on_save(self):
+        """
+        Ensure the stored bytes are exactly what the serializer would produce.
+        """
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {
+            'success': True,
+            'data': {'id': self.topic.id, 'title': 'Prepositions', 'content': self.content.content}
+        })
+        self.assertEqual(response['ETag'], f'"{self.content.etag}"')
+
+    def test_if_none_match_returns_not_modified(self):
+        """
+        Ensure a client holding the current ETag gets a 304 without a body.
+        """
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_gzip_variant_is_served_when_accepted(self):
+        """
+        Ensure the precompressed body is served to clients that accept gzip.
+        """
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+
+    def test_topic_rename_rerenders_content(self):
+        """
+        Ensure the embedded topic title follows a rename.
+        """
+        old_etag = self.client.get(self.url)['ETag']
+        self.topic.title = 'Prepositions of Time'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topic.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=old_etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['data']['title'], 'Prepositions of Time')
+
+    def test_unrendered_content_is_served_without_writing(self):
+        """
+        Ensure content stored without save() is rendered for the response but the read does not write it back.
+        """
+        self.content.delete()
+        TopicContent.objects.bulk_create([TopicContent(topic=self.topic, content={'sections': []})])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(json.loads(response.content)['data']['content'], {'sections': []})
+        self.assertFalse([q for q in queries.captured_queries if not q['sql'].lstrip().upper().startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))])
+        self.assertEqual(TopicContent.objects.get(topic=self.topic).etag, '')
+
+    def test_partial_save_of_the_content_rerenders(self):
+        """
+        Ensure save(update_fields=['content']) also writes the new body and ETag.
+        """
+        self.content.content = {'title': 'Prepositions', 'sections': [{'heading': 'AT'}]}
+        self.content.save(update_fields=['content'])
+
+        stored = TopicContent.objects.get(pk=self.content.pk)
+        self.assertEqual(stored.etag, self.content.etag)
+        self.assertEqual(json.loads(bytes(stored.rendered))['data']['content'], self.content.content)
+
+
+class ModuleBundleTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='offline@example.com', password='testpassword123', name='Offline')
+        self.client.force_authenticate(self.user)
+        self.module = Module.objects.create(title='Beginner Basics', order=0)
+        self.topics = [Topic.objects.create(module=self.module, title=f'Topic {i}', order=i) for i in range(2)]
+        TopicContent.objects.create(topic=self.topics[0], content={'sections': []})
+        self.exercise = Exercise.objects.create(topic=self.topics[1], type='multiple_choice', question='Pick one', data={'options': ['a', 'b']}, correct_answer=1)
+        self.url = reverse('module-bundle', args=[self.module.id])
+
+    def test_bundle_contains_every_topic(self):
+        """
+        Ensure one request returns the content and exercises of the whole module.
+        """
+        response = self.client.get(self.url)
+        data = json.loads(response.content)['data']
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['topicIds'], [t.id for t in self.topics])
+        self.assertEqual(data['topics'][0]['content'], {'sections': []})
+        self.assertIsNone(data['topics'][1]['content'])
+        self.assertEqual(data['topics'][1]['exercises'], [
+            {'id': self.exercise.id, 'type': 'multiple_choice', 'question': 'Pick one', 'data': {'options': ['a', 'b']}}
+        ])
+
+    def test_delta_only_contains_changed_topics(self):
+        """
+        Ensure ?since returns only the topics changed after that version.
+        """
+        version = json.loads(self.client.get(self.url).content)['data']['version']
+
+        self.exercise.question = 'Pick the right one'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercise.save()
+
+        data = json.loads(self.client.get(self.url, {'since': version}).content)['data']
+        self.assertGreater(data['version'], version)
+        self.assertEqual([t['id'] for t in data['topics']], [self.topics[1].id])
+        self.assertEqual(data['topics'][0]['exercises'][0]['question'], 'Pick the right one')
+
+        data = json.loads(self.client.get(self.url, {'since': data['version']}).content)['data']
+        self.assertEqual(data['topics'], [])
+
+    def test_since_maps_onto_topic_revisions(self):
+        """
+        Ensure any since value is served from the delta of a topic revision, and a value below them all gets the full bundle.
+        """
+        revisions = sorted(Topic.objects.get(pk=topic.pk).revision for topic in self.topics)
+
+        full = json.loads(self.client.get(self.url, {'since': -1}).content)['data']
+        self.assertIsNone(full['since'])
+        self.assertEqual(len(full['topics']), 2)
+        for since in (revisions[0], revisions[1] - 1):
+            data = json.loads(self.client.get(self.url, {'since': since}).content)['data']
+            self.assertEqual((data['since'], [t['id'] for t in data['topics']]), (revisions[0], [self.topics[1].id]))
+        data = json.loads(self.client.get(self.url, {'since': 2 ** 62}).content)['data']
+        self.assertEqual((data['since'], data['topics']), (revisions[1], []))
+
+    def test_revisions_follow_save_order(self):
+        """
+        Ensure each change takes the next revision of one shared counter, above the old timestamp revisions.
+        """
+        revisions = [Topic.objects.get(pk=topic.pk).revision for topic in self.topics]
+        self.topics[0].save()
+
+        self.assertGreater(Topic.objects.get(pk=self.topics[0].pk).revision, max(revisions))
+        self.assertGreater(min(revisions), 1_700_000_000_000_000)
+
+    def test_unknown_module_is_not_found(self):
+        """
+        Ensure a bundle for a missing module is a 404.
+        """
+        response = self.client.get(reverse('module-bundle', args=[self.module.id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+from .models import ExerciseSubmission
+
+
+class ExerciseGradingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='grader@example.com', password='testpassword123', name='Grader')
+        self.client.force_authenticate(self.user)
+        module = Module.objects.create(title='Elementary Progress', order=0)
+        self.topic = Topic.objects.create(module=module, title='Past Simple', order=0)
+        self.blank = Exercise.objects.create(
+            topic=self.topic, type='fill_in_blank', question='Complete: "I _____ to the store yesterday."',
+            data={'sentence': 'I _____ to the store yesterday.', 'options': ['go', 'went', 'going', 'goes'],
+                  'explanation': '"Went" is the past form of "go".'},
+            correct_answer='went'
+        )
+        self.choice = Exercise.objects.create(
+            topic=self.topic, type='multiple_choice', question='What is the past tense of "eat"?',
+            data={'options': ['eated', 'ate', 'eaten', 'eating']}, correct_answer=1
+        )
+        self.order = Exercise.objects.create(
+            topic=self.topic, type='sentence_construction', question='Arrange these words:',
+            data={'words': ['always', 'coffee', 'drinks', 'morning', 'in', 'the', 'he']},
+            correct_answer=[6, 0, 2, 1, 4, 5, 3]
+        )
+        self.listening = Exercise.objects.create(
+            topic=self.topic, type='listening', question='Listen and type what you hear:',
+            data={'audioUrl': 'https://example.com/audio.mp3'}, correct_answer='The weather is beautiful today.'
+        )
+        self.url = reverse('exercise-submit', args=[self.topic.id])
+
+    def test_submission_is_graded_and_persisted(self):
+        """
+        Ensure each exercise type is graded and the result is stored on the submission.
+        """
+        data = {'answers': [
+            {'exerciseId': self.blank.id, 'answer': ' Went '},
+            {'exerciseId': self.choice.id, 'answer': 1},
+            {'exerciseId': self.order.id, 'answer': [6, 2, 0, 1, 4, 5, 3]},
+            {'exerciseId': self.listening.id, 'answer': 'the weather is  beautiful today'},
+        ]}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['data']
+        self.assertEqual((result['correctCount'], result['totalQuestions'], result['starsEarned']), (3, 4, 2))
+        self.assertEqual([r['isCorrect'] for r in result['results']], [True, True, False, True])
+        self.assertEqual(result['results'][0]['explanation'], '"Went" is the past form of "go".')
+        self.assertEqual(result['results'][2]['correctAnswer'], 'he always drinks coffee in the morning')
+
+        submission = ExerciseSubmission.objects.get(id=result['submissionId'])
+        self.assertEqual(submission.correctCount, 3)
+        self.assertEqual(submission.starsEarned, 2)
+        self.assertEqual(submission.results, result['results'])
+
+    def test_exercises_are_loaded_in_one_query(self):
+        """
+        Ensure grading does not look exercises up per answer.
+        """
+        data = {'answers': [
+            {'exerciseId': self.blank.id, 'answer': 1},
+            {'exerciseId': self.choice.id, 'answer': '1'},
+            {'exerciseId': self.order.id, 'answer': 'He always drinks coffee in the morning.'},
+        ]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, data, format='json')
+        exercise_reads = [q for q in ctx.captured_queries if 'FROM "core_exercise"' in q['sql']]
+        self.assertEqual(len(exercise_reads), 1)
+        self.assertEqual(response.data['data']['correctCount'], 3)
+        self.assertEqual(response.data['data']['starsEarned'], 2)  # the listening exercise was not answered
+
+    def test_unanswered_exercises_count_as_wrong(self):
+        """
+        Ensure one correct answer out of four exercises is graded out of four.
+        """
+        response = self.client.post(self.url, {'answers': [{'exerciseId': self.choice.id, 'answer': 1}]}, format='json')
+
+        result = response.data['data']
+        self.assertEqual((result['correctCount'], result['totalQuestions'], result['starsEarned']), (1, 4, 0))
+
+    def test_duplicate_answers_are_rejected(self):
+        """
+        Ensure repeating a correct answer cannot inflate the grade.
+        """
+        data = {'answers': [{'exerciseId': self.choice.id, 'answer': 1}] * 4}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ExerciseSubmission.objects.exists())
+
+    def test_unknown_exercise_is_rejected(self):
+        """
+        Ensure answers to exercises of another topic are a validation error.
+        """
+        data = {'answers': [{'exerciseId': self.listening.id + 100, 'answer': 'x'}]}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ExerciseSubmission.objects.exists())
+
+
+from django.core.management import call_command
+from .jobs import LEASE, MAX_ATTEMPTS, claim_jobs, enqueue_grading, run_worker
+from .models import Assessment, AssessmentSubmission, GradingJob, Question
+
+
+@override_settings(ASSESSMENT_SNAPSHOT_DIR=None)
+class AssessmentGradingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='placement@example.com', password='testpassword123', name='Placement')
+        self.client.force_authenticate(self.user)
+        self.assessment = Assessment.objects.create(title='Placement test')
+        self.questions = [
+            Question.objects.create(assessment=self.assessment, type='multiple_choice', question='I _____ to school every day.',
+                                    options=['go', 'goes', 'going', 'went'], category='grammar', correct_answer=0),
+            Question.objects.create(assessment=self.assessment, type='multiple_choice', question='Past tense of "eat"?',
+                                    options=['eated', 'ate', 'eaten', 'eating'], category='grammar', correct_answer=1),
+            Question.objects.create(assessment=self.assessment, type='multiple_choice', question='A place to sleep:',
+                                    options=['kitchen', 'bedroom'], category='vocabulary', correct_answer=1),
+        ]
+
+    def submit(self, answers):
+        data = {'assessmentId': str(self.assessment.id), 'answers': [
+            {'questionId': q.id, 'answer': a} for q, a in zip(self.questions, answers)
+        ]}
+        response = self.client.post(reverse('assessment-submit'), data, format='json')
+        return response.data['data']['submissionId']
+
+    def test_submission_is_queued_and_graded_by_a_worker(self):
+        """
+        Ensure a submission stays processing until a worker grades it.
+        """
+        submission_id = self.submit([0, 1, 0])
+        result_url = reverse('assessment-result', args=[submission_id])
+        self.assertEqual(self.client.get(result_url).status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(GradingJob.objects.get(submission_id=submission_id).status, 'queued')
+
+        self.assertEqual(run_worker(batch_size=10, once=True), 1)
+
+        response = self.client.get(result_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['correctCount'], 2)
+        self.assertEqual(response.data['data']['totalQuestions'], 3)
+        self.assertEqual(response.data['data']['level'], 'C1')
+        self.assertIn('vocabulary', response.data['data']['aiAnalysis'])
+        self.assertEqual(GradingJob.objects.get(submission_id=submission_id).status, 'done')
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.currentLevel, 'C1')
+
+    def test_claimed_jobs_are_not_claimed_twice(self):
+        """
+        Ensure concurrent workers never receive the same job.
+        """
+        for _ in range(3):
+            self.submit([0, 0, 0])
+
+        first = claim_jobs('worker-a', 2)
+        second = claim_jobs('worker-b', 2)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({j.id for j in first} & {j.id for j in second})
+
+    def test_answer_key_follows_question_edits(self):
+        """
+        Ensure graders pick up a changed correct answer.
+        """
+        self.submit([0, 1, 1])
+        run_worker(once=True)
+
+        self.questions[2].correct_answer = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[2].save()
+        submission_id = self.submit([0, 1, 0])
+        call_command('run_grading_workers', once=True, stdout=StringIO())
+
+        self.assertEqual(AssessmentSubmission.objects.get(id=submission_id).correctCount, 3)
+
+    def test_repeated_answers_count_once(self):
+        """
+        Ensure repeating a correct answer is rejected at submit and cannot raise the level at grading.
+        """
+        answer = {'questionId': self.questions[0].id, 'answer': 0}
+        data = {'assessmentId': str(self.assessment.id), 'answers': [answer] * 3}
+        self.assertEqual(self.client.post(reverse('assessment-submit'), data, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+        submission = AssessmentSubmission.objects.create(user=self.user, assessment=self.assessment, answers=[answer] * 6, totalQuestions=3)
+        enqueue_grading(submission)
+        run_worker(once=True)
+
+        submission.refresh_from_db()
+        self.assertEqual((submission.correctCount, submission.level), (1, 'B1'))
+
+    def test_job_abandoned_on_its_last_attempt_fails(self):
+        """
+        Ensure a job whose worker died on the last attempt fails instead of staying processing forever.
+        """
+        submission_id = self.submit([0, 1, 0])
+        GradingJob.objects.update(status='running', attempts=MAX_ATTEMPTS, lockedAt=timezone.now() - LEASE * 2)
+
+        self.assertEqual(run_worker(once=True), 0)
+
+        self.assertEqual(GradingJob.objects.get().status, 'failed')
+        response = self.client.get(reverse('assessment-result', args=[submission_id]))
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(response.data['status'], 'failed')
+
+
+import asyncio
+import time
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.tokens import AccessToken
+from .notify import assessment_key, notifier
+
+
+class AssessmentResultWaitTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='waiting@example.com', password='testpassword123', name='Waiting')
+        assessment = Assessment.objects.create(title='Placement test')
+        self.submission = AssessmentSubmission.objects.create(user=self.user, assessment=assessment, answers=[], totalQuestions=2)
+        self.url = reverse('assessment-result-wait', args=[self.submission.id])
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def complete_later(self, delay):
+        await asyncio.sleep(delay)
+        await AssessmentSubmission.objects.filter(id=self.submission.id).aupdate(status='complete', level='A2', correctCount=1)
+        await sync_to_async(notifier.notify)(assessment_key(self.submission.id))
+
+    async def test_long_poll_returns_when_grading_completes(self):
+        """
+        Ensure the request is held until the notifier fires and then returns the result.
+        """
+        task = asyncio.create_task(self.complete_later(0.2))
+        response = await self.async_client.get(self.url, {'timeout': 10}, headers=self.auth)
+        await task
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = json.loads(response.content)
+        self.assertEqual(body['status'], 'complete')
+        self.assertEqual(body['data']['level'], 'A2')
+
+    async def test_long_poll_times_out_as_processing(self):
+        """
+        Ensure a submission that is still being graded answers 202 after the timeout.
+        """
+        response = await self.async_client.get(self.url, {'timeout': 0.1}, headers=self.auth)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(json.loads(response.content)['status'], 'processing')
+
+    async def test_event_stream_delivers_the_result(self):
+        """
+        Ensure SSE clients receive the result as a single event.
+        """
+        task = asyncio.create_task(self.complete_later(0.2))
+        response = await self.async_client.get(self.url, {'timeout': 10}, headers={'Accept': 'text/event-stream', **self.auth})
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        await task
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(b'event: result\n', content)
+        self.assertIn(b'"level":"A2"', content)
+
+    async def test_long_poll_is_woken_by_another_process(self):
+        """
+        Ensure a notification left in the shared cache by a grading worker ends the wait.
+        """
+        async def grade_elsewhere():
+            await asyncio.sleep(0.2)
+            await AssessmentSubmission.objects.filter(id=self.submission.id).aupdate(status='complete', level='B1', correctCount=2)
+            # Another process cannot resolve this one's waiters; only its cache marker arrives.
+            await notifier.store.aset(notifier._cache_key(assessment_key(self.submission.id)), True)
+
+        task = asyncio.create_task(grade_elsewhere())
+        started = time.monotonic()
+        response = await self.async_client.get(self.url, {'timeout': 10}, headers=self.auth)
+        await task
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['data']['level'], 'B1')
+        self.assertLess(time.monotonic() - started, 5)
+
+    async def test_long_poll_reads_the_submission_once_more_at_its_timeout(self):
+        """
+        Ensure a result graded without any notification is returned when the wait times out, not reported as processing.
+        """
+        async def grade_silently():
+            await asyncio.sleep(0.1)
+            await AssessmentSubmission.objects.filter(id=self.submission.id).aupdate(status='complete', level='B1', correctCount=2)
+
+        task = asyncio.create_task(grade_silently())
+        response = await self.async_client.get(self.url, {'timeout': 0.5}, headers=self.auth)
+        await task
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['data']['level'], 'B1')
+
+    async def test_timeout_must_be_finite_and_bounded(self):
+        """
+        Ensure nan, infinite and out-of-range timeouts are rejected.
+        """
+        for timeout in ('nan', 'inf', '-1', '61', 'soon'):
+            response = await self.async_client.get(self.url, {'timeout': timeout}, headers=self.auth)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, timeout)
+
+    async def test_requires_authentication(self):
+        """
+        Ensure the long-poll endpoint rejects anonymous requests.
+        """
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+import tempfile
+from .assessments import get_snapshot
+
+
+class AssessmentSnapshotTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        settings_override = override_settings(ASSESSMENT_SNAPSHOT_DIR=snapshot_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(email='onboarding@example.com', password='testpassword123', name='Onboarding')
+        self.client.force_authenticate(self.user)
+        self.assessment = Assessment.objects.create(title='Placement test')
+        self.question = Question.objects.create(assessment=self.assessment, type='multiple_choice', question='I _____ to school.',
+                                                options=['go', 'goes'], category='grammar', correct_answer=0)
+        self.url = reverse('assessment')
+
+    def test_snapshot_matches_serializer_and_hides_answers(self):
+        """
+        Ensure the snapshot renders exactly what AssessmentSerializer would, without answers.
+        """
+        response = self.client.get(self.url)
+
+        self.assertEqual(json.loads(response.content), {'success': True, 'data': {
+            'assessmentId': str(self.assessment.id),
+            'questions': [{'id': self.question.id, 'type': 'multiple_choice', 'question': 'I _____ to school.',
+                           'options': ['go', 'goes'], 'category': 'grammar'}]
+        }})
+        self.assertNotIn(b'correct_answer', response.content)
+
+    def test_warm_snapshot_is_served_without_queries(self):
+        """
+        Ensure onboarding users are served from the cache or disk with zero queries.
+        """
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_question_change_publishes_a_new_version(self):
+        """
+        Ensure editing a question invalidates the snapshot and the answer key.
+        """
+        before = get_snapshot()
+        self.question.correct_answer = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.save()
+
+        after = get_snapshot()
+        self.assertNotEqual(before.version, after.version)
+        self.assertEqual(after.answer_key[0][4], 1)
+        self.assertEqual(before.body, after.body)
+
+    def test_change_made_by_another_process_is_seen_within_the_recheck_interval(self):
+        """
+        Ensure a process whose cache was not told about a change stops serving the old snapshot once it rechecks.
+        """
+        before = get_snapshot()
+        self.question.correct_answer = 1
+        self.question.save()  # its commit hooks never run here, as if another process had saved it
+
+        self.assertEqual(get_snapshot().version, before.version)
+        with self.settings(ASSESSMENT_SNAPSHOT_RECHECK=0):
+            after = get_snapshot()
+        self.assertNotEqual(after.version, before.version)
+        self.assertEqual(after.answer_key[0][4], 1)
+
+
+from .adaptive import MAX_ITEMS, calibrate
+from .models import PlacementSession
+
+
+@override_settings(ASSESSMENT_SNAPSHOT_DIR=None)
+class AdaptivePlacementTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='adaptive@example.com', password='testpassword123', name='Adaptive')
+        self.client.force_authenticate(self.user)
+        self.assessment = Assessment.objects.create(title='Placement test')
+        self.questions = [
+            Question.objects.create(
+                assessment=self.assessment, type='multiple_choice', question=f'Question {i}', options=['a', 'b'],
+                category=('grammar', 'vocabulary')[i % 2], correct_answer=0, difficulty=-3 + i * 0.2, discrimination=1.5
+            )
+            for i in range(30)
+        ]
+
+    def run_session(self, answer_for):
+        response = self.client.post(reverse('adaptive-start'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.data['data']
+        asked = []
+        while data['status'] == 'active':
+            asked.append(data['question'])
+            url = reverse('adaptive-answer', args=[data['sessionId']])
+            question_id = data['question']['id']
+            response = self.client.post(url, {'questionId': question_id, 'answer': answer_for(question_id)}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.data['data']
+        return data, asked
+
+    def test_strong_learner_is_placed_high_with_fewer_questions(self):
+        """
+        Ensure the test stops early, balances categories and stores the level.
+        """
+        data, asked = self.run_session(lambda question_id: 0)
+
+        self.assertLessEqual(len(asked), MAX_ITEMS)
+        self.assertLess(len(asked), len(self.questions))
+        self.assertIn(data['level'], ('B2', 'C1', 'C2'))
+        categories = [q['category'] for q in asked]
+        self.assertLessEqual(abs(categories.count('grammar') - categories.count('vocabulary')), 1)
+        self.assertNotIn('correct_answer', asked[0])
+
+        submission = AssessmentSubmission.objects.get(id=data['submissionId'])
+        self.assertEqual((submission.status, submission.level), ('complete', data['level']))
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.currentLevel, data['level'])
+
+    def test_weak_learner_is_placed_low(self):
+        """
+        Ensure a learner answering everything wrong lands in the lowest levels.
+        """
+        data, asked = self.run_session(lambda question_id: 1)
+        self.assertIn(data['level'], ('A1', 'A2'))
+
+    def test_question_cannot_be_answered_twice(self):
+        """
+        Ensure repeated answers to the same question are rejected.
+        """
+        data = self.client.post(reverse('adaptive-start'), {}, format='json').data['data']
+        url = reverse('adaptive-answer', args=[data['sessionId']])
+        payload = {'questionId': data['question']['id'], 'answer': 0}
+        self.client.post(url, payload, format='json')
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(PlacementSession.objects.get(id=data['sessionId']).responses), 1)
+
+    def test_only_the_served_question_can_be_answered(self):
+        """
+        Ensure an answer to a bank question the session did not ask is rejected.
+        """
+        data = self.client.post(reverse('adaptive-start'), {}, format='json').data['data']
+        other = next(q for q in self.questions if q.id != data['question']['id'])
+
+        response = self.client.post(reverse('adaptive-answer', args=[data['sessionId']]), {'questionId': other.id, 'answer': 0}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(PlacementSession.objects.get(id=data['sessionId']).responses, [])
+
+    def test_session_keeps_its_snapshot_when_the_test_changes(self):
+        """
+        Ensure a session continues on the snapshot it started with, and gets 409 once that snapshot is gone.
+        """
+        data = self.client.post(reverse('adaptive-start'), {}, format='json').data['data']
+        url = reverse('adaptive-answer', args=[data['sessionId']])
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.filter(id=data['question']['id']).delete()
+
+        response = self.client.post(url, {'questionId': data['question']['id'], 'answer': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        PlacementSession.objects.filter(id=data['sessionId']).update(snapshot='0' * 32)
+        response = self.client.post(url, {'questionId': response.data['data']['question']['id'], 'answer': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_calibration_orders_difficulty_from_history(self):
+        """
+        Ensure recalibration estimates harder items as more difficult.
+        """
+        easy, hard = self.questions[0], self.questions[1]
+        for i in range(40):
+            skilled = i % 2 == 0
+            answers = [{'questionId': easy.id, 'answer': 0 if (skilled or i % 4 == 1) else 1},
+                       {'questionId': hard.id, 'answer': 0 if (skilled and i % 4 == 0) else 1}]
+            answers += [{'questionId': q.id, 'answer': 0 if skilled else 1} for q in self.questions[2:6]]
+            AssessmentSubmission.objects.create(user=self.user, assessment=self.assessment, answers=answers, status='complete')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            updated = calibrate(min_responses=20)
+
+        self.assertEqual(updated, 6)
+        easy.refresh_from_db()
+        hard.refresh_from_db()
+        self.assertGreater(hard.difficulty, easy.difficulty)
+
+
+from .aggregates import rebuild
+from .models import UserProgressAggregate
+
+
+@override_settings(ASSESSMENT_SNAPSHOT_DIR=None)
+class UserProgressAggregateTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='progress@example.com', password='testpassword123', name='Progress')
+        self.client.force_authenticate(self.user)
+        module = Module.objects.create(title='Elementary Progress', order=0)
+        self.topic = Topic.objects.create(module=module, title='Articles (a, an, the)', order=0)
+        self.exercises = [
+            Exercise.objects.create(topic=self.topic, type='multiple_choice', question=f'Q{i}', data={'options': ['a', 'an']}, correct_answer=0)
+            for i in range(4)
+        ]
+        self.url = reverse('user-progress')
+
+    def submit(self, answers):
+        data = {'answers': [{'exerciseId': e.id, 'answer': a} for e, a in zip(self.exercises, answers)]}
+        self.client.post(reverse('exercise-submit', args=[self.topic.id]), data, format='json')
+
+    def test_progress_is_maintained_incrementally(self):
+        """
+        Ensure graded submissions are folded into the aggregate and read back with the activity bitset.
+        """
+        self.submit([0, 0, 1, 1])
+        self.submit([0, 0, 0, 1])
+        self.client.get(self.url)  # warm the curriculum cache
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        data = response.data['data']
+        self.assertEqual(data['overview']['completedTopics'], 1)
+        self.assertEqual(data['statistics']['avgScore'], 62)
+        self.assertEqual(data['statistics']['dayStreak'], 1)
+        self.assertIn({'skill': 'Vocabulary', 'progress': 62}, data['skillProgress'])
+        self.assertEqual(sum(day['active'] for day in data['weeklyActivity']), 1)
+        self.assertEqual(data['areasForImprovement'], [{
+            'topicId': self.topic.id, 'topicTitle': 'Articles (a, an, the)', 'accuracy': 62, 'recommendation': 'Needs practice'
+        }])
+
+    def test_new_user_has_empty_progress(self):
+        """
+        Ensure a user without history gets zeroed progress rather than made-up numbers.
+        """
+        data = self.client.get(self.url).data['data']
+
+        self.assertEqual(data['overview']['completedTopics'], 0)
+        self.assertEqual(data['statistics']['avgScore'], 0)
+        self.assertEqual(data['areasForImprovement'], [])
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        """
+        Ensure rebuilding from history reproduces the incrementally maintained row.
+        """
+        self.submit([0, 1, 1, 1])
+        self.submit([0, 0, 0, 0])
+        expected = UserProgressAggregate.objects.get(user=self.user)
+        UserProgressAggregate.objects.all().delete()
+
+        call_command('rebuild_progress_aggregates', chunk_size=1, stdout=StringIO())
+
+        rebuilt = UserProgressAggregate.objects.get(user=self.user)
+        fields = ('completedTopics', 'answersCorrect', 'answersTotal', 'categoryStats', 'topicStats', 'studySeconds', 'wordsLearned')
+        self.assertEqual([getattr(rebuilt, f) for f in fields], [getattr(expected, f) for f in fields])
+
+
+from datetime import timedelta
+from django.utils import timezone
+from .events import emit, event_buffer, flush_events
+from .models import DailyActivity, LearningEvent
+
+
+@override_settings(ASSESSMENT_SNAPSHOT_DIR=None)
+class LearningEventTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        event_buffer.clear()
+        self.user = User.objects.create_user(email='events@example.com', password='testpassword123', name='Events')
+        self.client.force_authenticate(self.user)
+        self.module = Module.objects.create(title='Elementary Events', order=0)
+        self.topic = Topic.objects.create(module=self.module, title='Vocabulary: Food', order=0)
+        TopicContent.objects.create(topic=self.topic, content={'introduction': 'Food words'})
+        self.exercises = [
+            Exercise.objects.create(topic=self.topic, type='multiple_choice', question=f'Q{i}', data={'options': ['a', 'b']}, correct_answer=0)
+            for i in range(2)
+        ]
+
+    def open_and_submit(self):
+        self.client.get(reverse('topic-content', args=[self.topic.id]))
+        data = {'answers': [{'exerciseId': self.exercises[0].id, 'answer': 0}, {'exerciseId': self.exercises[1].id, 'answer': 1}]}
+        self.client.post(reverse('exercise-submit', args=[self.topic.id]), data, format='json')
+
+    def test_events_are_buffered_until_flushed(self):
+        """
+        Ensure request handlers only append to the buffer and a flush writes it in one INSERT.
+        """
+        self.open_and_submit()
+
+        self.assertEqual(LearningEvent.objects.count(), 0)
+        self.assertEqual(len(event_buffer), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_events(), 2)
+        self.assertEqual(
+            list(LearningEvent.objects.order_by('id').values_list('kind', 'topic_id')),
+            [('topic_opened', self.topic.id), ('exercise_submitted', self.topic.id)]
+        )
+
+    @override_settings(LEARNING_EVENT_BUFFER_SIZE=3)
+    def test_full_buffer_is_flushed(self):
+        """
+        Ensure reaching the size threshold writes the buffered events.
+        """
+        self.open_and_submit()
+        self.client.get(reverse('topic-content', args=[self.topic.id]))
+
+        self.assertEqual(LearningEvent.objects.count(), 3)
+        self.assertEqual(len(event_buffer), 0)
+
+    def test_rollup_fills_study_time_and_words(self):
+        """
+        Ensure the daily rollup summarises a day of events and feeds the progress statistics.
+        """
+        self.open_and_submit()
+        flush_events()
+        today = timezone.localdate()
+        noon = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.min.time())) + timedelta(hours=12)
+        LearningEvent.objects.filter(kind='topic_opened').update(createdAt=noon)
+        LearningEvent.objects.filter(kind='exercise_submitted').update(createdAt=noon + timedelta(minutes=20))
+
+        call_command('rollup_learning_events', date=today.isoformat(), stdout=StringIO())
+        call_command('rollup_learning_events', date=today.isoformat(), stdout=StringIO())
+
+        activity = DailyActivity.objects.get(user=self.user, day=today)
+        self.assertEqual((activity.events, activity.topicsOpened, activity.exercisesSubmitted), (2, 1, 1))
+        self.assertEqual(activity.wordsLearned, 1)
+        self.assertEqual(activity.studySeconds, 21 * 60)
+
+        statistics = self.client.get(reverse('user-progress')).data['data']['statistics']
+        self.assertEqual(statistics['wordsLearned'], 1)
+        self.assertEqual(statistics['studyTimeHours'], 0.3)
+
+    def test_words_learned_count_each_word_once(self):
+        """
+        Ensure a word learned again on another day, or an event written twice, does not add to the total.
+        """
+        self.open_and_submit()
+        flush_events()
+        today = timezone.localdate()
+        LearningEvent.objects.update(createdAt=timezone.now() - timedelta(days=1))
+        self.open_and_submit()
+        flush_events()
+        event = LearningEvent.objects.filter(kind='exercise_submitted').last()
+        event.pk = None
+        event.save()
+
+        for day in (today - timedelta(days=1), today):
+            call_command('rollup_learning_events', date=day.isoformat(), stdout=StringIO())
+
+        self.assertEqual(sum(DailyActivity.objects.filter(user=self.user).values_list('wordsLearned', flat=True)), 2)
+        self.assertEqual(self.client.get(reverse('user-progress')).data['data']['statistics']['wordsLearned'], 1)
+        call_command('rebuild_progress_aggregates', stdout=StringIO())
+        self.assertEqual(self.client.get(reverse('user-progress')).data['data']['statistics']['wordsLearned'], 1)
+
+    def test_events_of_deleted_rows_do_not_drop_the_batch(self):
+        """
+        Ensure a batch that fails on a deleted user, topic or module is written without those references.
+        """
+        self.open_and_submit()
+        gone = User.objects.create_user(email='gone@example.com', password='testpassword123', name='Gone')
+        emit(gone.pk, 'topic_opened', topic_id=self.topic.id)
+        emit(self.user.pk, 'module_unlocked', module_id=self.module.id)
+        gone.delete()
+        self.topic.delete()
+
+        # Foreign keys are only checked when the test transaction ends, so fail the first insert as a commit would.
+        write = LearningEvent.objects.bulk_create
+        attempts = []
+
+        def bulk_create(events, **kwargs):
+            attempts.append(len(events))
+            if len(attempts) == 1:
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return write(events, **kwargs)
+
+        with patch.object(LearningEvent.objects, 'bulk_create', bulk_create), self.assertLogs('core.events', 'WARNING'):
+            self.assertEqual(flush_events(), 3)
+
+        self.assertEqual(attempts, [4, 3])
+        self.assertEqual(
+            list(LearningEvent.objects.order_by('id').values_list('user_id', 'kind', 'topic_id', 'module_id')),
+            [
+                (self.user.pk, 'topic_opened', None, None),
+                (self.user.pk, 'exercise_submitted', None, self.module.id),
+                (self.user.pk, 'module_unlocked', None, self.module.id),
+            ]
+        )
+
+
+from datetime import date
+from .activity import BLOCK_DAYS, ActivitySet, current_streaks, load_activity, record_activity, replace_activity
+from .models import ActivityBlock
+
+
+class ActivityBitsetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        self.users = [
+            User.objects.create_user(email=f'streak{i}@example.com', password='testpassword123', name=f'Streak {i}')
+            for i in range(4)
+        ]
+        self.client.force_authenticate(self.users[0])
+
+    def days_back(self, count, skip=0):
+        return {self.today - timedelta(days=skip + i) for i in range(count)}
+
+    def test_marking_a_day_is_one_update(self):
+        """
+        Ensure recording activity on an existing block is a single bitwise UPDATE.
+        """
+        user = self.users[0]
+        record_activity(user.pk, self.today - timedelta(days=1))
+
+        with self.assertNumQueries(1):
+            record_activity(user.pk, self.today)
+
+        activity = load_activity(user.pk)
+        self.assertTrue(activity.is_active(self.today))
+        self.assertFalse(activity.is_active(self.today - timedelta(days=2)))
+
+    def test_streak_spans_blocks(self):
+        """
+        Ensure streaks longer than a block, and streaks that end yesterday, are counted in full.
+        """
+        replace_activity({self.users[0].pk: self.days_back(150) | {self.today - timedelta(days=160)}})
+        long_streak = load_activity(self.users[0].pk)
+
+        self.assertGreater(len(ActivityBlock.objects.filter(user=self.users[0])), 2)
+        self.assertEqual(long_streak.streak(self.today), 150)
+        self.assertEqual(ActivitySet().streak(self.today), 0)
+        replace_activity({self.users[1].pk: self.days_back(BLOCK_DAYS, skip=1)})
+        self.assertEqual(load_activity(self.users[1].pk).streak(self.today), BLOCK_DAYS)
+
+    def test_batch_streaks_match_per_user_streaks(self):
+        """
+        Ensure the all-users batch path agrees with the per-user bit operations.
+        """
+        histories = {
+            self.users[0].pk: self.days_back(130),
+            self.users[1].pk: self.days_back(3, skip=1),
+            self.users[2].pk: self.days_back(10, skip=2),
+            self.users[3].pk: self.days_back(64),
+        }
+        replace_activity(histories)
+
+        streaks = current_streaks(self.today)
+
+        self.assertEqual(streaks, {self.users[0].pk: 130, self.users[1].pk: 3, self.users[3].pk: 64})
+        for user_id, streak in streaks.items():
+            self.assertEqual(load_activity(user_id).streak(self.today), streak)
+
+    def test_streak_leaderboard(self):
+        """
+        Ensure the streak leaderboard ranks live streaks, longest first.
+        """
+        replace_activity({
+            self.users[0].pk: self.days_back(5),
+            self.users[1].pk: self.days_back(70),
+            self.users[2].pk: self.days_back(10, skip=3),
+        })
+
+        response = self.client.get(reverse('leaderboard-streaks'), {'limit': 5})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(entry['rank'], entry['name'], entry['dayStreak']) for entry in response.data['data']],
+            [(1, 'Streak 1', 70), (2, 'Streak 0', 5)]
+        )
+
+    def test_monthly_heatmap(self):
+        """
+        Ensure the activity endpoint returns one entry per day of the requested month.
+        """
+        replace_activity({self.users[0].pk: {date(2024, 2, 1), date(2024, 2, 29), date(2024, 3, 1)}})
+
+        response = self.client.get(reverse('user-activity'), {'month': '2024-02'})
+
+        data = response.data['data']
+        self.assertEqual(len(data['days']), 29)
+        self.assertEqual(data['activeDays'], 2)
+        self.assertEqual([day['date'] for day in data['days'] if day['active']], [date(2024, 2, 1), date(2024, 2, 29)])
+        self.assertEqual(self.client.get(reverse('user-activity'), {'month': 'soon'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+import random
+from .leaderboard import GLOBAL, LOCK_TTL, RankingIndex, get_member, get_store as leaderboard_store, record_level
+from .models import UserProfile
+
+
+class StarsLeaderboardTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(email=f'stars{i}@example.com', password='testpassword123', name=f'Stars {i}')
+            for i in range(3)
+        ]
+        module = Module.objects.create(title='Leaderboard Module', order=0)
+        self.topics = [Topic.objects.create(module=module, title=f'Topic {i}', order=i) for i in range(2)]
+        self.exercises = {
+            topic.id: [
+                Exercise.objects.create(topic=topic, type='multiple_choice', question=f'Q{i}', data={'options': ['a', 'b']}, correct_answer=0)
+                for i in range(2)
+            ]
+            for topic in self.topics
+        }
+
+    def submit(self, user, topic, correct):
+        self.client.force_authenticate(user)
+        answers = [{'exerciseId': e.id, 'answer': 0 if i < correct else 1} for i, e in enumerate(self.exercises[topic.id])]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('exercise-submit', args=[topic.id]), {'answers': answers}, format='json')
+
+    @override_settings(LEADERBOARD_TOP_SIZE=5, LEADERBOARD_MAX_STARS=512)
+    def test_ranking_index_matches_sorting(self):
+        """
+        Ensure ranks and the top prefix agree with a full sort through arbitrary moves.
+        """
+        rng = random.Random(7)
+        index, totals = RankingIndex(GLOBAL), {}
+        generation = index.publish([])
+        for _ in range(500):
+            user_id = f'user{rng.randrange(40)}'
+            new = rng.choice([0, rng.randrange(1, 300)])
+            index.move(user_id, totals.get(user_id, 0), new)
+            totals[user_id] = new
+
+            ordered = sorted((-stars, user_id) for user_id, stars in totals.items() if stars)
+            entries, complete = index.top(generation)
+            if complete or len(entries) >= 3:
+                self.assertEqual(entries[:3], ordered[:3])
+            probes = (0, 1, 150, 299, 400)
+            self.assertEqual(index.ranks(generation, probes), [1 + sum(1 for s, _ in ordered if -s > stars) for stars in probes])
+
+    def test_star_gains_update_every_board(self):
+        """
+        Ensure best-star improvements move users on the global, weekly and level boards.
+        """
+        self.submit(self.users[0], self.topics[0], 2)
+        self.submit(self.users[1], self.topics[0], 2)
+        self.submit(self.users[1], self.topics[1], 1)
+        self.submit(self.users[1], self.topics[1], 1)  # no improvement, no stars
+
+        self.assertEqual(UserProfile.objects.get(user=self.users[1]).totalStars, 4)
+        self.client.force_authenticate(self.users[2])
+        response = self.client.get(reverse('leaderboard-stars'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        self.assertEqual([(e['rank'], e['name'], e['stars']) for e in data['entries']], [(1, 'Stars 1', 4), (2, 'Stars 0', 3)])
+        self.assertEqual(data['me'], {'rank': 3, 'stars': 0})
+        weekly = self.client.get(reverse('leaderboard-stars-weekly')).data['data']
+        self.assertEqual([e['stars'] for e in weekly['entries']], [4, 3])
+        level = self.client.get(reverse('leaderboard-stars-level', args=['a1'])).data['data']
+        self.assertEqual(len(level['entries']), 2)
+        self.assertEqual(self.client.get(reverse('leaderboard-stars-level', args=['C2'])).data['data']['entries'], [])
+
+    def test_level_change_moves_user_between_boards(self):
+        """
+        Ensure a placement result moves a user from their old level board to the new one.
+        """
+        self.submit(self.users[0], self.topics[0], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserProfile.objects.filter(user=self.users[0]).update(currentLevel='B1')
+            record_level([self.users[0].pk], 'B1')
+
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get(reverse('leaderboard-stars-level', args=['A1'])).data['data']['entries'], [])
+        b1 = self.client.get(reverse('leaderboard-stars-level', args=['B1'])).data['data']
+        self.assertEqual(b1['me'], {'rank': 1, 'stars': 3})
+
+    def test_reconcile_repairs_drift(self):
+        """
+        Ensure the reconcile command rebuilds boards and cached members from the database.
+        """
+        self.submit(self.users[0], self.topics[0], 2)
+        UserProfile.objects.filter(user=self.users[0]).update(totalStars=10)
+        UserProfile.objects.filter(user=self.users[2]).update(totalStars=5)
+
+        out = StringIO()
+        call_command('reconcile_leaderboards', stdout=out)
+
+        self.assertIn('repaired 1 drifted users', out.getvalue())
+        self.assertEqual(get_member(self.users[0].pk)['stars'], 10)
+        self.client.force_authenticate(self.users[1])
+        data = self.client.get(reverse('leaderboard-stars')).data['data']
+        self.assertEqual([(e['name'], e['stars']) for e in data['entries']], [('Stars 0', 10), ('Stars 2', 5)])
+        self.assertEqual(data['me'], {'rank': 3, 'stars': 0})
+
+    def test_unknown_level_is_not_found(self):
+        """
+        Ensure only CEFR levels have a level board.
+        """
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get(reverse('leaderboard-stars-level', args=['Z9']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_writer_that_cannot_lock_drops_the_top_list(self):
+        """
+        Ensure a star gain made while another writer holds a board's lock still counts and shows up.
+        """
+        self.submit(self.users[0], self.topics[0], 2)
+        self.client.force_authenticate(self.users[1])
+        self.client.get(reverse('leaderboard-stars'))
+
+        index = RankingIndex(GLOBAL)
+        leaderboard_store().add(index._lock_key(), True, timeout=LOCK_TTL)
+        with patch('core.leaderboard.LOCK_WAIT', 0):
+            self.submit(self.users[1], self.topics[0], 1)
+        self.assertIsNone(index.top(index.generation()))
+        leaderboard_store().delete(index._lock_key())
+
+        data = self.client.get(reverse('leaderboard-stars')).data['data']
+        self.assertEqual([(e['name'], e['stars']) for e in data['entries']], [('Stars 0', 3), ('Stars 1', 1)])
+        self.assertEqual(data['me'], {'rank': 2, 'stars': 1})
+
+    def test_evicted_tree_is_rebuilt(self):
+        """
+        Ensure a board whose tree was evicted from the cache is rebuilt instead of ranking against missing counts.
+        """
+        self.submit(self.users[0], self.topics[0], 2)
+        self.client.force_authenticate(self.users[1])
+        self.client.get(reverse('leaderboard-stars'))
+
+        index = RankingIndex(GLOBAL)
+        leaderboard_store().delete(index._node_key(index.generation(), index.size))
+        self.submit(self.users[1], self.topics[0], 1)
+
+        data = self.client.get(reverse('leaderboard-stars')).data['data']
+        self.assertEqual([(e['name'], e['stars']) for e in data['entries']], [('Stars 0', 3), ('Stars 1', 1)])
+        self.assertEqual(data['me'], {'rank': 2, 'stars': 1})
+
+
+from .counters import reconcile as reconcile_counters, record_topic_stars, set_module_statuses
+
+
+class ProfileCounterTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='counters@example.com', password='testpassword123', name='Counters')
+        self.modules = [Module.objects.create(title=f'Counter Module {i}', order=i) for i in range(3)]
+        self.topics = [Topic.objects.create(module=self.modules[0], title=f'Counter Topic {i}', order=i) for i in range(2)]
+        UserModuleProgress.objects.bulk_create([UserModuleProgress(user=self.user, module=module) for module in self.modules])
+
+    def profile(self):
+        return UserProfile.objects.get(user=self.user)
+
+    def set_status(self, modules, status):
+        return set_module_statuses({(self.user.pk, module.id): status for module in modules})[self.user.pk]
+
+    def test_only_best_star_improvements_are_counted(self):
+        """
+        Ensure totalStars follows the sum of best stars per topic, whatever the submission order.
+        """
+        self.assertEqual(record_topic_stars(self.user.pk, self.topics[0].id, 2), 2)
+        self.assertEqual(record_topic_stars(self.user.pk, self.topics[0].id, 1), 0)
+        self.assertEqual(record_topic_stars(self.user.pk, self.topics[0].id, 3), 1)
+        record_topic_stars(self.user.pk, self.topics[1].id, 1)
+
+        self.assertEqual(self.profile().totalStars, 4)
+        self.assertEqual(UserTopicProgress.objects.get(user=self.user, topic=self.topics[0]).stars, 3)
+
+    def test_module_completions_are_counted_once(self):
+        """
+        Ensure completedModules only moves for rows whose status actually changed.
+        """
+        self.assertEqual(self.set_status(self.modules[:2], 'completed'), 2)
+        self.assertEqual(self.set_status(self.modules[1:], 'completed'), 1)
+        self.assertEqual(self.set_status(self.modules[2:], 'active'), -1)
+
+        self.assertEqual(self.profile().completedModules, 2)
+        self.assertEqual(UserModuleProgress.objects.get(user=self.user, module=self.modules[2]).status, 'active')
+
+    def test_reconcile_fixes_drift_in_bulk(self):
+        """
+        Ensure the reconcile command recomputes drifted counters and leaves correct ones alone.
+        """
+        other = User.objects.create_user(email='counters2@example.com', password='testpassword123', name='Counters 2')
+        record_topic_stars(self.user.pk, self.topics[0].id, 3)
+        self.set_status(self.modules[:1], 'completed')
+        UserProfile.objects.filter(user=self.user).update(totalStars=7, completedModules=0)
+
+        self.assertEqual(len(reconcile_counters(dry_run=True)), 1)
+        self.assertEqual(self.profile().totalStars, 7)
+        out = StringIO()
+        call_command('reconcile_counters', chunk_size=1, stdout=out)
+
+        self.assertIn('Fixed 1 drifted profiles', out.getvalue())
+        self.assertEqual((self.profile().totalStars, self.profile().completedModules), (3, 1))
+        self.assertEqual(UserProfile.objects.get(user=other).totalStars, 0)
+
+
+from .progression import complete_topic, evaluate, reevaluate
+
+
+class ProgressionTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(email=f'path{i}@example.com', password='testpassword123', name=f'Path {i}')
+            for i in range(3)
+        ]
+        self.module = Module.objects.create(title='Path Module', order=0)
+        self.topics = [Topic.objects.create(module=self.module, title=f'Path Topic {i}', order=i) for i in range(3)]
+        UserModuleProgress.objects.bulk_create([UserModuleProgress(user=user, module=self.module, status='active') for user in self.users])
+        evaluate([user.pk for user in self.users], [self.module.id])
+
+    def statuses(self, user):
+        rows = dict(UserTopicProgress.objects.filter(user=user).values_list('topic_id', 'status'))
+        return [rows.get(topic.id, 'locked') for topic in self.topics]
+
+    def module_status(self, user):
+        return UserModuleProgress.objects.get(user=user, module=self.module).status
+
+    def test_completing_a_topic_unlocks_the_next(self):
+        """
+        Ensure a completion cascades to the next topic with a bounded number of statements.
+        """
+        self.assertEqual(self.statuses(self.users[0]), ['active', 'locked', 'locked'])
+
+        with self.assertNumQueries(9):
+            self.assertTrue(complete_topic(self.users[0].pk, self.topics[0].id, self.module.id))
+
+        self.assertEqual(self.statuses(self.users[0]), ['completed', 'active', 'locked'])
+        self.assertFalse(complete_topic(self.users[0].pk, self.topics[0].id, self.module.id))
+        self.assertEqual(self.module_status(self.users[0]), 'active')
+
+    def test_last_topic_completes_the_module(self):
+        """
+        Ensure completing every topic completes the module and counts it on the profile once.
+        """
+        for topic in self.topics:
+            complete_topic(self.users[0].pk, topic.id, self.module.id)
+        evaluate([self.users[0].pk], [self.module.id])
+
+        self.assertEqual(self.module_status(self.users[0]), 'completed')
+        self.assertEqual(UserProfile.objects.get(user=self.users[0]).completedModules, 1)
+
+    def test_reordering_reevaluates_everyone(self):
+        """
+        Ensure re-evaluation after a reorder follows the new topic order for every user.
+        """
+        complete_topic(self.users[0].pk, self.topics[0].id, self.module.id)
+        complete_topic(self.users[1].pk, self.topics[0].id, self.module.id)
+        complete_topic(self.users[1].pk, self.topics[1].id, self.module.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Topic.objects.filter(id=self.topics[2].id).update(order=1)
+            Topic.objects.filter(id=self.topics[1].id).update(order=2)
+            Topic.objects.get(id=self.topics[2].id).save()  # invalidate the catalogue, as an admin edit would
+
+        out = StringIO()
+        call_command('reevaluate_progress', chunk_size=2, stdout=out)
+
+        self.assertIn('for 3 users', out.getvalue())
+        self.assertEqual(self.statuses(self.users[0]), ['completed', 'locked', 'active'])
+        self.assertEqual(self.statuses(self.users[1]), ['completed', 'completed', 'active'])
+        self.assertEqual(self.statuses(self.users[2]), ['active', 'locked', 'locked'])
+
+    def test_passing_submission_advances_progress(self):
+        """
+        Ensure a passing exercise submission completes its topic through the API.
+        """
+        exercise = Exercise.objects.create(topic=self.topics[0], type='multiple_choice', question='Q', data={'options': ['a', 'b']}, correct_answer=0)
+        self.client.force_authenticate(self.users[2])
+
+        self.client.post(reverse('exercise-submit', args=[self.topics[0].id]), {'answers': [{'exerciseId': exercise.id, 'answer': 0}]}, format='json')
+
+        self.assertEqual(self.statuses(self.users[2]), ['completed', 'active', 'locked'])
+
+    def test_locked_module_refuses_submissions(self):
+        """
+        Ensure exercises of a module the user has not unlocked earn no stars and complete nothing.
+        """
+        locked = Module.objects.create(title='Locked Module', order=1)
+        topic = Topic.objects.create(module=locked, title='Locked Topic', order=0)
+        exercise = Exercise.objects.create(topic=topic, type='multiple_choice', question='Q', data={'options': ['a', 'b']}, correct_answer=0)
+        self.client.force_authenticate(self.users[0])
+
+        response = self.client.post(reverse('exercise-submit', args=[topic.id]), {'answers': [{'exerciseId': exercise.id, 'answer': 0}]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['error']['code'], 'MODULE_LOCKED')
+        self.assertFalse(ExerciseSubmission.objects.filter(user=self.users[0], topic=topic).exists())
+        self.assertFalse(UserTopicProgress.objects.filter(user=self.users[0], topic=topic).exists())
+
+
+class UserCreationTests(APITestCase):
+
+    def test_signup_creates_the_profile_with_the_user(self):
+        """
+        Ensure registration writes the user and profile once each, in one transaction.
+        """
+        data = {'name': 'Signup', 'email': 'signup@example.com', 'password': 'newpassword123'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('register'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        writes = [q['sql'].split()[0] for q in queries.captured_queries if q['sql'].split()[0] in ('INSERT', 'UPDATE')]
+        self.assertEqual(writes, ['INSERT', 'INSERT'])
+        self.assertTrue(UserProfile.objects.filter(user__email='signup@example.com').exists())
+
+    def test_users_created_without_the_manager_get_a_profile(self):
+        """
+        Ensure a user saved directly, as the admin form does, has a profile and a working progress page.
+        """
+        user = User.objects.create(email='admin-made@example.com', name='Admin Made')
+        self.client.force_authenticate(user)
+
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+        self.assertEqual(self.client.get(reverse('user-progress')).status_code, status.HTTP_200_OK)
+
+    def test_bulk_creation_uses_two_inserts(self):
+        """
+        Ensure create_users_bulk inserts every user and profile with one statement each.
+        """
+        users = [User(email=f'Bulk{i}@EXAMPLE.com', name=f'Bulk {i}') for i in range(20)]
+        for user in users:
+            user.set_unusable_password()
+
+        with self.assertNumQueries(4):  # two inserts inside a savepoint
+            User.objects.create_users_bulk(users)
+
+        self.assertEqual(UserProfile.objects.filter(user__email__endswith='@example.com', user__name__startswith='Bulk').count(), 20)
+
+    def test_renaming_writes_only_the_user(self):
+        """
+        Ensure updating the name through the profile endpoint does not rewrite the profile.
+        """
+        user = User.objects.create_user(email='rename@example.com', password='testpassword123', name='Before')
+        self.client.force_authenticate(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(reverse('user-profile'), {'name': 'After'}, format='json')
+
+        self.assertEqual(response.data['data']['name'], 'After')
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"core_user"', updates[0])
+
+
+import os
+from django.contrib.auth.hashers import check_password
+from . import imports
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.module = Module.objects.create(title='Onboarding Module', order=0)
+        self.topic = Topic.objects.create(module=self.module, title='Onboarding Topic', order=0)
+        User.objects.create_user(email='existing@school.example', password='testpassword123', name='Existing')
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write('email,name,password\n')
+            f.write('existing@school.example,Existing,whatever\n')
+            for i in range(5):
+                f.write(f'student{i}@school.example,Student {i},secret{i}\n')
+            f.write('not-an-email,Broken,x\n')
+            f.write('student0@school.example,Student 0 again,x\n')
+            f.write('nopassword@school.example,No Password,\n')
+        self.addCleanup(os.remove, self.path)
+
+    def test_import_creates_users_in_chunks_and_resumes(self):
+        """
+        Ensure the import hashes passwords, skips existing and invalid rows, and can be re-run.
+        """
+        out, err = StringIO(), StringIO()
+        call_command('import_users', self.path, chunk_size=3, workers=2, seed_first_module=True, stdout=out, stderr=err)
+
+        self.assertIn('Imported 6 users; skipped 2 existing and 1 invalid rows.', out.getvalue())
+        self.assertIn('Line 8: invalid email', err.getvalue())
+        student = User.objects.get(email='student3@school.example')
+        self.assertTrue(check_password('secret3', student.password))
+        self.assertFalse(User.objects.get(email='nopassword@school.example').has_usable_password())
+        self.assertTrue(UserProfile.objects.filter(user=student).exists())
+        self.assertEqual(UserModuleProgress.objects.get(user=student).status, 'active')
+        self.assertEqual(UserTopicProgress.objects.get(user=student).status, 'active')
+
+        out = StringIO()
+        call_command('import_users', self.path, workers=0, stdout=out, stderr=StringIO())
+        self.assertIn('Imported 0 users; skipped 7 existing', out.getvalue())
+
+    def test_signup_during_the_import_skips_only_that_email(self):
+        """
+        Ensure an email that signs up after the existing check is reported as existing and the rest of its chunk is imported.
+        """
+        hash_password = imports.hash_password
+
+        def hash_while_someone_signs_up(password):
+            if not User.objects.filter(email='student1@school.example').exists():
+                User.objects.create_user(email='student1@school.example', password='signup123', name='Signed Up')
+            return hash_password(password)
+
+        out = StringIO()
+        with patch('core.imports.hash_password', hash_while_someone_signs_up):
+            call_command('import_users', self.path, chunk_size=3, workers=0, stdout=out, stderr=StringIO())
+
+        self.assertIn('Imported 5 users; skipped 3 existing and 1 invalid rows.', out.getvalue())
+        self.assertEqual(User.objects.get(email='student1@school.example').name, 'Signed Up')
+        self.assertTrue(UserProfile.objects.filter(user__email='student2@school.example').exists())
+
+
+from unittest import mock
+from django.contrib.auth.hashers import identify_hasher
+from .passwords import ConfiguredPBKDF2PasswordHasher, authenticate_password
+
+
+class LoginFastPathTests(APITestCase):
+
+    def setUp(self):
+        with self.settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.user = User.objects.create_user(email='fast@example.com', password='testpassword123', name='Fast')
+
+    def iterations(self):
+        self.user.refresh_from_db()
+        return identify_hasher(self.user.password).decode(self.user.password)['iterations']
+
+    def test_hash_is_upgraded_when_the_policy_changes(self):
+        """
+        Ensure a successful login rehashes with the configured work factor, and a failed one does not.
+        """
+        self.assertEqual(self.iterations(), 1000)
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertIsNone(authenticate_password(self.user, 'wrong'))
+            self.assertEqual(self.iterations(), 1000)
+            response = self.client.post(reverse('login'), {'email': 'fast@example.com', 'password': 'testpassword123'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.iterations(), 2000)
+        self.assertTrue(self.user.check_password('testpassword123'))
+
+    def test_unknown_email_runs_the_hasher(self):
+        """
+        Ensure an unknown email costs one password hash, exactly like a wrong password.
+        """
+        encode = ConfiguredPBKDF2PasswordHasher.encode
+        with self.settings(PASSWORD_HASH_ITERATIONS=1000), mock.patch.object(ConfiguredPBKDF2PasswordHasher, 'encode', autospec=True, side_effect=encode) as hashed:
+            self.assertIsNone(authenticate_password(None, 'testpassword123'))
+            self.assertEqual(hashed.call_count, 1)
+            self.assertIsNone(authenticate_password(self.user, 'wrong'))
+            self.assertEqual(hashed.call_count, 2)
+
+    async def test_async_login_matches_login_view(self):
+        """
+        Ensure the ASGI login view authenticates through the pool and answers like LoginView.
+        """
+        url = reverse('login-async')
+        response = await self.async_client.post(url, {'email': 'fast@example.com', 'password': 'testpassword123'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['data']['user']['email'], 'fast@example.com')
+        response = await self.async_client.post(url, {'email': 'fast@example.com', 'password': 'wrong'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(json.loads(response.content)['success'])
+
+    async def test_async_login_needs_no_csrf_token(self):
+        """
+        Ensure a real client without a CSRF cookie can log in through the ASGI view.
+        """
+        client = AsyncClient(enforce_csrf_checks=True)
+        response = await client.post(reverse('login-async'), {'email': 'fast@example.com', 'password': 'testpassword123'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from .authentication import PrincipalJWTAuthentication, mark_changed, principals
+
+
+class PrincipalAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        principals.clear()
+        self.user = User.objects.create_user(email='principal@example.com', password='testpassword123', name='Principal')
+        module = Module.objects.create(title='Principal Module', order=0)
+        Topic.objects.create(module=module, title='Principal Topic', order=0)
+        response = self.client.post(reverse('login'), {'email': 'principal@example.com', 'password': 'testpassword123'}, format='json')
+        self.access = response.data['data']['accessToken']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        principals.clear()
+
+    def test_module_list_needs_no_auth_queries(self):
+        """
+        Ensure GET /modules authenticates from the token claims alone.
+        """
+        self.client.get(reverse('module-list'))  # warm the catalogue and seeding caches
+
+        with self.assertNumQueries(2):  # module progress and topic progress
+            response = self.client.get(reverse('module-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['data']), 1)
+
+    def test_saving_the_user_stops_trusting_old_claims(self):
+        """
+        Ensure a deactivated user is rejected even though their token still says active.
+        """
+        self.assertEqual(self.client.get(reverse('module-list')).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(reverse('module-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_change_made_by_another_process_stops_trusting_old_claims(self):
+        """
+        Ensure a deactivation committed elsewhere is honoured here through the shared change marker.
+        """
+        self.assertEqual(self.client.get(reverse('module-list')).status_code, status.HTTP_200_OK)
+
+        # Another process saves the user: this process's principal cache is not told.
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        mark_changed(str(self.user.pk))
+
+        self.assertEqual(self.client.get(reverse('module-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(ASSESSMENT_SNAPSHOT_DIR=None)
+    def test_placement_result_stops_trusting_the_level_claim(self):
+        """
+        Ensure a level set by grading replaces the level claimed by a token issued before it.
+        """
+        def authenticate():
+            request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+            return PrincipalJWTAuthentication().authenticate(Request(request))[0]
+        self.assertEqual(authenticate().profile.currentLevel, 'A1')
+
+        assessment = Assessment.objects.create(title='Principal placement')
+        question = Question.objects.create(assessment=assessment, type='multiple_choice', question='Q?', options=['a', 'b'], category='grammar', correct_answer=0)
+        submission = AssessmentSubmission.objects.create(user=self.user, assessment=assessment, answers=[{'questionId': question.id, 'answer': 0}], totalQuestions=1)
+        enqueue_grading(submission)
+        with self.captureOnCommitCallbacks(execute=True):
+            run_worker(once=True)
+
+        submission.refresh_from_db()
+        self.assertNotEqual(submission.level, 'A1')
+        self.assertEqual(authenticate().profile.currentLevel, submission.level)
+
+    def test_deleted_user_with_a_valid_token_does_not_crash_seeding(self):
+        """
+        Ensure a user deleted without the change reaching this process gets an empty list rather than a 500.
+        """
+        User.objects.filter(pk=self.user.pk).delete()
+        principals.clear()  # as in a process that did not delete the user
+
+        response = self.client.get(reverse('module-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [])
+
+    def test_claims_can_be_turned_off(self):
+        """
+        Ensure JWT_TRUST_CLAIMS=False loads the user like the default authentication.
+        """
+        self.client.get(reverse('module-list'))
+
+        with self.settings(JWT_TRUST_CLAIMS=False), self.assertNumQueries(3):
+            self.client.get(reverse('module-list'))
+
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from unittest.mock import patch
+from django.core.cache.backends.locmem import LocMemCache
+from .revocation import RevokedTokens, revoked
+
+
+class RevokedTokenTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        revoked.reset()
+        User.objects.create_user(email='revoke@example.com', password='testpassword123', name='Revoke')
+        response = self.client.post(reverse('login'), {'email': 'revoke@example.com', 'password': 'testpassword123'}, format='json')
+        self.refresh = response.data['data']['refreshToken']
+
+    def refresh_token(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('token_refresh'), {'refresh': token}, format='json')
+
+    def test_rotated_token_is_rejected_and_fresh_one_needs_no_blacklist_query(self):
+        """
+        Ensure a rotated refresh token is refused, while checking an unrevoked one skips the blacklist table.
+        """
+        rotated = self.refresh_token(self.refresh).data['refresh']
+        self.assertEqual(self.refresh_token(self.refresh).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.refresh_token(rotated)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        blacklist_lookups = [q['sql'] for q in queries if 'INNER JOIN "token_blacklist_outstandingtoken"' in q['sql']]
+        self.assertEqual(blacklist_lookups, [])
+
+    def test_revocations_reach_other_processes(self):
+        """
+        Ensure a filter built before a revocation elsewhere picks it up through the cache version.
+        """
+        other = RevokedTokens()
+        self.assertFalse(other.may_contain('not-revoked'))
+
+        self.refresh_token(self.refresh)
+        jti = BlacklistedToken.objects.get().token.jti
+
+        self.assertTrue(other.may_contain(jti))
+
+    def test_replay_is_rejected_by_a_process_with_a_stale_filter(self):
+        """
+        Ensure a token rotated in one process cannot be replayed in another whose cache never heard of it.
+        """
+        first = RevokedTokens(store=LocMemCache('worker-a', {}))
+        second = RevokedTokens(store=LocMemCache('worker-b', {}))
+        second.may_contain('warm-up')  # built before the revocation
+
+        with patch('core.authentication.revoked', first):
+            self.assertEqual(self.refresh_token(self.refresh).status_code, status.HTTP_200_OK)
+        with patch('core.authentication.revoked', second):
+            self.assertFalse(second.may_contain(BlacklistedToken.objects.get().token.jti))
+            replay = self.refresh_token(self.refresh)
+
+        self.assertEqual(replay.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(OutstandingToken.objects.count(), 2)  # the login token and its one rotation
+
+    def test_stale_filters_resync_from_the_database(self):
+        """
+        Ensure a filter with a separate cache picks up revocations after the sync interval.
+        """
+        first = RevokedTokens(store=LocMemCache('worker-a', {}))
+        second = RevokedTokens(store=LocMemCache('worker-b', {}))
+        second.may_contain('warm-up')
+        with patch('core.authentication.revoked', first):
+            self.refresh_token(self.refresh)
+        jti = BlacklistedToken.objects.get().token.jti
+
+        self.assertFalse(second.may_contain(jti))
+        with self.settings(TOKEN_REVOCATION_SYNC_INTERVAL=0):
+            self.assertTrue(second.may_contain(jti))
+
+    def test_prune_tokens_deletes_only_expired_tokens(self):
+        """
+        Ensure manage.py prune_tokens removes expired outstanding and blacklisted rows in batches.
+        """
+        self.refresh_token(self.refresh)
+        OutstandingToken.objects.filter(blacklistedtoken__isnull=False).update(expires_at=timezone.now() - timedelta(days=1))
+        out = StringIO()
+
+        call_command('prune_tokens', '--batch-size', '1', stdout=out)
+
+        self.assertIn("Pruned 1 expired tokens.", out.getvalue())
+        self.assertEqual(BlacklistedToken.objects.count(), 0)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+
+
+from django.conf import settings
+from .checks import SHARED_CACHES, check_shared_caches
+from .throttling import consume
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login': '2/min', 'exercise_submit': '2/min'}})
+class ThrottlingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='throttle@example.com', password='testpassword123', name='Throttle')
+        self.credentials = {'email': 'throttle@example.com', 'password': 'wrongpassword'}
+
+    def test_login_is_rejected_before_checking_the_password(self):
+        """
+        Ensure the third login in a minute gets 429 without a password hash or query.
+        """
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('login'), self.credentials, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('login'), self.credentials, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(response.data['success'])
+        self.assertIn('Retry-After', response)
+
+    def test_buckets_are_per_user_and_endpoint(self):
+        """
+        Ensure one user's exhausted submit budget leaves other users and endpoints alone.
+        """
+        module = Module.objects.create(title='Throttle Module', order=0)
+        topic = Topic.objects.create(module=module, title='Throttle Topic', order=0)
+        other = User.objects.create_user(email='other@example.com', password='testpassword123', name='Other')
+        url = reverse('exercise-submit', kwargs={'topicId': topic.id})
+        self.client.force_authenticate(user=self.user)
+        for _ in range(2):
+            self.client.post(url, {'answers': []}, format='json')
+
+        self.assertEqual(self.client.post(url, {'answers': []}, format='json').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertNotEqual(self.client.post(reverse('login'), self.credentials, format='json').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.client.force_authenticate(user=other)
+        self.assertNotEqual(self.client.post(url, {'answers': []}, format='json').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        """
+        Ensure the deploy checks report every cache that must be shared but is kept per process.
+        """
+        self.assertEqual([w.id for w in check_shared_caches(None)], ['core.W001', 'core.W002', 'core.W003', 'core.W004', 'core.E001'])
+
+        shared = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'shared_cache'}
+        with self.settings(CACHES={**settings.CACHES, 'shared': shared}, **dict.fromkeys(SHARED_CACHES, 'shared')):
+            self.assertEqual(check_shared_caches(None), [])
+
+    def test_bucket_refills_over_the_period(self):
+        """
+        Ensure spent tokens come back gradually rather than all at a window boundary.
+        """
+        start = 600.0  # the start of a period
+        self.assertIsNone(consume('login', 'ip:test', now=start))
+        self.assertIsNone(consume('login', 'ip:test', now=start + 1))
+        self.assertIsNotNone(consume('login', 'ip:test', now=start + 2))
+        # Just into the next period the spent tokens still count almost fully...
+        self.assertIsNotNone(consume('login', 'ip:test', now=start + 65))
+        # ...and half-way through it one of them has come back.
+        self.assertIsNone(consume('login', 'ip:test', now=start + 90))
+        self.assertIsNotNone(consume('login', 'ip:test', now=start + 91))
+
+
+from types import SimpleNamespace
+from .idempotency import PENDING, _cache_key, _fingerprint, get_store
+
+
+class IdempotencyKeyTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='retry@example.com', password='testpassword123', name='Retry')
+        self.client.force_authenticate(self.user)
+        module = Module.objects.create(title='Retry Module', order=0)
+        topic = Topic.objects.create(module=module, title='Retry Topic', order=0)
+        self.exercise = Exercise.objects.create(
+            topic=topic, type='multiple_choice', question='Pick one', data={'options': ['a', 'b']}, correct_answer=1
+        )
+        self.url = reverse('exercise-submit', args=[topic.id])
+        self.data = {'answers': [{'exerciseId': self.exercise.id, 'answer': 1}]}
+
+    def submit(self, data, key='retry-1'):
+        return self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        """
+        Ensure a retry returns the first response byte for byte without a query or a second submission.
+        """
+        first = self.submit(self.data)
+
+        with self.assertNumQueries(0):
+            retry = self.submit(self.data)
+
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(ExerciseSubmission.objects.count(), 1)
+        self.submit(self.data, key='retry-2')
+        self.assertEqual(ExerciseSubmission.objects.count(), 2)
+
+    def test_key_is_bound_to_the_body_and_released_on_failure(self):
+        """
+        Ensure a failed request can be retried with its key, but a key cannot be reused for another body.
+        """
+        invalid = {'answers': [{'exerciseId': self.exercise.id + 100, 'answer': 1}]}
+        self.assertEqual(self.submit(invalid).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.submit(self.data).status_code, status.HTTP_200_OK)
+
+        response = self.submit({'answers': [{'exerciseId': self.exercise.id, 'answer': 0}]})
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(response.data['success'])
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_concurrent_duplicate_does_not_run_twice(self):
+        """
+        Ensure a retry that arrives while the first request is running gets 409 rather than a second submission.
+        """
+        first = SimpleNamespace(user=self.user, path=self.url, data=self.data)
+        get_store().add(_cache_key(first, 'retry-1'), (PENDING, _fingerprint(first)), timeout=60)
+
+        response = self.submit(self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(ExerciseSubmission.objects.exists())
+
+
+from .models import Payment
+from .payments import StubPaymentVerifier
+
+
+class ModuleUnlockTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='testpassword123', name='Buyer')
+        self.client.force_authenticate(self.user)
+        self.module = Module.objects.create(title='Paid Module', order=0)
+        self.topic = Topic.objects.create(module=self.module, title='Paid Topic', order=0)
+        self.url = reverse('unlock-module', args=[self.module.id])
+
+    def test_unlock_is_recorded_once_and_retries_succeed(self):
+        """
+        Ensure an unlock activates the module, records the token, and a retry with it succeeds without a new charge.
+        """
+        response = self.client.post(self.url, {'paymentToken': 'tok-1'}, format='json')
+        retry = self.client.post(self.url, {'paymentToken': 'tok-1'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, response.data)
+        self.assertEqual(UserModuleProgress.objects.get(user=self.user, module=self.module).status, 'active')
+        self.assertEqual(UserTopicProgress.objects.get(user=self.user, topic=self.topic).status, 'active')
+        payment = Payment.objects.get()
+        self.assertEqual((payment.token, payment.user_id, payment.unlocked, payment.reference), ('tok-1', self.user.id, 1, 'stub:tok-1'))
+
+    def test_second_payment_and_foreign_token_are_refused(self):
+        """
+        Ensure a new token for an unlocked module records nothing, and a token cannot be spent twice.
+        """
+        self.client.post(self.url, {'paymentToken': 'tok-1'}, format='json')
+
+        response = self.client.post(self.url, {'paymentToken': 'tok-2'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error']['code'], 'MODULE_ALREADY_UNLOCKED')
+        self.assertFalse(Payment.objects.filter(token='tok-2').exists())
+
+        self.client.force_authenticate(User.objects.create_user(email='other-buyer@example.com', password='testpassword123', name='Other'))
+        response = self.client.post(self.url, {'paymentToken': 'tok-1'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['error']['code'], 'PAYMENT_TOKEN_USED')
+
+    def test_declined_payment_and_unknown_module(self):
+        """
+        Ensure a rejected token leaves the module locked and unknown modules are 404.
+        """
+        response = self.client.post(self.url, {'paymentToken': 'declined-card'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_402_PAYMENT_REQUIRED)
+        self.assertFalse(UserModuleProgress.objects.filter(status='active').exists())
+        self.assertFalse(Payment.objects.exists())
+
+        response = self.client.post(reverse('unlock-module', args=[self.module.id + 100]), {'paymentToken': 'tok-3'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_unlock_for_an_institutional_licence(self):
+        """
+        Ensure one licence token unlocks every module for every listed user, skipping modules already unlocked.
+        """
+        second = Module.objects.create(title='Second Paid Module', order=1)
+        student = User.objects.create_user(email='student@example.com', password='testpassword123', name='Student')
+        UserModuleProgress.objects.create(user=student, module=self.module, status='active')
+        data = {'paymentToken': 'licence-1', 'emails': ['buyer@example.com', 'student@example.com', 'missing@example.com'],
+                'moduleIds': [self.module.id, second.id]}
+
+        self.assertEqual(self.client.post(reverse('bulk-unlock-modules'), data, format='json').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='testpassword123', name='Admin'))
+        response = self.client.post(reverse('bulk-unlock-modules'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], {'unlocked': 3, 'unknownEmails': ['missing@example.com']})
+        self.assertEqual(UserModuleProgress.objects.filter(status='active').count(), 4)
+        self.assertEqual(Payment.objects.get(token='licence-1').unlocked, 3)
+
+        retry = self.client.post(reverse('bulk-unlock-modules'), data, format='json')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, response.data)
+        other = dict(data, moduleIds=[second.id])
+        self.assertEqual(self.client.post(reverse('bulk-unlock-modules'), other, format='json').status_code, status.HTTP_409_CONFLICT)
+
+    def test_unlocked_module_is_refused_before_charging(self):
+        """
+        Ensure the verifier is not called for a module that is already unlocked.
+        """
+        UserModuleProgress.objects.create(user=self.user, module=self.module, status='active')
+
+        with mock.patch.object(StubPaymentVerifier, 'verify') as verify:
+            response = self.client.post(self.url, {'paymentToken': 'tok-1'}, format='json')
+
+        self.assertEqual(response.data['error']['code'], 'MODULE_ALREADY_UNLOCKED')
+        verify.assert_not_called()
+
+    def test_charge_lost_to_a_concurrent_unlock_stays_on_the_ledger(self):
+        """
+        Ensure a token charged while another request unlocked the module is recorded with nothing unlocked.
+        """
+        def unlock_meanwhile(token, units):
+            UserModuleProgress.objects.create(user=self.user, module=self.module, status='active')
+            return f'stub:{token}'
+
+        with mock.patch.object(StubPaymentVerifier, 'verify', side_effect=unlock_meanwhile):
+            response = self.client.post(self.url, {'paymentToken': 'tok-1'}, format='json')
+
+        self.assertEqual(response.data['error']['code'], 'MODULE_ALREADY_UNLOCKED')
+        payment = Payment.objects.get()
+        self.assertEqual((payment.token, payment.reference, payment.unlocked), ('tok-1', 'stub:tok-1', 0))
+
+
+from .assessments import publish_snapshot
+from .bundles import get_module_bundle
+from .catalogue import get_topic_exercises
+from .progress import load_topic_progress
+from .rendering import render_envelope
+from .rowserializers import RowSerializer
+from .serializers import (
+    AssessmentSerializer, ExerciseSerializer, TopicExerciseSerializer, TopicProgressSerializer, exercise_rows
+)
+
+
+class RowSerializerTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='rows@example.com', password='testpassword123', name='Rows')
+        self.first = Module.objects.create(title='Первый модуль', order=1)
+        self.second = Module.objects.create(title='Second "quoted" module', order=0)
+        self.topic = Topic.objects.create(module=self.first, title='Topic ü', order=0)
+        Topic.objects.create(module=self.first, title='Topic without progress', order=1)
+        UserModuleProgress.objects.create(user=self.user, module=self.first, status='active', finalScore=None)
+        UserModuleProgress.objects.create(user=self.user, module=self.second, status='completed', finalScore=87)
+        UserTopicProgress.objects.create(user=self.user, topic=self.topic, status='completed', stars=3)
+        for data in ({'options': ['a', 'b'], 'nested': {'x': [1, 2.5, None]}}, {}, {'sentence': 'naïve ✓'}):
+            Exercise.objects.create(topic=self.topic, type='multiple_choice', question='Q?', data=data, correct_answer=1)
+        self.assessment = Assessment.objects.create(title='Placement')
+        Question.objects.create(assessment=self.assessment, type='single', question='Which?', options=['x', 'y'], category='grammar', correct_answer=0)
+        Question.objects.create(assessment=self.assessment, type='open', question='Why?', options=[], category='reading', correct_answer='because')
+
+    def test_module_list_matches_module_progress_serializer(self):
+        """
+        Ensure GET /modules renders byte for byte what ModuleProgressSerializer renders.
+        """
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('module-list'))
+
+        progress = UserModuleProgress.objects.filter(user=self.user).select_related('module').order_by('module__order', 'module_id')
+        expected = ModuleProgressSerializer(progress, many=True, context={
+            'topics_by_module': load_topic_progress(self.user.pk, [p.module_id for p in progress])
+        }).data
+        self.assertEqual(response.content, render_envelope(expected))
+
+    def test_topic_progress_matches_topic_progress_serializer(self):
+        """
+        Ensure module topic entries equal TopicProgressSerializer's output.
+        """
+        topics = load_topic_progress(self.user.pk, [self.first.id])[self.first.id]
+
+        self.assertEqual(topics[0], TopicProgressSerializer(UserTopicProgress.objects.get(topic=self.topic)).data)
+
+    def test_exercises_match_exercise_serializer(self):
+        """
+        Ensure topic exercise lists and bundles equal ExerciseSerializer's output.
+        """
+        topic = Topic.objects.prefetch_related('exercises').get(id=self.topic.id)
+        self.assertEqual(render_envelope(get_topic_exercises(self.topic.id)), render_envelope(TopicExerciseSerializer(topic).data))
+
+        bundle_exercises = get_module_bundle(self.first.id)['topics'][0]['exercises']
+        self.assertEqual(bundle_exercises, ExerciseSerializer(Exercise.objects.order_by('id'), many=True).data)
+
+    def test_assessment_snapshot_matches_assessment_serializer(self):
+        """
+        Ensure the assessment snapshot equals AssessmentSerializer's rendering, questions included.
+        """
+        snapshot = publish_snapshot(self.assessment)
+
+        assessment = Assessment.objects.prefetch_related('questions').get(pk=self.assessment.pk)
+        self.assertEqual(snapshot.body, render_envelope(AssessmentSerializer(assessment).data))
+
+    def test_fields_that_need_an_object_are_refused(self):
+        """
+        Ensure method fields cannot be compiled and sources become ORM lookups.
+        """
+        with self.assertRaises(ValueError):
+            RowSerializer(ModuleProgressSerializer)
+        self.assertEqual(exercise_rows.lookups, ('id', 'type', 'question', 'data'))
@@ -0,0 +1,105 @@
+"""
+Token-bucket throttling for the expensive write endpoints.
+
+Views opt in with a ``throttle_scope``. The scope's budget comes from
+``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`` in DRF's ``"<n>/<period>"`` form
+and means a bucket of ``n`` tokens that refills at ``n`` per period. There is
+one bucket per scope and client: the user when the request is authenticated,
+otherwise the IP address. Views without a configured rate are not throttled.
+
+A bucket is kept as two counters in the cache named by THROTTLE_CACHE, one
+for the current period and one for the previous period. The tokens in use are
+the current count plus the previous count, weighted by the share of the
+previous period still inside the last ``period`` seconds. That gives the
+bucket's burst and refill rate while every write is a single ``incr``, which
+is atomic on locmem, memcached and redis caches, so no lock is needed. On a
+file-based cache ``incr`` is a read followed by a write, and concurrent
+requests can lose increments.
+
+The budget holds across processes only when THROTTLE_CACHE is shared by
+them. With locmem, or a DummyCache (whose counters are kept per process),
+N workers allow N times the configured rate; ``manage.py check --deploy``
+warns about that (see core/checks.py).
+
+Throttles run in ``APIView.initial``, before the handler parses the body or
+touches the database. A rejection costs one ``get_many`` and writes nothing.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+_fallback = LocMemCache('throttle', {'OPTIONS': {'MAX_ENTRIES': 100_000}})
+
+
+def get_store():
+    store = caches[settings.THROTTLE_CACHE]
+    return _fallback if isinstance(store, DummyCache) else store
+
+
+def parse_rate(rate):
+    """``"10/min"`` -> ``(10, 60)``: bucket capacity and the seconds it takes to refill."""
+    capacity, period = rate.split('/')
+    return int(capacity), PERIODS[period[0]]
+
+
+def consume(scope, ident, now=None):
+    """
+    Take a token from ``ident``'s bucket for ``scope``. Returns None when the
+    request may proceed, else the seconds until a token is available.
+    """
+    rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+    if rate is None:
+        return None
+    capacity, period = parse_rate(rate)
+    now = time.time() if now is None else now
+    window, into = divmod(now, period)
+    key = f'throttle:{scope}:{ident}'
+    current_key, previous_key = f'{key}:{int(window)}', f'{key}:{int(window) - 1}'
+    carried = 1 - into / period
+
+    store = get_store()
+    counts = store.get_many([previous_key, current_key])
+    previous = counts.get(previous_key, 0)
+    if previous * carried + counts.get(current_key, 0) + 1 > capacity:
+        return _wait(capacity, period, previous, counts.get(current_key, 0), into)
+
+    store.add(current_key, 0, timeout=2 * period)
+    current = store.incr(current_key)
+    if previous * carried + current > capacity:
+        return _wait(capacity, period, previous, current - 1, into)
+    return None
+
+
+def _wait(capacity, period, previous, current, into):
+    remaining = period - into
+    if current + 1 > capacity or not previous:
+        return remaining
+    # The previous period's share drains at previous/period tokens per second.
+    in_use = previous * remaining / period + current
+    return min((in_use + 1 - capacity) * period / previous, remaining)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttles views that set ``throttle_scope`` with the bucket described above."""
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{super().get_ident(request)}'
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        self.delay = consume(scope, self.get_ident(request))
+        return self.delay is None
+
+    def wait(self):
+        return self.delay
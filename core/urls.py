@@ -1,10 +1,12 @@
 from django.urls import path
 from .views import (
-    RegisterView, LoginView, LogoutView,
-    UserProfileView, UserProgressView,
-    ModuleListView, TopicContentView,
-    AssessmentView, AssessmentSubmitView, AssessmentResultView,
-    TopicExerciseView, ExerciseSubmitView, UnlockModuleView
+    RegisterView, LoginView, login_async, LogoutView,
+    UserProfileView, UserProgressView, UserActivityView,
+    ModuleListView, ModuleBundleView, TopicContentView,
+    AssessmentView, AssessmentSubmitView, AssessmentResultView, assessment_result_wait,
+    AdaptiveAssessmentStartView, AdaptiveAssessmentAnswerView,
+    TopicExerciseView, ExerciseSubmitView, StarsLeaderboardView, StreakLeaderboardView,
+    UnlockModuleView, BulkUnlockModulesView
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
@@ -13,26 +15,39 @@ urlpatterns = [
     # Authentication
     path('auth/register', RegisterView.as_view(), name='register'),
     path('auth/login', LoginView.as_view(), name='login'),
+    path('auth/login/async', login_async, name='login-async'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/logout', LogoutView.as_view(), name='logout'),
 
     # User
     path('user/profile', UserProfileView.as_view(), name='user-profile'),
     path('user/progress', UserProgressView.as_view(), name='user-progress'),
+    path('user/activity', UserActivityView.as_view(), name='user-activity'),
 
     # Learning Path
     path('modules', ModuleListView.as_view(), name='module-list'),
+    path('modules/<int:moduleId>/bundle', ModuleBundleView.as_view(), name='module-bundle'),
     path('topics/<int:topicId>/content', TopicContentView.as_view(), name='topic-content'),
 
     # Assessment
     path('assessment', AssessmentView.as_view(), name='assessment'),
     path('assessment/submit', AssessmentSubmitView.as_view(), name='assessment-submit'),
+    path('assessment/adaptive/start', AdaptiveAssessmentStartView.as_view(), name='adaptive-start'),
+    path('assessment/adaptive/<uuid:sessionId>/answer', AdaptiveAssessmentAnswerView.as_view(), name='adaptive-answer'),
     path('assessment/result/<uuid:submissionId>', AssessmentResultView.as_view(), name='assessment-result'),
+    path('assessment/result/<uuid:submissionId>/wait', assessment_result_wait, name='assessment-result-wait'),
 
     # Exercise
     path('topics/<int:topicId>/exercises', TopicExerciseView.as_view(), name='topic-exercises'),
     path('topics/<int:topicId>/exercises/submit', ExerciseSubmitView.as_view(), name='exercise-submit'),
 
+    # Leaderboard
+    path('leaderboard/stars', StarsLeaderboardView.as_view(), name='leaderboard-stars'),
+    path('leaderboard/stars/weekly', StarsLeaderboardView.as_view(board='weekly'), name='leaderboard-stars-weekly'),
+    path('leaderboard/stars/levels/<str:level>', StarsLeaderboardView.as_view(board='level'), name='leaderboard-stars-level'),
+    path('leaderboard/streaks', StreakLeaderboardView.as_view(), name='leaderboard-streaks'),
+
     # Payment
     path('modules/<int:moduleId>/unlock', UnlockModuleView.as_view(), name='unlock-module'),
+    path('modules/unlock/bulk', BulkUnlockModulesView.as_view(), name='bulk-unlock-modules'),
 ]
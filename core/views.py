@@ -1,23 +1,68 @@
+import json
+import math
+import time
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.csrf import csrf_exempt
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from rest_framework import generics, status
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.throttling import BaseThrottle
+from django.utils import timezone
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from .serializers import (
-    RegisterSerializer, LoginSerializer, LogoutSerializer,
+    RegisterSerializer, LoginFieldsSerializer, LoginSerializer, LogoutSerializer,
     UserProfileSerializer, UserProgressSerializer, ModuleProgressSerializer, TopicContentSerializer,
     AssessmentSerializer, AssessmentSubmitSerializer, AssessmentResultSerializer,
-    TopicExerciseSerializer, ExerciseSubmitSerializer, UnlockModuleSerializer
+    AdaptiveStartSerializer, AdaptiveAnswerSerializer,
+    TopicExerciseSerializer, ExerciseSubmitSerializer, ExerciseResultSerializer, UnlockModuleSerializer, BulkUnlockSerializer,
+    module_progress_rows
 )
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.views import TokenRefreshView
 from .models import (
-    UserProfile, Module, Topic, TopicContent, UserModuleProgress, Assessment,
-    AssessmentSubmission, ExerciseSubmission
+    User, UserProfile, Module, Topic, TopicContent, UserModuleProgress, Assessment,
+    AssessmentSubmission, ExerciseSubmission, PlacementSession, UserProgressAggregate
 )
+from .activity import load_activity, streak_leaderboard
+from .authentication import PrincipalJWTAuthentication, PrincipalRefreshToken
+from .adaptive import answer_question, start_session
+from .assessments import get_snapshot
+from .bundles import get_module_bundle_blob
+from .catalogue import get_topic_content_blob, get_topic_exercises
+from .idempotency import IdempotentPostMixin
+from .jobs import CEFR_LEVELS
+from .events import ASSESSMENT_SUBMITTED, TOPIC_OPENED, emit
+from .leaderboard import GLOBAL, leaderboard, level_board, weekly_board
+from .notify import assessment_key, notifier
+from .passwords import aauthenticate_password
+from .payments import UnlockError, unlock_module, unlock_modules
+from .progression import LOCKED
+from .rendering import blob_response
+from .throttling import consume
+from .progress import load_topic_progress, seed_module_progress
+
+def _json_response(body, status_code):
+    return HttpResponse(JSONRenderer().render(body), content_type='application/json', status=status_code)
+
+def _error_response(status_code, message):
+    return _json_response({
+        "success": False,
+        "error": {"code": status_code, "message": message, "details": {"detail": message}}
+    }, status_code)
+
 
 # Authentication Views
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = (AllowAny,)
+    throttle_scope = 'register'
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -36,24 +81,63 @@ class RegisterView(generics.CreateAPIView):
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
     permission_classes = (AllowAny,)
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.context['user']
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            "success": True,
-            "data": {
-                "accessToken": str(refresh.access_token),
-                "refreshToken": str(refresh),
-                "user": {
-                    "id": user.id,
-                    "email": user.email,
-                    "name": user.name
-                }
+        return Response(login_body(serializer.context['user']), status=status.HTTP_200_OK)
+
+def login_body(user):
+    refresh = PrincipalRefreshToken.for_user(user)
+    return {
+        "success": True,
+        "data": {
+            "accessToken": str(refresh.access_token),
+            "refreshToken": str(refresh),
+            "user": {
+                "id": user.id,
+                "email": user.email,
+                "name": user.name
             }
-        }, status=status.HTTP_200_OK)
+        }
+    }
+
+@csrf_exempt
+async def login_async(request):
+    """
+    LoginView for ASGI deployments.
+
+    The password is checked in the hashing pool while the event loop keeps
+    serving other requests; the response is the same as LoginView's. Like the
+    DRF views it is a token-less JSON endpoint, so it is exempt from CSRF.
+    """
+    if request.method != 'POST':
+        return _error_response(status.HTTP_405_METHOD_NOT_ALLOWED, 'Method not allowed.')
+    wait = await sync_to_async(consume)(LoginView.throttle_scope, f'ip:{BaseThrottle().get_ident(request)}')
+    if wait is not None:
+        response = _error_response(status.HTTP_429_TOO_MANY_REQUESTS, f'Request was throttled. Expected available in {math.ceil(wait)} seconds.')
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return _error_response(status.HTTP_400_BAD_REQUEST, 'Malformed JSON.')
+    fields = LoginFieldsSerializer(data=data)
+    if not fields.is_valid():
+        return _json_response({
+            "success": False,
+            "error": {"code": status.HTTP_400_BAD_REQUEST, "message": "An error occurred.", "details": fields.errors}
+        }, status.HTTP_400_BAD_REQUEST)
+
+    user = await User.objects.filter(email=fields.validated_data['email']).afirst()
+    user = await aauthenticate_password(user, fields.validated_data['password'])
+    if user is None:
+        return _json_response({
+            "success": False,
+            "error": {"code": status.HTTP_400_BAD_REQUEST, "message": "An error occurred.", "details": {"non_field_errors": ["Invalid credentials"]}}
+        }, status.HTTP_400_BAD_REQUEST)
+    return _json_response(await sync_to_async(login_body)(user), status.HTTP_200_OK)
 
 class LogoutView(generics.GenericAPIView):
     serializer_class = LogoutSerializer
@@ -64,7 +148,7 @@ class LogoutView(generics.GenericAPIView):
         serializer.is_valid(raise_exception=True)
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = PrincipalRefreshToken(refresh_token)
             token.blacklist()
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
@@ -77,7 +161,11 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user.profile
+        try:
+            return self.request.user.profile
+        except UserProfile.DoesNotExist:
+            # Users created without UserManager, e.g. fixtures.
+            return UserProfile.objects.get_or_create(user=self.request.user)[0]
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -103,79 +191,111 @@ class UserProgressView(generics.RetrieveAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        user = self.request.user
+        aggregate = UserProgressAggregate.objects.select_related('user__profile').filter(user_id=user.pk).first()
+        return aggregate or UserProgressAggregate(user=user)
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        serializer = self.get_serializer(instance)
+        serializer = self.get_serializer(instance, context={
+            'request': request,
+            'activity': load_activity(request.user.pk)
+        })
         return Response({
             "success": True,
             "data": serializer.data
         })
 
+class UserActivityView(generics.GenericAPIView):
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (PrincipalJWTAuthentication,)
+
+    def get(self, request, *args, **kwargs):
+        today = timezone.localdate()
+        try:
+            year, month = map(int, request.query_params.get('month', f'{today:%Y-%m}').split('-'))
+            first = date(year, month, 1)
+        except ValueError:
+            raise ValidationError({'month': 'A month is required, as YYYY-MM.'})
+        days = load_activity(request.user.pk).month(year, month)
+        return Response({
+            "success": True,
+            "data": {
+                "month": f'{first:%Y-%m}',
+                "activeDays": sum(days),
+                "days": [{"date": first + timedelta(days=i), "active": active} for i, active in enumerate(days)]
+            }
+        })
+
 
 # Learning Path API Views
 class ModuleListView(generics.ListAPIView):
     serializer_class = ModuleProgressSerializer
     permission_classes = (IsAuthenticated,)
-
-    def get_queryset(self):
-        user = self.request.user
-        modules = Module.objects.all()
-        for module in modules:
-            UserModuleProgress.objects.get_or_create(user=user, module=module)
-        return UserModuleProgress.objects.filter(user=user)
+    authentication_classes = (PrincipalJWTAuthentication,)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
+        # Same output as ModuleProgressSerializer over the user's progress rows, from one values_list query.
+        seed_module_progress(request.user.pk)
+        modules = module_progress_rows.serialize(
+            UserModuleProgress.objects.filter(user_id=request.user.pk).order_by('module__order', 'module_id')
+        )
+        topics_by_module = load_topic_progress(request.user.pk, [module['id'] for module in modules])
+        for module in modules:
+            module['topics'] = topics_by_module[module['id']]
         return Response({
             "success": True,
-            "data": serializer.data
+            "data": modules
         })
 
 class TopicContentView(generics.RetrieveAPIView):
     serializer_class = TopicContentSerializer
     permission_classes = (IsAuthenticated,)
+    authentication_classes = (PrincipalJWTAuthentication,)
     lookup_url_kwarg = "topicId"
 
-    def get_queryset(self):
-        return TopicContent.objects.filter(topic_id=self.kwargs.get('topicId'))
+    def retrieve(self, request, *args, **kwargs):
+        topicId = self.kwargs.get('topicId')
+        blob = get_topic_content_blob(topicId)
+        if blob is None:
+            raise Http404
+        emit(request.user.pk, TOPIC_OPENED, topic_id=topicId)
+        return blob_response(request, *blob)
 
-    def get_object(self):
-        queryset = self.get_queryset()
-        obj = generics.get_object_or_404(queryset)
-        self.check_object_permissions(self.request, obj)
-        return obj
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response({
-            "success": True,
-            "data": serializer.data
-        })
+class ModuleBundleView(generics.GenericAPIView):
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (PrincipalJWTAuthentication,)
+
+    def get(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                raise ValidationError({'since': 'A bundle version is required.'})
+        blob = get_module_bundle_blob(self.kwargs.get('moduleId'), since=since)
+        if blob is None:
+            raise Http404
+        return blob_response(request, *blob)
 
 
 # Assessment API Views
 class AssessmentView(generics.RetrieveAPIView):
     serializer_class = AssessmentSerializer
     permission_classes = (IsAuthenticated,)
-
-    def get_object(self):
-        return Assessment.objects.first()
+    authentication_classes = (PrincipalJWTAuthentication,)
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response({
-            "success": True,
-            "data": serializer.data
-        })
+        snapshot = get_snapshot()
+        if snapshot is None:
+            raise Http404
+        return blob_response(request, snapshot.etag, snapshot.body, snapshot.body_gzip)
 
-class AssessmentSubmitView(generics.CreateAPIView):
+class AssessmentSubmitView(IdempotentPostMixin, generics.CreateAPIView):
     serializer_class = AssessmentSubmitSerializer
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'assessment_submit'
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -188,75 +308,277 @@ class AssessmentSubmitView(generics.CreateAPIView):
             }
         }, status=status.HTTP_200_OK)
 
-class AssessmentResultView(generics.RetrieveAPIView):
-    serializer_class = AssessmentResultSerializer
+ASSESSMENT_FAILED = {
+    "success": False,
+    "status": "failed",
+    "error": {"code": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "We could not grade this assessment. Please submit it again."}
+}
+
+ASSESSMENT_PROCESSING = {
+    "success": True,
+    "status": "processing",
+    "message": "AI is analyzing your results. Please check back in a moment."
+}
+
+def assessment_result_body(submission):
+    if submission.status == 'processing':
+        return status.HTTP_202_ACCEPTED, ASSESSMENT_PROCESSING
+    if submission.status == 'failed':
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, ASSESSMENT_FAILED
+    return status.HTTP_200_OK, {
+        "success": True,
+        "status": "complete",
+        "data": AssessmentResultSerializer(submission).data
+    }
+
+class AdaptiveAssessmentStartView(generics.GenericAPIView):
+    serializer_class = AdaptiveStartSerializer
     permission_classes = (IsAuthenticated,)
-    lookup_url_kwarg = "submissionId"
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session, question = start_session(request.user, serializer.validated_data.get('assessmentId'))
+        if session is None:
+            raise Http404
+        return Response({
+            "success": True,
+            "data": {
+                "sessionId": session.id,
+                "status": session.status,
+                "answered": 0,
+                "question": question
+            }
+        }, status=status.HTTP_201_CREATED)
+
+class AdaptiveAssessmentAnswerView(generics.GenericAPIView):
+    serializer_class = AdaptiveAnswerSerializer
+    permission_classes = (IsAuthenticated,)
+    lookup_url_kwarg = "sessionId"
 
     def get_queryset(self):
-        return AssessmentSubmission.objects.filter(user=self.request.user)
+        return PlacementSession.objects.select_for_update().filter(user=self.request.user)
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        if instance.status == 'processing':
+    def post(self, request, *args, **kwargs):
+        # Concurrent answers to one session are applied one after the other.
+        with transaction.atomic():
+            session = self.get_object()
+            serializer = self.get_serializer(data=request.data, context={'request': request, 'session': session})
+            serializer.is_valid(raise_exception=True)
+            question, level_mass = answer_question(
+                session, serializer.validated_data['questionId'], serializer.validated_data['answer']
+            )
+        if question is not None:
             return Response({
                 "success": True,
-                "status": "processing",
-                "message": "AI is analyzing your results. Please check back in a moment."
-            }, status=status.HTTP_202_ACCEPTED)
-
-        serializer = self.get_serializer(instance)
+                "data": {
+                    "sessionId": session.id,
+                    "status": session.status,
+                    "answered": len(session.responses),
+                    "question": question
+                }
+            })
+        submission = session.submission
+        emit(request.user.pk, ASSESSMENT_SUBMITTED, assessmentId=str(session.assessment_id), answered=len(session.responses), adaptive=True)
         return Response({
             "success": True,
-            "status": "complete",
-            "data": serializer.data
+            "data": {
+                "sessionId": session.id,
+                "status": session.status,
+                "answered": len(session.responses),
+                "submissionId": submission.id,
+                "level": submission.level,
+                "confidence": round(max(level_mass), 2),
+                "correctCount": submission.correctCount,
+                "totalQuestions": submission.totalQuestions
+            }
         })
 
+class AssessmentResultView(generics.RetrieveAPIView):
+    serializer_class = AssessmentResultSerializer
+    permission_classes = (IsAuthenticated,)
+    lookup_url_kwarg = "submissionId"
+
+    def get_queryset(self):
+        return AssessmentSubmission.objects.filter(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        status_code, body = assessment_result_body(self.get_object())
+        return Response(body, status=status_code)
+
+
+def _sse_event(event, body):
+    return b'event: ' + event.encode() + b'\ndata: ' + JSONRenderer().render(body) + b'\n\n'
+
+async def assessment_result_wait(request, submissionId):
+    """
+    Long-poll variant of AssessmentResultView for ASGI deployments.
+
+    Holds the request until the grading workers signal that the submission is
+    graded, or until ``?timeout=`` seconds (at most 60) pass, and then answers
+    exactly like AssessmentResultView. Clients sending
+    ``Accept: text/event-stream`` get the same payload as a Server-Sent Events
+    stream instead, with keep-alive comments while grading is in progress.
+    """
+    if request.method != 'GET':
+        return _error_response(status.HTTP_405_METHOD_NOT_ALLOWED, 'Method not allowed.')
+    try:
+        auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return _error_response(status.HTTP_401_UNAUTHORIZED, str(e.detail))
+    if auth is None:
+        return _error_response(status.HTTP_401_UNAUTHORIZED, 'Authentication credentials were not provided.')
+    user = auth[0]
+
+    try:
+        timeout = float(request.GET.get('timeout', 25))
+    except ValueError:
+        timeout = math.nan
+    if not 0 <= timeout <= 60:  # also rejects nan and inf
+        return _error_response(status.HTTP_400_BAD_REQUEST, 'timeout must be a number of seconds between 0 and 60.')
+
+    submissions = AssessmentSubmission.objects.filter(id=submissionId, user=user)
+    submission = await submissions.afirst()
+    if submission is None:
+        return _error_response(status.HTTP_404_NOT_FOUND, 'Not found.')
+    key = assessment_key(submission.id)
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        async def stream():
+            current = submission
+            deadline = time.monotonic() + timeout
+            while current is not None and current.status == 'processing':
+                yield b': keepalive\n\n'
+                remaining = deadline - time.monotonic()
+                notified = await notifier.wait(key, max(min(15, remaining), 0))
+                # The row is only re-read once notified or out of time.
+                if notified or remaining <= 15:
+                    current = await submissions.afirst()
+                if remaining <= 15:
+                    break
+            if current is None:
+                yield _sse_event('error', {"success": False, "error": {"code": status.HTTP_404_NOT_FOUND, "message": 'Not found.'}})
+                return
+            status_code, body = assessment_result_body(current)
+            yield _sse_event('processing' if status_code == status.HTTP_202_ACCEPTED else 'result', body)
+
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    if submission.status == 'processing':
+        await notifier.wait(key, timeout)
+        # Re-read once, whether notified or timed out: a result graded during the wait is not reported as processing.
+        submission = await submissions.afirst()
+        if submission is None:
+            return _error_response(status.HTTP_404_NOT_FOUND, 'Not found.')
+    status_code, body = assessment_result_body(submission)
+    return _json_response(body, status_code)
+
 
 # Exercise API Views
 class TopicExerciseView(generics.RetrieveAPIView):
     serializer_class = TopicExerciseSerializer
     permission_classes = (IsAuthenticated,)
+    authentication_classes = (PrincipalJWTAuthentication,)
     lookup_url_kwarg = "topicId"
 
-    def get_queryset(self):
-        return Topic.objects.all()
-
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
+        data = get_topic_exercises(self.kwargs.get('topicId'))
+        if data is None:
+            raise Http404
         return Response({
             "success": True,
-            "data": serializer.data
+            "data": data
         })
 
-class ExerciseSubmitView(generics.CreateAPIView):
+class ExerciseSubmitView(IdempotentPostMixin, generics.CreateAPIView):
     serializer_class = ExerciseSubmitSerializer
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'exercise_submit'
 
     def create(self, request, *args, **kwargs):
         topicId = self.kwargs.get('topicId')
-        topic = Topic.objects.get(id=topicId)
+        topic = generics.get_object_or_404(Topic, id=topicId)
+        # Paid modules must be unlocked before their topics can earn stars or be completed.
+        seed_module_progress(request.user.pk)
+        if not UserModuleProgress.objects.filter(user_id=request.user.pk, module_id=topic.module_id).exclude(status=LOCKED).exists():
+            return Response({
+                "success": False,
+                "error": {
+                    "code": "MODULE_LOCKED",
+                    "message": "Unlock this module to submit its exercises."
+                }
+            }, status=status.HTTP_403_FORBIDDEN)
         serializer = self.get_serializer(data=request.data, context={'request': request, 'topic': topic})
         serializer.is_valid(raise_exception=True)
         submission = serializer.save()
+        return Response({
+            "success": True,
+            "data": ExerciseResultSerializer(submission).data
+        })
+
+# Leaderboard API Views
+class StreakLeaderboardView(generics.GenericAPIView):
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (PrincipalJWTAuthentication,)
+    # Recomputed over every user's bitset at most once a minute per limit.
+    cache_timeout = 60
 
-        dummy_result = {
-            "submissionId": submission.id,
-            "correctCount": 3,
-            "totalQuestions": 4,
-            "starsEarned": 2,
-            "performanceAnalysis": "You might want to review this topic again to improve your understanding.",
-            "results": [
-                {"exerciseId": 6, "isCorrect": True, "correctAnswer": "went", "explanation": "\"Went\" is the past form of \"go\"."},
-                {"exerciseId": 7, "isCorrect": True, "correctAnswer": 1, "explanation": "\"Ate\" is the irregular past form of \"eat\"."},
-                {"exerciseId": 3, "isCorrect": False, "correctAnswer": "He always drinks coffee in the morning.", "explanation": "The correct word order is Subject-Adverb-Verb."},
-                {"exerciseId": 4, "isCorrect": True, "correctAnswer": "The weather is beautiful today.", "explanation": "Well done!"}
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            raise ValidationError({'limit': 'A number of entries is required.'})
+        today = timezone.localdate()
+        key = f'leaderboard:streaks:{today.toordinal()}:{limit}'
+        entries = cache.get(key)
+        if entries is None:
+            leaders = streak_leaderboard(today, limit)
+            names = dict(User.objects.filter(pk__in=[user_id for user_id, _ in leaders]).values_list('pk', 'name'))
+            entries = [
+                {"rank": rank, "userId": user_id, "name": names.get(user_id), "dayStreak": streak}
+                for rank, (user_id, streak) in enumerate(leaders, start=1)
             ]
-        }
+            cache.set(key, entries, timeout=self.cache_timeout)
+        return Response({
+            "success": True,
+            "data": entries
+        })
+
+class StarsLeaderboardView(generics.GenericAPIView):
+    """Top users by stars on the ``global``, ``weekly`` or ``level`` board, and the caller's rank."""
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (PrincipalJWTAuthentication,)
+    board = GLOBAL
+
+    def get_board(self):
+        if self.board == 'weekly':
+            return weekly_board()
+        if self.board == 'level':
+            level = self.kwargs.get('level', '').upper()
+            if level not in CEFR_LEVELS:
+                raise Http404
+            return level_board(level)
+        return GLOBAL
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), settings.LEADERBOARD_TOP_SIZE)
+        except ValueError:
+            raise ValidationError({'limit': 'A number of entries is required.'})
+        leaders, (my_rank, my_stars) = leaderboard(self.get_board(), limit, request.user.pk)
+        names = dict(User.objects.filter(pk__in=[user_id for _, user_id, _ in leaders]).values_list('pk', 'name'))
+        names = {str(user_id): name for user_id, name in names.items()}
         return Response({
             "success": True,
-            "data": dummy_result
+            "data": {
+                "entries": [
+                    {"rank": rank, "userId": user_id, "name": names.get(user_id), "stars": stars}
+                    for rank, user_id, stars in leaders
+                ],
+                "me": {"rank": my_rank, "stars": my_stars}
+            }
         })
 
 # Payment API Views
@@ -269,36 +591,48 @@ class UnlockModuleView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        user = request.user
         try:
-            module = Module.objects.get(id=moduleId)
-            progress, created = UserModuleProgress.objects.get_or_create(user=user, module=module)
-
-            if progress.status == 'locked':
-                # Here you would validate the paymentToken
-                progress.status = 'active'
-                progress.save()
-                return Response({
-                    "success": True,
-                    "message": "Module unlocked successfully!",
-                    "data": {
-                        "moduleId": module.id,
-                        "newStatus": "active"
-                    }
-                })
-            else:
-                return Response({
-                    "success": False,
-                    "error": {
-                        "code": "MODULE_ALREADY_UNLOCKED",
-                        "message": "This module is already unlocked."
-                    }
-                }, status=status.HTTP_400_BAD_REQUEST)
-        except Module.DoesNotExist:
-            return Response({
-                    "success": False,
-                    "error": {
-                        "code": "MODULE_NOT_FOUND",
-                        "message": "Module not found."
-                    }
-                }, status=status.HTTP_404_NOT_FOUND)
+            unlock_module(request.user.pk, moduleId, serializer.validated_data['paymentToken'])
+        except UnlockError as e:
+            return _unlock_error(e)
+        # A retry with the token that unlocked the module gets the same answer.
+        return Response({
+            "success": True,
+            "message": "Module unlocked successfully!",
+            "data": {
+                "moduleId": moduleId,
+                "newStatus": "active"
+            }
+        })
+
+class BulkUnlockModulesView(generics.GenericAPIView):
+    """Unlocks modules for a list of users under one institutional licence token."""
+    serializer_class = BulkUnlockSerializer
+    permission_classes = (IsAdminUser,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        emails = serializer.validated_data['emails']
+        users = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+
+        try:
+            unlocked = unlock_modules(list(users.values()), serializer.validated_data['moduleIds'], serializer.validated_data['paymentToken'])
+        except UnlockError as e:
+            return _unlock_error(e)
+        return Response({
+            "success": True,
+            "data": {
+                "unlocked": unlocked,
+                "unknownEmails": [email for email in emails if email not in users]
+            }
+        })
+
+def _unlock_error(error):
+    return Response({
+        "success": False,
+        "error": {
+            "code": error.code,
+            "message": error.message
+        }
+    }, status=error.status_code)
@@ -102,6 +102,20 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Login password checks run in a pool of PASSWORD_HASH_WORKERS threads (see
+# core/passwords.py). PASSWORD_HASH_ITERATIONS sets the PBKDF2 work factor,
+# None keeps Django's; stored hashes are upgraded on the next login.
+PASSWORD_HASHERS = [
+    "core.passwords.ConfiguredPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+PASSWORD_HASH_ITERATIONS = None
+PASSWORD_HASH_WORKERS = 4
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -126,6 +140,47 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "core.User"
 
+# Runs the tests with ASSESSMENT_SNAPSHOT_DIR in a temporary directory.
+TEST_RUNNER = "core.testing.TestRunner"
+
+# Curriculum catalogue cache (see core/catalogue.py)
+CATALOGUE_CACHE_SIZE = 1024
+CATALOGUE_CACHE_TIMEOUT = 60 * 60 * 24
+# How long a process may serve the catalogue after another process changed
+# it; each process re-reads the catalogue version this often.
+CATALOGUE_VERSION_RECHECK = 5
+
+# Published assessment snapshots (see core/assessments.py); None disables the disk copy.
+ASSESSMENT_SNAPSHOT_DIR = BASE_DIR / "var" / "assessment_snapshots"
+# How long a process may serve a snapshot after another process changed the
+# assessment; each process re-reads the assessment generations this often.
+ASSESSMENT_SNAPSHOT_RECHECK = 5
+
+# Assessment result long-polls (see core/notify.py) are woken through this
+# cache. It must be shared by the web and grading worker processes (redis or
+# memcached) in production: otherwise a long-poll only sees its result when it
+# times out. `manage.py check --deploy` warns about it.
+NOTIFY_CACHE = "default"
+
+# Learning event buffer (see core/events.py). Events are written with one
+# bulk INSERT per LEARNING_EVENT_BUFFER_SIZE events or per flush interval,
+# whichever comes first. The test runner (core/testing.py) turns the
+# background flusher thread off, and tests flush explicitly.
+LEARNING_EVENT_BUFFER_SIZE = 500
+LEARNING_EVENT_FLUSH_INTERVAL = 2.0
+LEARNING_EVENT_BACKGROUND_FLUSH = True
+
+# Stars leaderboards (see core/leaderboard.py). The ranking indexes live in
+# this cache, or in a process-local one if it is a DummyCache; it must be
+# shared by every process and hold a key per tree node of every board. Only
+# the first LEADERBOARD_TOP_SIZE entries of a board are kept in order, totals
+# above LEADERBOARD_MAX_STARS (a power of two) share a rank, and boards are
+# rebuilt from the database every LEADERBOARD_TIMEOUT seconds.
+LEADERBOARD_CACHE = "default"
+LEADERBOARD_TOP_SIZE = 100
+LEADERBOARD_MAX_STARS = 2 ** 16
+LEADERBOARD_TIMEOUT = 60 * 60 * 24
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -137,8 +192,23 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.JSONParser',
     ],
     'EXCEPTION_HANDLER': 'core.utils.custom_exception_handler',
+    # Token buckets per user or IP for views with a throttle_scope (see core/throttling.py).
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.TokenBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',
+        'register': '20/hour',
+        'assessment_submit': '10/min',
+        'exercise_submit': '60/min',
+    },
 }
 
+# The throttle counters must live in a cache shared by every worker (redis or
+# memcached) in production: with locmem each process has its own buckets and
+# N workers allow N times each rate. `manage.py check --deploy` warns about it.
+THROTTLE_CACHE = "default"
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -174,9 +244,44 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "core.serializers.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
+
+# Claims-based authentication for hot read endpoints (see core/authentication.py).
+# A principal is trusted for as long as an access token lives, unless the user
+# was saved or deleted since. Those changes are recorded in
+# PRINCIPAL_CHANGES_CACHE, which must be shared by every worker (redis or
+# memcached) for a deactivation to take effect everywhere at once. With a
+# per-process cache, other workers keep trusting the old claims until the
+# access token expires.
+JWT_TRUST_CLAIMS = True
+PRINCIPAL_CACHE_SIZE = 10000
+PRINCIPAL_CACHE_TTL = SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].total_seconds()
+PRINCIPAL_CHANGES_CACHE = "default"
+
+# Revoked refresh tokens (see core/revocation.py). The Bloom filter is sized for
+# this many JTIs at a 0.1% false-positive rate and grows when the blacklist outgrows it.
+TOKEN_REVOCATION_BLOOM_CAPACITY = 100000
+# Revocations reach other processes through a version counter in this cache
+# when it is shared (memcached, redis). Whatever the cache, each process also
+# re-reads recent revocations from the database this often, in seconds.
+TOKEN_REVOCATION_CACHE = "default"
+TOKEN_REVOCATION_SYNC_INTERVAL = 5
+
+# Idempotency-Key handling for the submit endpoints (see core/idempotency.py).
+# In production the reservations must live in a cache shared by every worker
+# (redis or memcached). With locmem a retry that reaches another worker runs
+# again, so `manage.py check --deploy` reports an error.
+IDEMPOTENCY_CACHE = "default"
+IDEMPOTENCY_TTL = 60 * 60 * 24
+# How long a key stays reserved by a request that never finishes, and how
+# long a concurrent retry waits for the first request's response.
+IDEMPOTENCY_LOCK_TTL = 60
+IDEMPOTENCY_WAIT = 5
+
+# Checks payment tokens before modules are unlocked (see core/payments.py).
+PAYMENT_VERIFIER = "core.payments.StubPaymentVerifier"